@@ -0,0 +1,8 @@
+"""
+性能基准测试，不需要访问网络：
+
+    python -m benchmarks.bench_queue --tasks 20 --jobs 4     # 本地假视频服务器 + DownloadManager
+    python -m benchmarks.bench_progress                       # 进度事件合并的开销
+    python -m benchmarks.bench_history                        # HistoryManager 在 1k/10k/100k 条记录下的耗时
+    python -m benchmarks.bench_startup                        # 模块导入耗时，检查启动时没有导入 yt-dlp
+"""
@@ -0,0 +1,71 @@
+"""
+HistoryManager 微基准：在 1k/10k/100k 条记录下测量 add_entry、search_history、
+find_by_url 和冷启动加载的耗时，各后端（.db / .jsonl）分别测试。
+
+    python -m benchmarks.bench_history --sizes 1000,10000,100000 --backends db,jsonl
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from core.history_manager import HistoryManager
+
+def make_url(i: int) -> str:
+    # 使用可以离线识别的 YouTube 链接，避免基准测试中加载 yt-dlp 的提取器
+    return f'https://www.youtube.com/watch?v={i:011d}'
+
+
+def timed(fn, repeat: int = 1) -> float:
+    """返回单次调用的平均耗时（秒）"""
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - began) / repeat
+
+
+def bench(size: int, backend: str, workdir: str):
+    path = os.path.join(workdir, f'history-{size}.{backend}')
+    options = {'download_type': '视频', 'quality': '最佳质量', 'format': 'mp4'}
+    manager = HistoryManager(path, max_entries=0)
+    began = time.perf_counter()
+    for i in range(size):
+        manager.add_entry(make_url(i), f'视频标题 {i} 测试.mp4', workdir, options)
+    add = (time.perf_counter() - began) / size
+    results = {
+        'add_entry': add,
+        'search_hit': timed(lambda: manager.search_history(f'标题 {size // 2} '), 20),
+        'search_common': timed(lambda: manager.search_history('测试', limit=500), 20),
+        'search_miss': timed(lambda: manager.search_history('不存在的关键字'), 20),
+        'find_by_url': timed(lambda: manager.find_by_url(make_url(size // 3)), 200),
+    }
+    manager.store.close()
+    results['load'] = timed(lambda: HistoryManager(path, max_entries=0).store.close())
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_history', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help='记录条数，逗号分隔')
+    parser.add_argument('--backends', default='db,jsonl', help='后端扩展名，逗号分隔：db、jsonl、json')
+    args = parser.parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='streamdowner-history-bench-')
+    try:
+        print(f"{'后端':<6}{'条数':>8}{'add_entry':>12}{'搜索命中':>12}{'常见词':>12}{'未命中':>12}"
+              f"{'find_by_url':>13}{'加载':>10}")
+        for backend in args.backends.split(','):
+            for size in (int(s) for s in args.sizes.split(',')):
+                r = bench(size, backend.strip(), workdir)
+                print(f"{backend:<6}{size:>8}{r['add_entry'] * 1e6:>10.1f}µs{r['search_hit'] * 1e3:>10.2f}ms"
+                      f"{r['search_common'] * 1e3:>10.2f}ms{r['search_miss'] * 1e3:>10.2f}ms"
+                      f"{r['find_by_url'] * 1e6:>11.1f}µs{r['load'] * 1e3:>8.0f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+用本地假视频服务器驱动 DownloadManager，测量：
+
+- 吞吐量（MB/s、任务/秒）
+- 进度事件频率（批次/秒、快照/秒）
+- 进程峰值内存（RSS）
+- 各阶段耗时：排队（加入 -> 开始下载）、下载（开始 -> 文件落盘）、后处理（落盘 -> 完成）
+
+    python -m benchmarks.bench_queue --tasks 40 --jobs 4 --kinds progressive,hls --size 8M
+    python -m benchmarks.bench_queue --tasks 40 --jobs 8 --executor process   # yt-dlp 在子进程中运行
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from core.bandwidth import parse_rate
+from core.download_manager import DownloadManager
+from core.info_cache import InfoCache
+from core.queue_manager import TaskState
+from core.worker_pool import EXECUTOR_MODES
+from .fake_server import FakeMediaServer
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB）；不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class QueueBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix='streamdowner-bench-')
+        self.download_manager = DownloadManager(
+            max_concurrent=args.jobs, host_limits={},
+            info_cache=InfoCache(os.path.join(self.workdir, 'info_cache')),
+            max_fragment_workers=args.fragment_workers, executor=args.executor)
+        self.lock = threading.Lock()
+        self.added: Dict[int, float] = {}
+        self.started: Dict[int, float] = {}
+        self.downloaded: Dict[int, float] = {}
+        self.finished: Dict[int, float] = {}
+        self.failed: Dict[int, str] = {}
+        self.batches = 0
+        self.snapshots = 0
+        self.done = threading.Event()
+        manager = self.download_manager
+        manager.progress_updated.connect(self.on_progress)
+        manager.task_state_changed.connect(self.on_state)
+        manager.download_completed.connect(self.on_completed)
+        manager.download_error.connect(self.on_error)
+
+    def on_progress(self, snapshots):
+        with self.lock:
+            self.batches += 1
+            self.snapshots += len(snapshots)
+
+    def on_state(self, task_id, state):
+        now = time.perf_counter()
+        with self.lock:
+            if state == TaskState.RUNNING:
+                self.started.setdefault(task_id, now)
+            elif state == TaskState.POSTPROCESSING:
+                self.downloaded.setdefault(task_id, now)
+
+    def on_completed(self, task_id):
+        self._finish(task_id)
+
+    def on_error(self, task_id, error):
+        with self.lock:
+            self.failed[task_id] = error
+        self._finish(task_id)
+
+    def _finish(self, task_id):
+        now = time.perf_counter()
+        with self.lock:
+            self.finished[task_id] = now
+            self.downloaded.setdefault(task_id, now)
+            if len(self.finished) >= len(self.added):
+                self.done.set()
+
+    def run(self) -> Dict:
+        args = self.args
+        kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+        size = int(parse_rate(args.size))
+        rate = int(parse_rate(args.server_rate) or 0)
+        options = {'download_type': '视频', 'quality': '最佳质量', 'format': 'mp4', 'include_audio': True}
+        with FakeMediaServer() as server:
+            urls = [server.url(kinds[i % len(kinds)], f'bench{i}', size, args.segments, rate)
+                    for i in range(args.tasks)]
+            began = time.perf_counter()
+            with self.lock:
+                for url in urls:
+                    task_id = self.download_manager.add_download(url, self.workdir, dict(options))
+                    self.added[task_id] = time.perf_counter()
+            if not self.done.wait(args.timeout):
+                print(f'超时：{len(self.finished)}/{len(self.added)} 个任务完成', file=sys.stderr)
+            elapsed = time.perf_counter() - began
+        self.download_manager.shutdown()
+        ok = [task_id for task_id in self.finished if task_id not in self.failed]
+        return {
+            'elapsed': elapsed,
+            'tasks': len(self.added),
+            'completed': len(ok),
+            'failed': len(self.failed),
+            'bytes': size * len(ok),
+            'batches': self.batches,
+            'snapshots': self.snapshots,
+            'queue_wait': [self.started[t] - self.added[t] for t in ok if t in self.started],
+            'download': [self.downloaded[t] - self.started[t] for t in ok if t in self.started],
+            'postprocess': [self.finished[t] - self.downloaded[t] for t in ok],
+            'errors': sorted(set(self.failed.values()))[:5],
+        }
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def report(result: Dict):
+    elapsed = result['elapsed'] or 1e-9
+    print(f"任务: {result['completed']}/{result['tasks']} 完成，{result['failed']} 失败，用时 {elapsed:.2f}s")
+    print(f"吞吐量: {result['bytes'] / elapsed / 1024 / 1024:.1f} MB/s，{result['completed'] / elapsed:.2f} 任务/s")
+    print(f"进度事件: {result['batches'] / elapsed:.1f} 批/s，{result['snapshots'] / elapsed:.1f} 快照/s")
+    rss = peak_rss_mb()
+    print(f"峰值 RSS: {rss:.1f} MB" if rss is not None else "峰值 RSS: 不支持")
+    for name, label in (('queue_wait', '排队'), ('download', '下载'), ('postprocess', '后处理')):
+        values = result[name]
+        if values:
+            print(f"{label}耗时: 中位数 {statistics.median(values) * 1000:.0f} ms，"
+                  f"p95 {percentile(values, 95) * 1000:.0f} ms，最大 {max(values) * 1000:.0f} ms")
+    for error in result['errors']:
+        print(f"错误示例: {error}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_queue', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20, help='任务数')
+    parser.add_argument('--jobs', type=int, default=4, help='最大并发下载数')
+    parser.add_argument('--kinds', default='progressive,hls',
+                        help='媒体类型，逗号分隔：progressive、hls、dash（dash 需要 ffmpeg 合并）')
+    parser.add_argument('--size', default='8M', help='每个任务的大小')
+    parser.add_argument('--segments', type=int, default=20, help='HLS/DASH 分片数')
+    parser.add_argument('--server-rate', default='0', help='服务器单连接速度上限，例如 2M；0 表示不限')
+    parser.add_argument('--fragment-workers', type=int, default=16, help='分片并发总数上限')
+    parser.add_argument('--executor', choices=EXECUTOR_MODES, default='thread',
+                        help='yt-dlp 在工作线程（thread）还是子进程（process）中运行')
+    parser.add_argument('--timeout', type=float, default=600, help='超时（秒）')
+    args = parser.parse_args(argv)
+    benchmark = QueueBenchmark(args)
+    try:
+        result = benchmark.run()
+    finally:
+        benchmark.cleanup()
+    report(result)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+冷启动基准：在全新的子进程中导入各模块，测量导入耗时，并检查 yt-dlp 没有在启动时被导入。
+图形界面的各阶段耗时可以直接运行 python main.py --startup-report 查看。
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 未安装 PySide6 时跳过 ui 模块
+MODULES = ['core.download_manager', 'core.headless', 'core.history_manager', 'ui.main_window']
+
+PROBE = """
+import json, sys, time
+began = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+except ImportError as e:
+    print(json.dumps({'error': str(e)}))
+    sys.exit(0)
+print(json.dumps({'seconds': time.perf_counter() - began, 'yt_dlp': 'yt_dlp' in sys.modules}))
+"""
+
+def probe(module: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', PROBE, module], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_startup', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块重复测量的次数')
+    parser.add_argument('--modules', default=','.join(MODULES), help='要测量的模块，逗号分隔')
+    args = parser.parse_args(argv)
+    eager = []
+    for module in args.modules.split(','):
+        results = [probe(module) for _ in range(args.repeat)]
+        if 'error' in results[0]:
+            print(f"{module:24} 跳过（{results[0]['error']}）")
+            continue
+        seconds = [result['seconds'] for result in results]
+        print(f"{module:24} 中位数 {statistics.median(seconds) * 1000:6.1f} ms，最大 {max(seconds) * 1000:6.1f} ms")
+        if any(result['yt_dlp'] for result in results):
+            eager.append(module)
+    for module in eager:
+        print(f"回归：导入 {module} 时加载了 yt_dlp", file=sys.stderr)
+    return 1 if eager else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+本地假视频服务器，提供合成的媒体数据：
+
+    /progressive/<名称>.mp4?size=字节数          支持 Range 请求的普通文件
+    /hls/<名称>/index.m3u8?segments=N&size=字节数  HLS 媒体播放列表及其 .ts 分片
+    /dash/<名称>/manifest.mpd?segments=N&size=字节数  含视频、音频两路的 DASH 清单及分片
+
+所有路径都可以加 rate=字节/秒 参数模拟慢速服务器。内容是重复的固定字节，只用于测量调度和 I/O 开销，
+不是可以播放的媒体文件（DASH 合并需要真实的 ffmpeg 时会失败，用 --kinds 排除即可）。
+"""
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK = 64 * 1024
+_BLOCK = b'\0' * CHUNK
+
+def _param(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except ValueError:
+        return default
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body: bool):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        size = _param(query, 'size', 4 * 1024 * 1024)
+        rate = _param(query, 'rate', 0)
+        segments = _param(query, 'segments', 10)
+        if path.startswith('/progressive/'):
+            self._send_bytes(size, 'video/mp4', rate, send_body)
+        elif path.endswith('/index.m3u8'):
+            self._send_text(self._m3u8(segments, size, rate), 'application/vnd.apple.mpegurl', send_body)
+        elif path.endswith('/manifest.mpd'):
+            self._send_text(self._mpd(segments, size, rate), 'application/dash+xml', send_body)
+        elif re.search(r'/seg\d+\.(ts|m4s)$', path) or path.endswith('/init.mp4'):
+            self._send_bytes(max(size // max(segments, 1), 1), 'video/mp2t', rate, send_body)
+        else:
+            self.send_error(404)
+
+    @staticmethod
+    def _m3u8(segments: int, size: int, rate: int) -> str:
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(segments):
+            lines += ['#EXTINF:4.0,', f'seg{i}.ts?size={size}&segments={segments}&rate={rate}']
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _mpd(segments: int, size: int, rate: int) -> str:
+        duration = segments * 4
+        query = f'size={size}&amp;segments={segments}&amp;rate={rate}'
+
+        def representation(rep_id, mime, codecs, bandwidth, extra):
+            segment_list = ''.join(f'<SegmentURL media="{rep_id}/seg{i}.m4s?{query}"/>' for i in range(segments))
+            return (f'<AdaptationSet mimeType="{mime}"><Representation id="{rep_id}" codecs="{codecs}" '
+                    f'bandwidth="{bandwidth}" {extra}><SegmentList duration="4" timescale="1">'
+                    f'<Initialization sourceURL="{rep_id}/init.mp4?{query}"/>{segment_list}'
+                    f'</SegmentList></Representation></AdaptationSet>')
+
+        return ('<?xml version="1.0"?>'
+                '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+                f'mediaPresentationDuration="PT{duration}S" minBufferTime="PT2S" '
+                'profiles="urn:mpeg:dash:profile:isoff-main:2011"><Period>'
+                + representation('video', 'video/mp4', 'avc1.64001f', 2000000, 'width="1280" height="720"')
+                + representation('audio', 'audio/mp4', 'mp4a.40.2', 128000, 'audioSamplingRate="44100"')
+                + '</Period></MPD>')
+
+    def _send_text(self, text: str, content_type: str, send_body: bool):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_bytes(self, size: int, content_type: str, rate: int, send_body: bool):
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            end = min(end, size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        length = end - start + 1
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+        sent = 0
+        started = time.monotonic()
+        try:
+            while sent < length:
+                block = min(CHUNK, length - sent)
+                self.wfile.write(_BLOCK[:block])
+                sent += block
+                if rate:
+                    # 按指定速度发送：提前了就等一等
+                    ahead = sent / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端取消或暂停下载
+
+
+class FakeMediaServer:
+    """在后台线程中运行 FakeMediaHandler，port=0 时自动选择空闲端口"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), FakeMediaHandler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-media-server', daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, kind: str, name: str, size: int, segments: int = 10, rate: int = 0) -> str:
+        query = f'size={size}&segments={segments}&rate={rate}'
+        if kind == 'progressive':
+            return f'{self.base_url}/progressive/{name}.mp4?{query}'
+        if kind == 'hls':
+            return f'{self.base_url}/hls/{name}/index.m3u8?{query}'
+        if kind == 'dash':
+            return f'{self.base_url}/dash/{name}/manifest.mpd?{query}'
+        raise ValueError(f'未知的媒体类型: {kind}')
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    with FakeMediaServer(port=8765) as server:
+        print(f'假视频服务器运行在 {server.base_url}，按 Ctrl+C 退出')
+        for kind in ('progressive', 'hls', 'dash'):
+            print(' ', server.url(kind, 'sample', 8 * 1024 * 1024))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+_RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$', re.I)
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def parse_rate(text: str) -> Optional[float]:
+    """把 '500K'、'2M'、'1.5MB/s' 之类的写法转换为字节/秒；空值、0 表示不限速，返回 None"""
+    text = (text or '').strip()
+    if not text or text.lower() in ('0', 'none', 'unlimited', 'inf'):
+        return None
+    match = _RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"无法识别的速度: {text}")
+    rate = float(match.group(1)) * _UNITS[match.group(2).upper()]
+    return rate or None
+
+def format_rate(rate: Optional[float]) -> str:
+    if not rate:
+        return '不限速'
+    if rate >= 1024 * 1024:
+        return f"{rate / 1024 / 1024:.1f} MB/s"
+    return f"{rate / 1024:.0f} KB/s"
+
+
+class BandwidthSchedule:
+    """
+    按时间段设置全局限速，例如 '09:00-18:00=1M' 表示工作时间限速 1 MB/s。
+    时间段可以跨过午夜（'22:00-06:00=0' 表示夜间不限速）；多个时间段按顺序匹配第一个。
+    """
+
+    _WINDOW_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+
+    def __init__(self, windows: List[Tuple[int, int, Optional[float]]] = None):
+        self.windows = windows or []  # (开始分钟, 结束分钟, 速度)
+
+    @classmethod
+    def parse(cls, specs: List[str]) -> 'BandwidthSchedule':
+        windows = []
+        for spec in specs:
+            for part in spec.split(','):
+                if not part.strip():
+                    continue
+                match = cls._WINDOW_RE.match(part)
+                if not match:
+                    raise ValueError(f"无法识别的时间段: {part}")
+                h1, m1, h2, m2, rate = match.groups()
+                windows.append((int(h1) * 60 + int(m1), int(h2) * 60 + int(m2), parse_rate(rate)))
+        return cls(windows)
+
+    def lookup(self, now: Optional[float] = None) -> Tuple[bool, Optional[float]]:
+        """返回 (是否落在某个时间段内, 该时间段的速度)"""
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.windows:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return True, rate
+        return False, None
+
+
+class _Share:
+    __slots__ = ('params', 'weight', 'rate', 'connections')
+
+    def __init__(self, params: Dict, weight: float, connections: int = 1):
+        self.params = params
+        self.weight = weight
+        self.rate: Optional[float] = None  # 分给该任务的总速度
+        self.connections = connections  # 同时下载的连接数，ratelimit 对每个连接分别生效
+
+
+class BandwidthManager:
+    """
+    在下载中的任务之间分配全局带宽。
+
+    每个任务按优先级得到权重，按权重公平分配总速度；实际速度明显低于所得份额的任务
+    （受服务器限制）只保留略高于实测速度的份额，剩余部分分给其他任务。
+    分配结果直接写入各任务 YoutubeDL 实例的 params['ratelimit']。
+
+    普通（单连接）下载每个数据块都会重新读取 params，调整立即生效。HLS/DASH 分片下载
+    （yt-dlp 的 FragmentFD）在开始下载一个格式时复制 params，之后的调整要到该任务下一次
+    分片下载（例如分开下载的音频流、重试）才生效；而且 ratelimit 对每个分片连接分别生效，
+    因此写入的是任务份额除以分片并发数（connections）。
+    定期重新分配由 loop（core.event_loop.CoreLoop）的定时器执行，未传入时使用自己的后台线程。
+    """
+
+    def __init__(self, global_limit: Optional[float] = None, schedule: Optional[BandwidthSchedule] = None,
+                 speed_of: Optional[Callable[[int], float]] = None, interval: float = 2.0,
+                 min_rate: float = 16 * 1024, loop=None):
+        self.global_limit = global_limit
+        self.schedule = schedule or BandwidthSchedule()
+        self.speed_of = speed_of  # task_id -> 实测速度（字节/秒）
+        self.interval = interval
+        self.min_rate = min_rate
+        self._shares: Dict[int, _Share] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if loop is not None:
+            loop.call_every(self.interval, self._tick)
+        else:
+            threading.Thread(target=self._run, name='bandwidth-manager', daemon=True).start()
+
+    @staticmethod
+    def weight_for(priority: int) -> float:
+        return float(max(priority, 0) + 1)
+
+    def current_limit(self) -> Optional[float]:
+        matched, rate = self.schedule.lookup()
+        return rate if matched else self.global_limit
+
+    def set_global_limit(self, limit: Optional[float]):
+        self.global_limit = limit
+        self.rebalance()
+
+    def set_schedule(self, schedule: BandwidthSchedule):
+        self.schedule = schedule
+        self.rebalance()
+
+    def register(self, task_id: int, params: Dict, priority: int = 0, connections: int = 1):
+        """下载开始时登记该任务 YoutubeDL 实例的 params；connections 为分片并发数"""
+        with self._lock:
+            self._shares[task_id] = _Share(params, self.weight_for(priority), max(connections, 1))
+        self.rebalance()
+
+    def set_connections(self, task_id: int, connections: int):
+        """下载开始后才知道是否为分片格式：普通下载只有一个连接"""
+        with self._lock:
+            share = self._shares.get(task_id)
+            if share is None or share.connections == max(connections, 1):
+                return
+            share.connections = max(connections, 1)
+        self.rebalance()
+
+    def unregister(self, task_id: int):
+        with self._lock:
+            self._shares.pop(task_id, None)
+        self.rebalance()
+
+    def set_priority(self, task_id: int, priority: int):
+        with self._lock:
+            share = self._shares.get(task_id)
+            if share is None:
+                return
+            share.weight = self.weight_for(priority)
+        self.rebalance()
+
+    def rate_of(self, task_id: int) -> Optional[float]:
+        with self._lock:
+            share = self._shares.get(task_id)
+            return share.rate if share else None
+
+    def rebalance(self):
+        limit = self.current_limit()
+        with self._lock:
+            shares = dict(self._shares)
+            rates = self._allocate(limit, shares) if limit else dict.fromkeys(shares)
+            for task_id, share in shares.items():
+                share.rate = rates[task_id]
+                share.params['ratelimit'] = share.rate / share.connections if share.rate else share.rate
+
+    def _allocate(self, limit: float, shares: Dict[int, _Share]) -> Dict[int, float]:
+        """按权重注水分配：需求低于份额的任务先满足，剩余带宽在其余任务间继续按权重分配"""
+        demands = {}
+        for task_id, share in shares.items():
+            speed = self.speed_of(task_id) if self.speed_of else 0.0
+            # 实测速度明显低于当前份额，说明瓶颈不在本地限速；留出 25% 余量让它可以继续提速
+            if speed and share.rate and speed < share.rate * 0.8:
+                demands[task_id] = speed * 1.25
+        rates = {}
+        remaining = limit
+        pending = dict(shares)
+        while pending:
+            total_weight = sum(share.weight for share in pending.values())
+            satisfied = [task_id for task_id in pending
+                         if task_id in demands and demands[task_id] <= remaining * pending[task_id].weight / total_weight]
+            if not satisfied:
+                for task_id, share in pending.items():
+                    rates[task_id] = remaining * share.weight / total_weight
+                break
+            for task_id in satisfied:
+                rates[task_id] = demands[task_id]
+                remaining -= demands[task_id]
+                del pending[task_id]
+        else:
+            # 所有任务都受服务器限制，剩余带宽仍按权重分出去，避免限速收得过紧
+            total_weight = sum(share.weight for share in shares.values())
+            for task_id, share in shares.items():
+                rates[task_id] += max(remaining, 0) * share.weight / total_weight
+        return {task_id: max(rate, self.min_rate) for task_id, rate in rates.items()}
+
+    def _tick(self) -> bool:
+        # 定期按实测速度重新分配，同时让按时间段的限速在边界处生效
+        if self._stop.is_set():
+            return False
+        if self._shares:
+            self.rebalance()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._tick()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,388 @@
+import hmac
+import json
+import os
+import queue
+import threading
+from dataclasses import asdict
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .format_profiles import ProfileError, profile_from_options, with_profile
+from .url_ingest import extract_urls, prepare_batch, summarize_batch
+
+MAX_BODY = 10 * 1024 * 1024  # 提交请求的最大长度（字节）
+KEEPALIVE_INTERVAL = 15.0  # SSE 连接空闲时发送注释行的间隔（秒）
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def task_info(task, progress=None) -> Dict:
+    """排队、下载中、暂停和后处理中的任务，转换为可以直接序列化为 JSON 的字典"""
+    info = {
+        'task_id': task.task_id,
+        'url': task.url,
+        'state': task.state,
+        'priority': task.priority,
+        'group_id': task.group_id,
+        'save_path': task.save_path,
+        'options': task.options,
+        'attempts': task.attempts,
+        'error': task.error,
+    }
+    if task.metadata is not None:
+        info.update(title=task.metadata.title, filename=task.metadata.filename, filesize=task.metadata.filesize)
+    if progress is not None:
+        info['progress'] = asdict(progress)
+    return info
+
+
+def group_info(group) -> Dict:
+    return {
+        'task_id': group.group_id,
+        'url': group.url,
+        'state': 'playlist',
+        'title': group.title,
+        'total': group.total,
+        'done': group.done,
+        'failed': group.failed,
+        'skipped': group.skipped,
+        'percent': group.percent,
+        'child_ids': list(group.child_ids),
+    }
+
+
+class EventStream:
+    """
+    把 DownloadManager 的事件转换为 SSE 消息，分发给每个连接各自的有界队列。
+
+    每条事件只序列化一次；没有连接时不做任何处理。队列满了（客户端读得太慢）的连接会被断开，
+    客户端重新连接后可以先读取 /api/tasks 获得完整状态。
+    """
+
+    def __init__(self, download_manager, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self._clients: List[queue.Queue] = []
+        self._lock = threading.Lock()
+        dm = download_manager
+        dm.progress_updated.connect(lambda snapshots: self.publish('progress', [asdict(s) for s in snapshots]))
+        dm.task_state_changed.connect(lambda task_id, state: self.publish('state', {'task_id': task_id,
+                                                                                      'state': state}))
+        dm.download_completed.connect(lambda task_id: self.publish('completed', self._completed(dm, task_id)))
+        dm.download_error.connect(lambda task_id, error: self.publish('error', {'task_id': task_id,
+                                                                                  'error': error}))
+        dm.task_added.connect(lambda task: self.publish('added', task_info(task)))
+        dm.group_updated.connect(lambda group: self.publish('group', group_info(group)))
+        dm.queue_updated.connect(lambda queued, active: self.publish('queue', {'queued': queued,
+                                                                                 'active': active}))
+        dm.retry_scheduled.connect(lambda retry: self.publish('retry', asdict(retry)))
+
+    @staticmethod
+    def _completed(download_manager, task_id: int) -> Dict:
+        result = download_manager.task_result(task_id)
+        return asdict(result) if result is not None else {'task_id': task_id}
+
+    def subscribe(self) -> queue.Queue:
+        client = queue.Queue(self.max_pending)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, event: str, data):
+        with self._lock:
+            clients = list(self._clients)
+        if not clients:
+            return
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode('utf-8')
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                # 丢弃积压的消息，通知该连接关闭
+                self.unsubscribe(client)
+                with client.mutex:
+                    client.queue.clear()
+                client.put_nowait(None)
+
+
+class ControlApi:
+    """
+    本机控制接口的处理逻辑，直接操作 DownloadManager，不依赖图形界面。
+
+    提交时指定的 save_path 只能是 save_path（下载目录）或其子目录，相对路径按下载目录解析。
+    defaults 为提交时未指定的选项（下载类型、画质、格式等，取值与界面相同），
+    history_writer（HistoryBatcher）不为 None 时，提交的链接会先与下载历史比对，跳过已下载过的视频。
+    """
+
+    def __init__(self, download_manager, save_path: str, defaults: Dict, history_writer=None):
+        self.download_manager = download_manager
+        self.save_path = save_path
+        self.defaults = dict(defaults)
+        self.history_writer = history_writer
+        self.events = EventStream(download_manager)
+
+    def status(self) -> Dict:
+        """汇总状态，开销很小，适合看板频繁轮询"""
+        dm = self.download_manager
+        tasks = dm.queue_manager.list_tasks()
+        speeds = [progress.speed for progress in map(dm.get_progress, (task.task_id for task in tasks))
+                  if progress is not None]
+        states: Dict[str, int] = {}
+        for task in tasks:
+            states[task.state] = states.get(task.state, 0) + 1
+        snapshot = dm.metrics.snapshot()
+        return {
+            'queued': dm.queue_manager.get_queue_size(),
+            'active': dm.queue_manager.get_active_count(),
+            'postprocessing': dm.postprocess_stage.pending_count(),
+            'playlists': len(dm.list_groups()),
+            'states': states,
+            'speed': sum(speeds),
+            'idle': dm.is_idle(),
+            'counters': snapshot['counters'],
+        }
+
+    def list_tasks(self, state: Optional[str] = None) -> Dict:
+        dm = self.download_manager
+        tasks = [task_info(task, dm.get_progress(task.task_id)) for task in dm.queue_manager.list_tasks()
+                 if state is None or task.state == state]
+        groups = [group_info(group) for group in dm.list_groups()] if state in (None, 'playlist') else []
+        return {'tasks': tasks, 'playlists': groups}
+
+    def get_task(self, task_id: int) -> Dict:
+        dm = self.download_manager
+        task = dm.queue_manager.get_task(task_id)
+        if task is not None:
+            return task_info(task, dm.get_progress(task_id))
+        group = dm.get_group(task_id)
+        if group is not None:
+            return group_info(group)
+        result = dm.task_result(task_id)
+        if result is not None:
+            return dict(asdict(result), state='done')
+        raise ApiError(404, f"任务不存在或已结束: {task_id}")
+
+    def submit(self, body: Dict) -> Dict:
+        """
+        批量提交：{"urls": [...]} 或 {"text": "包含链接的任意文本"}，
+        可选 "save_path"、"options"、"priority"、"force"（忽略下载历史）。
+        """
+        urls = body.get('urls') or []
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise ApiError(400, "urls 必须是字符串列表")
+        if isinstance(body.get('text'), str):
+            urls = urls + extract_urls(body['text'])
+        if not urls:
+            raise ApiError(400, "没有可下载的链接")
+        overrides = body.get('options') or {}
+        if not isinstance(overrides, dict):
+            raise ApiError(400, "options 必须是对象")
+        unknown = set(overrides) - set(self.defaults) - {'profile'}
+        if unknown:
+            raise ApiError(400, f"未知的选项: {', '.join(sorted(unknown))}")
+        options = dict(self.defaults, **overrides)
+        try:
+            if options.get('profile'):
+                options = with_profile(options, options['profile'])
+            profile_from_options(options)
+        except ProfileError as e:
+            raise ApiError(400, str(e))
+        save_path = self._resolve_save_path(body.get('save_path'))
+        try:
+            priority = int(body.get('priority', 0))
+        except (TypeError, ValueError):
+            raise ApiError(400, "priority 必须是整数")
+        playlist = options.get('download_type') == '播放列表'
+        history = None
+        if self.history_writer is not None and not body.get('force'):
+            self.history_writer.flush()  # 刚完成的任务也要参与重复检查
+            history = self.history_writer.history_manager
+        batch = prepare_batch(urls, history, playlist)
+        dm = self.download_manager
+        task_ids = dm.add_downloads(batch.new, save_path, options, priority) if batch.new else []
+        added = [task_id for task_id in task_ids if task_id is not None]
+        for task_id in added:
+            task = dm.queue_manager.get_task(task_id)
+            if task is not None:
+                dm.task_added.emit(task)  # 界面据此为提交的任务各加一行
+        pending = len(task_ids) - len(added)
+        return {
+            'task_ids': added,
+            'pending': pending,
+            'downloaded': batch.downloaded,
+            'repeated': batch.repeated,
+            'summary': summarize_batch(batch, len(added), pending, len(batch.downloaded)),
+        }
+
+    def _resolve_save_path(self, save_path) -> str:
+        if not save_path:
+            return self.save_path
+        if not isinstance(save_path, str):
+            raise ApiError(400, "save_path 必须是字符串")
+        root = os.path.realpath(self.save_path)
+        path = os.path.realpath(os.path.join(root, save_path))
+        if os.path.commonpath([root, path]) != root:
+            raise ApiError(403, f"save_path 必须在下载目录 {self.save_path} 之内")
+        return path
+
+    def control(self, task_id: int, action: str) -> Dict:
+        dm = self.download_manager
+        handler = {'cancel': dm.cancel_task, 'pause': dm.pause_task, 'resume': dm.resume_task,
+                   'top': dm.move_task_to_top}.get(action)
+        if handler is None:
+            raise ApiError(404, f"未知的操作: {action}")
+        if dm.queue_manager.get_task(task_id) is None and dm.get_group(task_id) is None:
+            raise ApiError(404, f"任务不存在或已结束: {task_id}")
+        return {'task_id': task_id, 'action': action, 'ok': bool(handler(task_id))}
+
+
+def serve_control_api(api: ControlApi, port: int, host: str = '127.0.0.1', token: Optional[str] = None):
+    """
+    在后台线程中提供本机控制接口，返回 ThreadingHTTPServer：
+
+        GET  /api/status                      汇总状态
+        GET  /api/tasks[?state=queued]        任务列表
+        GET  /api/tasks/<id>                  单个任务（已完成的任务返回结果）
+        POST /api/tasks                       批量提交
+        POST /api/tasks/<id>/<操作>           cancel / pause / resume / top
+        DELETE /api/tasks/<id>                取消
+        GET  /api/events                      SSE 事件流（progress、state、completed、error 等）
+
+    token 不为 None 时，请求需要带 Authorization: Bearer <token> 头（或 ?token= 参数，供 EventSource 使用）。
+    POST 只接受 application/json，网页无法通过简单请求跨站提交任务；
+    Host 头只接受 127.0.0.1:<端口> 或 localhost:<端口>，防止 DNS 重绑定的网页访问接口。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, data):
+            body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if status >= 400:
+                # 出错时请求体可能没有读完，不再复用连接
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _host_allowed(self) -> bool:
+            port = self.server.server_address[1]
+            allowed = {f'127.0.0.1:{port}', f'localhost:{port}', f'{host}:{port}'}
+            return (self.headers.get('Host') or '').lower() in allowed
+
+        def _token_ok(self, query: Dict) -> bool:
+            # 逐字节比较耗时与内容无关，不能通过响应时间猜出令牌
+            expected = token.encode('utf-8')
+            header = (self.headers.get('Authorization') or '').encode('utf-8')
+            param = (query.get('token', [''])[0]).encode('utf-8')
+            return hmac.compare_digest(header, b'Bearer ' + expected) or hmac.compare_digest(param, expected)
+
+        def _route(self, method: str):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                if not self._host_allowed():
+                    raise ApiError(403, "不允许的 Host")
+                if token is not None and not self._token_ok(query):
+                    raise ApiError(401, "需要访问令牌")
+                parts = [part for part in url.path.split('/') if part]
+                if parts[:1] != ['api'] or len(parts) < 2:
+                    raise ApiError(404, "未知的路径")
+                self._dispatch(method, parts[1:], query)
+            except ApiError as e:
+                self._send_json(e.status, {'error': str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+
+        def _dispatch(self, method: str, parts: List[str], query: Dict):
+            if parts == ['status'] and method == 'GET':
+                self._send_json(200, api.status())
+            elif parts == ['events'] and method == 'GET':
+                self._stream_events()
+            elif parts == ['tasks'] and method == 'GET':
+                self._send_json(200, api.list_tasks(query.get('state', [None])[0]))
+            elif parts == ['tasks'] and method == 'POST':
+                self._send_json(201, api.submit(self._read_json()))
+            elif len(parts) in (2, 3) and parts[0] == 'tasks':
+                try:
+                    task_id = int(parts[1])
+                except ValueError:
+                    raise ApiError(404, f"无效的任务 id: {parts[1]}")
+                if len(parts) == 2 and method == 'GET':
+                    self._send_json(200, api.get_task(task_id))
+                elif len(parts) == 2 and method == 'DELETE':
+                    self._send_json(200, api.control(task_id, 'cancel'))
+                elif len(parts) == 3 and method == 'POST':
+                    self._send_json(200, api.control(task_id, parts[2]))
+                else:
+                    raise ApiError(405, "不支持的请求方法")
+            else:
+                raise ApiError(404, "未知的路径")
+
+        def _read_json(self) -> Dict:
+            if self.headers.get_content_type() != 'application/json':
+                raise ApiError(415, "请求体必须是 application/json")
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY:
+                raise ApiError(413, "请求体过大")
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                raise ApiError(400, "请求体不是有效的 JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "请求体必须是 JSON 对象")
+            return body
+
+        def _stream_events(self):
+            client = api.events.subscribe()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                self.wfile.write(b': connected\n\n')
+                self.wfile.flush()
+                while True:
+                    try:
+                        message = client.get(timeout=KEEPALIVE_INTERVAL)
+                    except queue.Empty:
+                        message = b': keepalive\n\n'
+                    if message is None:
+                        break
+                    self.wfile.write(message)
+                    self.wfile.flush()
+            finally:
+                api.events.unsubscribe(client)
+
+        def do_GET(self):
+            self._route('GET')
+
+        def do_POST(self):
+            self._route('POST')
+
+        def do_DELETE(self):
+            self._route('DELETE')
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='control-api', daemon=True).start()
+    return server
@@ -0,0 +1,158 @@
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .bandwidth import parse_rate
+
+
+def parse_size(text: str) -> int:
+    """把 '500M'、'2G' 之类的写法转换为字节数；空值、0 返回 0"""
+    try:
+        return int(parse_rate(text) or 0)
+    except ValueError:
+        raise ValueError(f"无法识别的大小: {text}") from None
+
+
+def format_size(size: float) -> str:
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:.1f} GB"
+    return f"{size / 1024 ** 2:.0f} MB"
+
+
+def _existing(path: str) -> str:
+    """保存目录可能还没有创建，按最近的已存在的上级目录判断所在的磁盘"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+@dataclass
+class _Reservation:
+    task: Any  # DownloadTask
+    download_device: int  # 下载（.part 文件、分片）写入的磁盘
+    download_bytes: int
+    final_device: int  # 保存目录所在的磁盘
+    final_bytes: int  # 从临时目录移入的文件，以及合并/转码的输出
+    written_base: int = 0  # 开始时已写入的字节数（重试前的尝试已经下载完成的文件）
+
+
+@dataclass(frozen=True)
+class SpaceShortage:
+    """任务因磁盘空间不足而暂缓开始"""
+    path: str
+    needed: int  # 需要的字节数（含保留余量）
+    available: int  # 扣除其他下载中任务的预留后可用的字节数
+
+    @property
+    def text(self) -> str:
+        return f"等待磁盘空间（需要约 {format_size(self.needed)}，可用 {format_size(self.available)}）"
+
+
+class DiskSpaceGuard:
+    """
+    按预解析得到的文件大小做准入控制：磁盘剩余空间（扣除下载中任务的预留）不够时任务暂缓开始。
+
+    每个开始下载的任务按预计大小预留空间：下载写入的磁盘预留文件大小（随已下载的字节数递减），
+    需要合并/转码时保存目录所在的磁盘再预留一份输出文件的大小；使用单独的临时目录且不在同一磁盘时，
+    下载完成后文件还要移入保存目录，保存目录所在的磁盘也要预留文件大小。
+    min_free 为每个磁盘始终保留的余量；written(task) 返回任务已经写入的字节数。
+    """
+
+    USAGE_TTL = 1.0  # 剩余空间的缓存时间（秒），同一轮调度中不重复查询
+    RECHECK_INTERVAL = 30.0  # 有任务在等待空间时，隔多久重新检查一次（期间可能清理了磁盘）
+    METADATA_WAIT = 5.0  # 任务开始前最多等待预解析给出文件大小的时间（秒）
+
+    def __init__(self, min_free: int = 512 * 1024 ** 2, written: Optional[Callable[[Any], int]] = None,
+                 usage: Callable = shutil.disk_usage):
+        self.min_free = min_free
+        self.written = written
+        self.usage = usage
+        self._reservations: Dict[int, _Reservation] = {}
+        self._usage_cache: Dict[int, Tuple[float, int]] = {}  # 磁盘 -> (查询时间, 剩余字节数)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def device_of(path: str) -> int:
+        return os.stat(_existing(path)).st_dev
+
+    def _free(self, device: int, path: str) -> int:
+        now = time.monotonic()
+        cached = self._usage_cache.get(device)
+        if cached is not None and now - cached[0] < self.USAGE_TTL:
+            return cached[1]
+        free = self.usage(_existing(path)).free
+        self._usage_cache[device] = (now, free)
+        return free
+
+    def _outstanding(self, device: int) -> int:
+        total = 0
+        for reservation in self._reservations.values():
+            if reservation.download_device == device:
+                total += max(reservation.download_bytes - self._written(reservation), 0)
+            if reservation.final_device == device:
+                total += reservation.final_bytes
+        return total
+
+    def _written(self, reservation: _Reservation) -> int:
+        if self.written is None:
+            return 0
+        return self.written(reservation.task) - reservation.written_base
+
+    def admit(self, task, size: Optional[int], postprocess: bool,
+              temp_path: Optional[str] = None) -> Optional[SpaceShortage]:
+        """空间足够时为任务预留空间并返回 None，否则返回 SpaceShortage；大小未知时只检查保留余量"""
+        size = size or 0
+        save_path = task.save_path
+        try:
+            final_device = self.device_of(save_path)
+            download_device = self.device_of(temp_path) if temp_path else final_device
+        except OSError:
+            return None  # 无法判断所在磁盘，交给下载阶段报告错误
+        final_bytes = size if postprocess else 0
+        if download_device != final_device:
+            final_bytes += size  # 下载完成后从临时目录移入保存目录
+        needs = {final_device: (save_path, final_bytes)}
+        download_path, download_bytes = needs.get(download_device, (temp_path, 0))
+        needs[download_device] = (download_path, download_bytes + size)
+        with self._lock:
+            self._reservations.pop(task.task_id, None)
+            for device, (path, needed) in needs.items():
+                try:
+                    available = self._free(device, path) - self._outstanding(device)
+                except OSError:
+                    continue
+                if available < needed + self.min_free:
+                    return SpaceShortage(path, needed + self.min_free, max(available, 0))
+            base = self.written(task) if self.written is not None else 0
+            # 缓存的剩余空间不变，之后的任务通过 _outstanding 扣除这次预留
+            self._reservations[task.task_id] = _Reservation(task, download_device, size, final_device,
+                                                            final_bytes, base)
+            return None
+
+    def download_finished(self, task_id: int):
+        """文件已经全部落盘（并移入保存目录），只保留合并/转码输出的预留"""
+        with self._lock:
+            reservation = self._reservations.get(task_id)
+            if reservation is None:
+                return
+            moved = reservation.download_bytes if reservation.download_device != reservation.final_device else 0
+            reservation.download_bytes = 0
+            reservation.final_bytes = max(reservation.final_bytes - moved, 0)
+
+    def release(self, task_id: int):
+        with self._lock:
+            self._reservations.pop(task_id, None)
+
+    def reserved(self) -> int:
+        """所有磁盘上尚未写入的预留字节数合计"""
+        with self._lock:
+            devices = {r.download_device for r in self._reservations.values()} | \
+                      {r.final_device for r in self._reservations.values()}
+            return sum(self._outstanding(device) for device in devices)
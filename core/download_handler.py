@@ -12,10 +12,8 @@ def handle_existing_download(url: str, save_path: str, filename: str, history_ma
         history_manager: HistoryManager 对象。
     """
     # 从历史记录中删除该条记录
-    history_entries = history_manager.search_history(url)
-    for entry in history_entries:
-        history_manager.history.remove(entry)
-    history_manager.save_history()
+    history_entries = history_manager.find_by_url(url, offline_only=True)
+    history_manager.remove_entries(history_entries)
 
     # 删除硬盘上已存在的文件
     file_path = os.path.join(save_path, filename)
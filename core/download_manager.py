@@ -1,31 +1,368 @@
-import yt_dlp
-from PySide6.QtCore import QObject, Signal
 import os
-from .queue_manager import QueueManager, DownloadTask
-
-class DownloadProgress:
-    def __init__(self):
-        self.filename = ""
-        self.percent = 0
-        self.speed = ""
-        self.status = "等待中"
-
-class DownloadManager(QObject):
-    progress_updated = Signal(str, DownloadProgress)
-    download_completed = Signal(str)
-    download_error = Signal(str, str)
-    queue_updated = Signal(int, int)  # 队列大小, 活动下载数
-
-    def __init__(self):
-        super().__init__()
-        self.active_downloads = {}
-        self.queue_manager = QueueManager(max_concurrent=3)
-        
-    def add_download(self, url: str, save_path: str, options: dict):
-        task = DownloadTask(url, save_path, options)
-        self.queue_manager.add_task(task)
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional
+from .bandwidth import BandwidthManager, BandwidthSchedule
+from .disk_space import DiskSpaceGuard, SpaceShortage
+from .event_loop import CoreLoop
+from .events import Event
+from .format_profiles import format_params
+from .fragment_tuner import FragmentTuner
+from .info_cache import InfoCache
+from .job_journal import JobJournal
+from .metadata_prefetcher import MetadataPrefetcher, TaskMetadata
+from .metrics import MetricsCollector, TaskLogger
+from .playlist_expander import PlaylistGroup, expand_playlist
+from .postprocess import (STREAM_OUTTMPL, PostprocessCancelled, PostprocessJob, PostprocessStage, plan_postprocess,
+                          separate_streams, strip_format_id)
+from .progress import DownloadProgress, ProgressAggregator
+from .queue_manager import QueueManager, DownloadTask, TaskResult, TaskState, new_task_id
+from .retry_policy import ErrorKind, RetryInfo, RetryPolicy, classify_error
+from .video_id import canonical_key
+from .worker_pool import WorkerPool
+from .ydl_pool import YoutubeDLPool
+
+class DownloadManager:
+    """
+    下载调度核心，不依赖 Qt。
+
+    调度、任务结束处理、自动重试、播放列表展开后的入队和进度合并都在 core_loop（asyncio 事件循环）中进行，
+    阻塞的 yt-dlp 调用交给 worker_pool（executor 为 'thread' 时在工作线程中运行，
+    为 'process' 时在子进程中运行，避免大量并发下载争抢 GIL）。
+    事件在事件循环或工作线程中发出；图形界面通过 ui.download_bridge 转为 Qt 信号，
+    无界面模式（core.headless）直接订阅这些事件。
+    """
+
+    def __init__(self, max_concurrent=3, host_limits=None, progress_rate=10.0,
+                 info_cache: Optional[InfoCache] = None, journal: Optional[JobJournal] = None,
+                 retry_policy: Optional[RetryPolicy] = None, rate_limit: Optional[float] = None,
+                 rate_schedule: Optional[BandwidthSchedule] = None, max_fragment_workers: int = 16,
+                 postprocess_workers: Optional[int] = None, executor: str = 'thread',
+                 temp_path: Optional[str] = None, min_free_space: int = 512 * 1024 ** 2):
+        self.progress_updated = Event()    # (List[DownloadProgress])，按 progress_rate 合并后批量发出
+        self.download_completed = Event()  # (task_id)
+        self.download_error = Event()      # (task_id, 错误信息)
+        self.task_state_changed = Event()  # (task_id, TaskState)
+        self.task_added = Event()          # (DownloadTask)，播放列表展开出的子任务、通过控制接口提交的任务
+        self.group_updated = Event()       # (PlaylistGroup)，播放列表任务组的汇总进度
+        self.queue_updated = Event()       # (队列大小, 活动下载数)
+        self.metadata_ready = Event()      # (task_id, TaskMetadata)，排队期间预解析出的文件名、大小等
+        self.retry_scheduled = Event()     # (RetryInfo)，失败任务已重新排队等待自动重试
+        self.core_loop = CoreLoop()
+        self.progress = ProgressAggregator(self.progress_updated.emit, rate_hz=progress_rate, loop=self.core_loop)
+        self.queue_manager = QueueManager(max_concurrent=max_concurrent, host_limits=host_limits)
+        self.worker_pool = WorkerPool(max_workers=max_concurrent, mode=executor)
+        # 播放列表展开只做网络枚举，使用独立的小线程池，不占用下载槽位
+        self.playlist_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='playlist-expander')
+        self.groups: Dict[int, PlaylistGroup] = {}
+        self._groups_lock = threading.Lock()
+        # 排队期间预先解析视频信息，下载时直接复用缓存，不再重复解析网页
+        self.info_cache = info_cache if info_cache is not None else InfoCache()
+        # 相同选项的任务复用 YoutubeDL 实例，共享提取器、cookies、HTTP 会话和播放器脚本缓存
+        self.ydl_pool = YoutubeDLPool(max_idle=max_concurrent + 2)
+        self.prefetcher = MetadataPrefetcher(self.info_cache, pool=self.ydl_pool)
+        self.journal = journal  # 为 None 时不记录任务日志，退出后队列不保留
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # 全局限速（字节/秒，None 表示不限速）按优先级在下载中的任务之间分配
+        self.bandwidth = BandwidthManager(rate_limit, rate_schedule, speed_of=self._measured_speed,
+                                          loop=self.core_loop)
+        # HLS/DASH 分片并发数，所有下载中任务合计不超过 max_fragment_workers
+        self.fragment_tuner = FragmentTuner(max_total=max_fragment_workers)
+        # 合并/转码在独立的后处理阶段进行（默认按 CPU 核数并发），不占用下载槽位
+        self.postprocess_stage = PostprocessStage(postprocess_workers)
+        # 下载中的 .part 文件和分片写入 temp_path（例如 SSD），完成后由 yt-dlp 移入保存目录；None 表示直接写入保存目录
+        self.temp_path = temp_path
+        # 按预计文件大小预留磁盘空间，空间不够的任务暂缓开始，而不是下载到一半才失败
+        self.disk_guard = DiskSpaceGuard(min_free_space, written=self._written_bytes)
+        self.queue_manager.admission = self._admit
+        self._held: Dict[int, SpaceShortage] = {}  # 因磁盘空间不足暂缓的任务（只在事件循环中访问）
+        # 预解析中的任务 -> 等待其结果（文件大小）的截止时间（time.monotonic()）
+        self._prefetch_deadlines: Dict[int, float] = {}
+        self._waiting_metadata = set()  # 因等待预解析而暂缓、已安排超时唤醒的任务
+        self._recheck_scheduled = False
+        # 最近完成的任务结果（文件路径、大小、任务自己的选项），供写入下载历史
+        self._results: "OrderedDict[int, TaskResult]" = OrderedDict()
+        self._results_lock = threading.Lock()
+        # 每个任务各阶段耗时、吞吐量，以及全局计数（可导出为 Prometheus 文本或 JSON）
+        self.metrics = MetricsCollector(gauges={
+            'active_downloads': self.queue_manager.get_active_count,
+            'queue_depth': self.queue_manager.get_queue_size,
+            'postprocess_pending': self.postprocess_stage.pending_count,
+            'fragment_workers': self.fragment_tuner.total_allocated,
+            'ydl_pool_idle': self.ydl_pool.idle_count,
+            'disk_reserved_bytes': self.disk_guard.reserved,
+            'tasks_waiting_disk': lambda: len(self._held),
+        })
+
+    @staticmethod
+    def task_key(url: str, options: dict) -> str:
+        """
+        只用离线规则计算（界面线程也会调用，不能加载 yt-dlp 的提取器列表）；
+        离线无法识别的链接由预解析通过 QueueManager.add_alias 补上真实的 extractor:id。
+        """
+        if options.get('download_type') == '播放列表':
+            # 播放列表任务组与其中的单个视频使用不同的键，互不阻塞
+            return f"playlist:{canonical_key(url, True, offline_only=True)}"
+        return canonical_key(url, offline_only=True)
+
+    def is_pending(self, url: str, options: dict) -> bool:
+        return self.queue_manager.is_pending(self.task_key(url, options))
+
+    def add_download(self, url: str, save_path: str, options: dict, priority: int = 0) -> Optional[int]:
+        """加入下载队列并返回任务 id；同一视频（按规范键判断）已在队列或下载中时返回 None"""
+        key = self.task_key(url, options)
+        if options.get('download_type') == '播放列表':
+            return self._add_playlist(url, save_path, options, priority, key)
+        task = DownloadTask(url, save_path, options, priority=priority, key=key)
+        if not self._enqueue(task):
+            return None
+        self._prefetch(task)
         self._process_queue()
-        self._emit_queue_status()
+        return task.task_id
+
+    def add_downloads(self, urls: List[str], save_path: str, options: dict,
+                      priority: int = 0) -> List[Optional[int]]:
+        """
+        批量加入队列：任务日志在一个事务中写入，调度只触发一次。
+        返回值与 urls 一一对应，已在队列或下载中的为 None。
+        """
+        if options.get('download_type') == '播放列表':
+            return [self._add_playlist(url, save_path, dict(options), priority, self.task_key(url, options))
+                    for url in urls]
+        tasks = [DownloadTask(url, save_path, dict(options), priority=priority, key=self.task_key(url, options))
+                 for url in urls]
+        new_tasks = [task for task in tasks if not self.queue_manager.is_pending(task.key)]
+        if self.journal is not None and new_tasks:
+            job_ids = self.journal.add_many([task.url for task in new_tasks], save_path, options, priority)
+            for task, job_id in zip(new_tasks, job_ids):
+                task.job_id = job_id
+        new_ids = {task.task_id for task in new_tasks}
+        task_ids = [None] * len(tasks)
+        for index, task in enumerate(tasks):
+            if task.task_id in new_ids and self._enqueue(task):
+                self._prefetch(task)
+                task_ids[index] = task.task_id
+        self._process_queue()
+        return task_ids
+
+    def _enqueue(self, task: DownloadTask) -> bool:
+        """加入队列并写入任务日志；先写日志，保证任务开始下载前已经有 job_id"""
+        if self.journal is not None and task.job_id is None:
+            task.job_id = self.journal.add(task.url, task.save_path, task.options, task.priority)
+        if self.queue_manager.add_task(task):
+            self.metrics.task_added(task)
+            return True
+        self._journal_state(task.job_id, TaskState.CANCELLED, "该视频已在下载队列中")
+        return False
+
+    def _journal_state(self, job_id: Optional[int], state: str, error: Optional[str] = None):
+        if self.journal is not None and job_id is not None:
+            self.journal.set_state(job_id, state, error)
+
+    def restore_jobs(self) -> List[Dict]:
+        """
+        把任务日志中未结束的任务重新加入队列（下载中断的任务会断点续传），
+        返回恢复的任务记录，每条附带新分配的 'task_id'。
+        """
+        if self.journal is None:
+            return []
+        self.journal.purge_finished()
+        restored = []
+        for job in self.journal.load_unfinished():
+            url, save_path, options = job['url'], job['save_path'], job['options']
+            key = self.task_key(url, options)
+            if options.get('download_type') == '播放列表':
+                task_id = self._add_playlist(url, save_path, options, job['priority'], key, job['job_id'])
+            else:
+                task = DownloadTask(url, save_path, options, priority=job['priority'], key=key,
+                                    job_id=job['job_id'])
+                if job['state'] == TaskState.POSTPROCESSING:
+                    task.journal_files = job['files']
+                if not self._enqueue(task):
+                    continue
+                task_id = task.task_id
+                if job['state'] == TaskState.PAUSED:
+                    self.queue_manager.pause(task_id)
+                else:
+                    self._journal_state(task.job_id, TaskState.QUEUED)
+                self._prefetch(task)
+            if task_id is not None:
+                restored.append(dict(job, task_id=task_id))
+        self._process_queue()
+        return restored
+
+    def cached_metadata(self, url: str, save_path: str, options: dict) -> Optional[TaskMetadata]:
+        """视频信息已在缓存中时返回将要下载的文件名、大小等，不访问网络"""
+        if options.get('download_type') == '播放列表':
+            return None
+        return self.prefetcher.lookup(self.task_key(url, options), self.build_ydl_opts(options, save_path))
+
+    def _prefetch(self, task: DownloadTask):
+        self._prefetch_deadlines[task.task_id] = time.monotonic() + self.disk_guard.METADATA_WAIT
+        self.prefetcher.prefetch(task.key, task.url, self.build_ydl_opts(task.options, task.save_path),
+                                 lambda metadata, error: self.core_loop.call_soon(self._metadata_fetched,
+                                                                                  task, metadata))
+
+    def _metadata_fetched(self, task: DownloadTask, metadata: Optional[TaskMetadata]):
+        """解析失败时不做处理，下载阶段会重新解析并报告错误"""
+        self._prefetch_deadlines.pop(task.task_id, None)
+        if task.task_id in self._waiting_metadata:
+            self._waiting_metadata.discard(task.task_id)
+            self._process_queue()
+        if metadata is None:
+            return
+        task.metadata = metadata
+        self.metrics.metadata_extracted(task, metadata.extract_seconds)
+        # 链接形式无法离线识别的视频（短链接、未知站点），解析后才知道真实的规范键
+        if not self.queue_manager.add_alias(task.task_id, metadata.video_key) \
+                and task.state == TaskState.QUEUED:
+            self.download_error.emit(task.task_id, "该视频已在下载队列中")
+            self.cancel_task(task.task_id)
+            return
+        self.metadata_ready.emit(task.task_id, metadata)
+
+    def _add_playlist(self, url, save_path, options, priority, key, job_id=None) -> Optional[int]:
+        """播放列表先展开，再把每个条目作为独立任务加入队列，返回任务组 id"""
+        if not self.queue_manager.reserve_key(key):
+            self._journal_state(job_id, TaskState.CANCELLED, "该播放列表已在下载队列中")
+            return None
+        if self.journal is not None and job_id is None:
+            job_id = self.journal.add(url, save_path, options, priority)
+        group = PlaylistGroup(new_task_id(), url, save_path, options, key=key, job_id=job_id)
+        with self._groups_lock:
+            self.groups[group.group_id] = group
+        self.core_loop.spawn(self._expand_playlist(group, priority))
+        return group.group_id
+
+    async def _expand_playlist(self, group: PlaylistGroup, priority: int):
+        try:
+            group.title, entries = await self.core_loop.run_in_executor(self.playlist_pool, expand_playlist, group.url)
+            error = None if entries else "播放列表为空"
+        except Exception as e:
+            entries = []
+            error = f"播放列表解析失败: {e}"
+        if not entries:
+            self._journal_state(group.job_id, TaskState.FAILED, error)
+            self.download_error.emit(group.group_id, error)
+            self._finish_group(group)
+            return
+        # 子任务按普通视频下载，共享播放列表的画质、格式等选项
+        child_options = dict(group.options, download_type='视频')
+        group.total = len(entries)
+        for entry in entries:
+            task = DownloadTask(entry.url, group.save_path, child_options, priority=priority,
+                                key=self.task_key(entry.url, child_options), group_id=group.group_id)
+            if not self._enqueue(task):
+                group.skipped += 1
+                continue
+            group.child_ids.append(task.task_id)
+            self.task_added.emit(task)
+            self._prefetch(task)
+        # 各条目已经单独记录在任务日志中，恢复时不再需要重新展开
+        self._journal_state(group.job_id, TaskState.DONE)
+        self.group_updated.emit(group)
+        if group.finished:
+            self._finish_group(group)
+        self._dispatch()
+
+    def _child_finished(self, task: DownloadTask, state: str):
+        """子任务结束（暂停不算结束）时更新任务组的汇总进度"""
+        with self._groups_lock:
+            group = self.groups.get(task.group_id)
+        if group is None or state == TaskState.PAUSED:
+            return
+        if group.record_result(state == TaskState.DONE):
+            self._finish_group(group)
+        else:
+            self.group_updated.emit(group)
+
+    def _finish_group(self, group: PlaylistGroup):
+        with self._groups_lock:
+            if self.groups.pop(group.group_id, None) is None:
+                return  # 已经结束过
+        self.queue_manager.release_key(group.key)
+        self.group_updated.emit(group)
+        if group.done:
+            self._remember_result(TaskResult(group.group_id, group.url, group.save_path, dict(group.options),
+                                             group.title or group.url))
+            self.download_completed.emit(group.group_id)
+
+    def list_groups(self) -> List[PlaylistGroup]:
+        with self._groups_lock:
+            return list(self.groups.values())
+
+    def get_group(self, group_id: int) -> Optional[PlaylistGroup]:
+        with self._groups_lock:
+            return self.groups.get(group_id)
+
+    def _group_children(self, task_id: int):
+        group = self.get_group(task_id)
+        return list(group.child_ids) if group else None
+
+    def cancel_task(self, task_id: int) -> bool:
+        children = self._group_children(task_id)
+        if children is not None:
+            return any([self.cancel_task(child_id) for child_id in children])
+        task = self.queue_manager.get_task(task_id)
+        if task is None or not self.queue_manager.cancel(task_id):
+            return False
+        if task.state == TaskState.CANCELLED:
+            self._journal_state(task.job_id, TaskState.CANCELLED)
+            self.metrics.task_finished(task, TaskState.CANCELLED)
+            self.task_state_changed.emit(task_id, TaskState.CANCELLED)
+            if task.group_id is not None:
+                self._child_finished(task, TaskState.CANCELLED)
+            self._emit_queue_status()
+        return True
+
+    def pause_task(self, task_id: int) -> bool:
+        children = self._group_children(task_id)
+        if children is not None:
+            return any([self.pause_task(child_id) for child_id in children])
+        task = self.queue_manager.get_task(task_id)
+        if task is None or not self.queue_manager.pause(task_id):
+            return False
+        if task.state == TaskState.PAUSED:
+            self._journal_state(task.job_id, TaskState.PAUSED)
+            self.task_state_changed.emit(task_id, TaskState.PAUSED)
+            self._emit_queue_status()
+        return True
+
+    def resume_task(self, task_id: int) -> bool:
+        children = self._group_children(task_id)
+        if children is not None:
+            return any([self.resume_task(child_id) for child_id in children])
+        if not self.queue_manager.resume(task_id):
+            return False
+        task = self.queue_manager.get_task(task_id)
+        if task is not None:
+            self._journal_state(task.job_id, TaskState.QUEUED)
+            self.metrics.task_requeued(task)
+        self.task_state_changed.emit(task_id, TaskState.QUEUED)
+        self._process_queue()
+        return True
+
+    def move_task_to_top(self, task_id: int) -> bool:
+        if not self.queue_manager.move_to_top(task_id):
+            return False
+        task = self.queue_manager.get_task(task_id)
+        if task is None:
+            return True
+        self.bandwidth.set_priority(task_id, task.priority)
+        if self.journal is not None and task.job_id is not None:
+            self.journal.set_priority(task.job_id, task.priority)
+        return True
+
+    def is_idle(self) -> bool:
+        with self._groups_lock:
+            if self.groups:
+                return False
+        return (self.queue_manager.get_queue_size() == 0 and self.queue_manager.get_active_count() == 0
+                and self.postprocess_stage.pending_count() == 0)
 
     def _emit_queue_status(self):
         self.queue_updated.emit(
@@ -34,97 +371,439 @@ class DownloadManager(QObject):
         )
 
     def _process_queue(self):
+        """请求调度一次，可以在任意线程调用；调度本身在事件循环中进行"""
+        self.core_loop.call_soon(self._dispatch)
+
+    def _dispatch(self):
+        """在事件循环中把可以开始的任务交给工作线程"""
         while task := self.queue_manager.get_next_task():
-            self.download(task.url, task.save_path, task.options)
+            self.metrics.task_started(task)
+            future = self.worker_pool.run(self.core_loop, self.download, task)
+            if future is None:
+                # 线程池已关闭，归还槽位
+                self.queue_manager.task_completed(task.task_id, TaskState.CANCELLED)
+                self.disk_guard.release(task.task_id)
+                break
+            self._journal_state(task.job_id, TaskState.RUNNING)
+            self.task_state_changed.emit(task.task_id, TaskState.RUNNING)
+            self.core_loop.spawn(self._run_task(task, future))
+        self._report_held()
+        self._emit_queue_status()
 
-    def create_ydl_opts(self, url, save_path, options):
-        progress_handler = self.create_progress_handler(url)
-        
-        ydl_opts = {
-            'format': self._get_format_string(options),
-            'paths': {'home': save_path},
-            'progress_hooks': [progress_handler],
-            'ignoreerrors': True,
-            'noplaylist': options.get('download_type') != '播放列表'
-        }
+    def _admit(self, task: DownloadTask) -> bool:
+        """QueueManager 取任务时调用：磁盘剩余空间不够时暂缓开始，先开始其他能放得下的任务"""
+        metadata = task.metadata
+        if metadata is None:
+            deadline = self._prefetch_deadlines.get(task.task_id)
+            now = time.monotonic()
+            if deadline is not None and now < deadline:
+                # 预解析马上会给出文件大小，稍等再做决定；超时后按大小未知处理
+                if task.task_id not in self._waiting_metadata:
+                    self._waiting_metadata.add(task.task_id)
+                    self.core_loop.call_later(deadline - now, self._wake_up)
+                return False
+            self._waiting_metadata.discard(task.task_id)
+        postprocess = self._ffmpeg_available() and (task.options.get('download_type') == '音频' or (
+            metadata is not None and metadata.stream_count > 1))
+        shortage = self.disk_guard.admit(task, metadata.filesize if metadata is not None else None,
+                                         postprocess, self.temp_path)
+        if shortage is None:
+            self._held.pop(task.task_id, None)
+            return True
+        self._held[task.task_id] = shortage
+        return False
+
+    def _report_held(self):
+        """显示暂缓的原因；有任务在等待时定时重新检查（期间可能清理了磁盘）"""
+        for task_id, shortage in list(self._held.items()):
+            task = self.queue_manager.get_task(task_id)
+            if task is None or task.state != TaskState.QUEUED:
+                del self._held[task_id]
+                continue
+            progress = self.progress.get(task_id)
+            if progress is None or progress.status != shortage.text:
+                self.progress.set_status(task_id, shortage.text)
+        if self._held and not self._recheck_scheduled:
+            self._recheck_scheduled = True
+            self.core_loop.call_later(self.disk_guard.RECHECK_INTERVAL, self._recheck_disk)
+
+    def _recheck_disk(self):
+        self._recheck_scheduled = False
+        self._wake_up()
+
+    def _written_bytes(self, task: DownloadTask) -> int:
+        """已经落盘的文件加上正在下载的文件已写入的字节数"""
+        progress = self.progress.get(task.task_id)
+        current = progress.downloaded_bytes if progress is not None and progress.status == '下载中' else 0
+        return task.stats.get('downloaded_bytes', 0) + current
+
+    async def _run_task(self, task: DownloadTask, future):
+        """等待工作线程中的下载结束；需要合并/转码时交给后处理阶段，下载槽位立即释放"""
+        state = TaskState.FAILED
+        try:
+            state = await future
+        finally:
+            self.disk_guard.download_finished(task.task_id)
+            if not (state == TaskState.DONE and self._start_postprocess(task)):
+                self._finish_task(task, state)
+            if not self.worker_pool.is_stopping():
+                self._dispatch()
+
+    def _finish_task(self, task: DownloadTask, state: str):
+        """任务结束（或失败后重新排队）：释放槽位、规范键和预留的磁盘空间，发出相应事件"""
+        self.disk_guard.release(task.task_id)
+        retry = None
+        cancelled = False
+        if state == TaskState.FAILED and not self.worker_pool.is_stopping():
+            retry = self._schedule_retry(task)
+            cancelled = retry is None and task.state == TaskState.CANCELLED
+        if cancelled:
+            state = TaskState.CANCELLED  # 失败的同时用户取消了任务，QueueManager.retry 已将其移出队列
+        elif retry is None:
+            if not self.queue_manager.task_completed(task.task_id, state):
+                return  # 已经结束过，槽位和事件都不再重复处理
+        else:
+            state = task.state  # 重新排队（或失败期间被暂停）
+        if state == TaskState.QUEUED:
+            self.metrics.task_requeued(task, retry=True)
+        elif state != TaskState.PAUSED:
+            self.metrics.task_finished(task, state)
+        if not self.worker_pool.is_stopping():
+            # 程序退出时中止的任务在日志中保持原状态，下次启动时继续下载
+            self._journal_state(task.job_id, state, task.error)
+        if state == TaskState.DONE:
+            self.retry_policy.record_success(task.site)
+            self._remember_result(self._task_result(task))
+            filepath = task.stats.get('filepath')
+            changes = {'filename': os.path.basename(filepath)} if filepath else {}
+            self.progress.set_status(task.task_id, '完成', percent=100.0, speed=0.0, eta=None, **changes)
+            self.download_completed.emit(task.task_id)
+        elif state == TaskState.FAILED:
+            self.download_error.emit(task.task_id, task.error or '未知错误')
+        elif state in (TaskState.PAUSED, TaskState.CANCELLED):
+            self.task_state_changed.emit(task.task_id, state)
+        self.progress.remove(task.task_id)
+        if state == TaskState.QUEUED:
+            self.retry_scheduled.emit(retry)
+        elif task.group_id is not None:
+            self._child_finished(task, state)
 
-        if options.get('download_type') == '音频':
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': options.get('format', 'mp3'),
-                }],
-            })
-
-        if options.get('subtitle_enabled'):
-            ydl_opts.update({
-                'writesubtitles': True,
-                'subtitleslangs': ['all'],
-            })
+    def _task_result(self, task: DownloadTask) -> TaskResult:
+        """按磁盘上的最终文件记录路径和大小"""
+        filepath = task.stats.get('filepath')
+        paths = [entry['filename'] for entry in task.files if entry.get('filename')] or [filepath]
+        files = []
+        for path in paths:
+            if path and not os.path.exists(path):
+                # 字幕等随视频一起从临时目录移到了保存目录
+                path = os.path.join(task.save_path, os.path.basename(path))
+            if path and os.path.exists(path):
+                files.append({'path': path, 'size': os.path.getsize(path)})
+        if filepath:
+            filename = os.path.basename(filepath)
+        else:
+            filename = task.metadata.filename if task.metadata is not None else task.url
+        video_key = task.metadata.video_key if task.metadata is not None else task.key
+        return TaskResult(task.task_id, task.url, task.save_path, dict(task.options), filename,
+                          video_key, files, dict(task.stats))
+
+    def _remember_result(self, result: TaskResult):
+        with self._results_lock:
+            self._results[result.task_id] = result
+            while len(self._results) > 1000:
+                self._results.popitem(last=False)
+
+    def task_result(self, task_id: int) -> Optional[TaskResult]:
+        """download_completed 之后可以取得任务的结果（按任务自己的选项，而不是界面当前的选项）"""
+        with self._results_lock:
+            return self._results.get(task_id)
+
+    def _start_postprocess(self, task: DownloadTask) -> bool:
+        """文件已经全部落盘；需要合并/转码时提交到后处理阶段并返回 True"""
+        target = task.metadata.filepath if task.metadata is not None else None
+        job = plan_postprocess(task.task_id, task.files, task.options, target)
+        if job is None:
+            self._restore_default_name(task)
+            return False
+        if not self._ffmpeg_available():
+            # 没有 FFmpeg 时保留下载到的原始文件，任务仍算完成（与不拆分下载时 yt-dlp 的行为一致）
+            print(f"未检测到 FFmpeg，保留原始文件: {os.path.basename(job.output)}")
+            return False
+        if self.worker_pool.is_stopping():
+            return False
+        if not self.queue_manager.start_postprocessing(task.task_id):
+            return False
+        self.metrics.postprocess_started(task)
+        if self.journal is not None and task.job_id is not None:
+            # 按实际文件名记录（分开下载的流带格式 id），后处理中途退出时恢复后直接合并
+            self.journal.record_files(task.job_id, task.files)
+        self._journal_state(task.job_id, TaskState.POSTPROCESSING)
+        self.task_state_changed.emit(task.task_id, TaskState.POSTPROCESSING)
+        self.progress.set_status(task.task_id, job.label, percent=0.0, speed=0.0, eta=None,
+                                 filename=os.path.basename(job.output))
+        submitted = self.postprocess_stage.submit(
+            job,
+            on_progress=lambda percent: self.progress.set_status(task.task_id, job.label, percent=percent),
+            on_done=lambda error: self.core_loop.call_soon(self._postprocess_finished, task, job, error),
+            is_cancelled=lambda: task.cancel_requested)
+        if not submitted:
+            self._finish_task(task, TaskState.CANCELLED)
+        return True
+
+    @staticmethod
+    def _restore_default_name(task: DownloadTask):
+        """
+        未经预解析的任务按 STREAM_OUTTMPL 下载；实际只下载了一个流（不需要合并）时
+        去掉文件名中的格式 id，与预解析的文件名、下载历史一致。
+        """
+        media = [entry for entry in task.files if entry.get('format_id')]
+        if len(media) != 1:
+            return
+        entry = media[0]
+        target = strip_format_id(entry)
+        if target is None:
+            return
+        try:
+            os.replace(entry['filename'], target)
+        except OSError as e:
+            print(f"Error renaming file: {e}")
+            return
+        if task.stats.get('filepath') == entry['filename']:
+            task.stats['filepath'] = target
+        entry['filename'] = target
+
+    def _postprocess_finished(self, task: DownloadTask, job: PostprocessJob, error: Optional[Exception]):
+        if error is None:
+            task.stats['filepath'] = job.output
+            if task.metadata is not None and task.metadata.filepath != job.output:
+                # 编码与目标容器不兼容时改用了 mkv，文件名以实际输出为准（历史记录、已下载检查）
+                task.metadata = replace(task.metadata, filepath=job.output,
+                                        filename=os.path.basename(job.output))
+            # 合并/转码的输入文件已删除，结果中只保留输出文件（以及字幕等其他文件）
+            task.files = [entry for entry in task.files if entry.get('filename') not in job.inputs]
+            task.files.append({'filename': job.output})
+            self._finish_task(task, TaskState.DONE)
+        elif task.cancel_requested or isinstance(error, PostprocessCancelled):
+            self._finish_task(task, TaskState.CANCELLED)
+        else:
+            task.error = str(error)
+            task.error_kind = ErrorKind.PERMANENT  # 后处理失败重新下载也无济于事
+            self._finish_task(task, TaskState.FAILED)
+        self._emit_queue_status()
 
+    def _schedule_retry(self, task: DownloadTask) -> Optional[RetryInfo]:
+        """
+        按错误类型决定是否自动重试；重试时任务重新排队，到时间后由事件循环的定时器唤醒调度。
+        不重试时返回 None；失败的同时被取消的任务也返回 None，此时 task.state 已是 CANCELLED。
+        """
+        delay = self.retry_policy.next_delay(task.site, task.error_kind, task.attempts)
+        if delay is None:
+            return None
+        next_attempt_at = time.time() + delay
+        if not self.queue_manager.retry(task.task_id, next_attempt_at):
+            return None
+        if task.error_kind == ErrorKind.THROTTLED:
+            self.queue_manager.backoff_host(task.site, next_attempt_at)
+        self.core_loop.call_later(delay, self._wake_up)
+        return RetryInfo(task.task_id, task.attempts + 1, self.retry_policy.max_attempts,
+                         task.error_kind, task.error or '', next_attempt_at)
+
+    def _wake_up(self):
+        if not self.worker_pool.is_stopping():
+            self._dispatch()
+
+    def get_progress(self, task_id: int) -> Optional[DownloadProgress]:
+        return self.progress.get(task_id)
+
+    def _measured_speed(self, task_id: int) -> float:
+        progress = self.progress.get(task_id)
+        return progress.speed if progress else 0.0
+
+    def shutdown(self):
+        """程序退出时调用，正在进行的下载会在下一次进度回调时中止"""
+        self.worker_pool.shutdown(wait=False)
+        self.playlist_pool.shutdown(wait=False, cancel_futures=True)
+        self.prefetcher.shutdown()
+        self.postprocess_stage.shutdown()
+        self.bandwidth.stop()
+        self.progress.stop()
+        self.ydl_pool.shutdown()
+        self.core_loop.stop()
+
+    def create_ydl_opts(self, task: DownloadTask):
+        ydl_opts = self.build_ydl_opts(task.options, task.save_path)
+        ydl_opts['progress_hooks'] = [self.create_progress_handler(task)]
+        ydl_opts['postprocessor_hooks'] = [self.create_postprocessor_handler(task)]
+        ydl_opts['logger'] = TaskLogger(task)
+        # 合并和音频转换不在下载线程中进行，文件落盘后交给 postprocess_stage
+        ydl_opts.pop('postprocessors', None)
+        # 没有 FFmpeg 时无法由后处理阶段合并，保持原来的格式选择，由 yt-dlp 自行处理
+        if task.options.get('download_type') != '音频' and self._ffmpeg_available():
+            ydl_opts['format'] = separate_streams(ydl_opts['format'])
+            # 视频流和音频流分别保存，文件名带上格式 id；预解析已确认只有一个流时使用默认文件名
+            if task.metadata is None or task.metadata.stream_count > 1:
+                ydl_opts['outtmpl'] = {'default': STREAM_OUTTMPL}
         return ydl_opts
 
-    def _get_format_string(self, options):
-        quality_map = {
-            '最佳质量': 'bestvideo+bestaudio/best',
-            '1080p': 'bestvideo[height<=1080]+bestaudio/best[height<=1080]',
-            '720p': 'bestvideo[height<=720]+bestaudio/best[height<=720]',
-            '480p': 'bestvideo[height<=480]+bestaudio/best[height<=480]',
-            '360p': 'bestvideo[height<=360]+bestaudio/best[height<=360]'
+    @staticmethod
+    def _ffmpeg_available() -> bool:
+        return shutil.which('ffmpeg') is not None
+
+    def build_ydl_opts(self, options: dict, save_path: str):
+        """由任务选项生成 yt-dlp 参数（不含回调），预解析和下载共用"""
+        paths = {'home': save_path}
+        if self.temp_path:
+            paths['temp'] = self.temp_path
+        ydl_opts = {
+            'paths': paths,
+            'continuedl': True,  # 从 .part 文件断点续传
+            # 出错时抛出异常，由 _run_task 根据错误类型决定是否自动重试
+            'ignoreerrors': False,
+            'noplaylist': options.get('download_type') != '播放列表'
         }
-        
-        quality = options.get('quality', '最佳质量')
-        include_audio = options.get('include_audio', True)
-        
-        if include_audio:
-            format_str = quality_map.get(quality, 'bestvideo+bestaudio/best')
-        else:
-            format_str = quality_map.get(quality, 'bestvideo/best').replace('+bestaudio', '')
-        
-        if options.get('format') in ['mp4', 'mkv']:
-            format_str += f'[ext={options["format"]}]'
-            
-        return format_str
+        # 格式选择、排序、音频转换和字幕参数由格式配置编译得到（见 core.format_profiles）
+        ydl_opts.update(format_params(options))
+        return ydl_opts
 
-    def create_progress_handler(self, url):
-        progress = DownloadProgress()
-        self.active_downloads[url] = progress
+    def create_progress_handler(self, task: DownloadTask):
+        # yt-dlp 导入较慢，推迟到第一次下载时（见 core.startup.preload_yt_dlp）
+        import yt_dlp
+        task_id = task.task_id
+        receiving = False
+        fragmented = None  # 当前下载的格式是否为分片格式
 
         def progress_hook(d):
+            nonlocal receiving, fragmented
+            if self.worker_pool.is_stopping():
+                raise yt_dlp.utils.DownloadCancelled('程序退出，下载已取消')
+            if task.cancel_requested or task.pause_requested:
+                raise yt_dlp.utils.DownloadCancelled('下载已取消' if task.cancel_requested else '下载已暂停')
             if d['status'] == 'downloading':
-                progress.filename = os.path.basename(d.get('filename', '未知文件'))
-                progress.percent = d.get('downloaded_bytes', 0) / d.get('total_bytes', 1) * 100
-                progress.speed = d.get('speed', 0)
-                if progress.speed:
-                    progress.speed = f"{progress.speed / 1024 / 1024:.1f} MB/s"
-                progress.status = '下载中'
-                self.progress_updated.emit(url, progress)
+                if not receiving:
+                    receiving = True
+                    self.metrics.transfer_started(task)
+                if fragmented != bool(d.get('fragment_count')):
+                    # 普通下载只有一个连接，不必把份额按分片并发数均分
+                    fragmented = bool(d.get('fragment_count'))
+                    self.bandwidth.set_connections(task_id, task.stats.get('fragment_workers', 1) if fragmented else 1)
+                self.progress.update(task_id, d)
+                speed = d.get('speed')
+                if speed and speed > task.stats.get('peak_speed', 0.0):
+                    task.stats['peak_speed'] = speed
+                if d.get('fragment_count'):
+                    task.stats['fragmented'] = True
+                if self.journal is not None and task.job_id is not None:
+                    self.journal.record_progress(task.job_id, d.get('downloaded_bytes'),
+                                                 d.get('total_bytes') or d.get('total_bytes_estimate'),
+                                                 d.get('filename'))
             elif d['status'] == 'finished':
-                progress.percent = 100
-                progress.status = '完成'
-                self.progress_updated.emit(url, progress)
-                self.download_completed.emit(url)
-                self.queue_manager.task_completed(url)
-                self._process_queue()
-                self._emit_queue_status()
+                task.stats['downloaded_bytes'] = (task.stats.get('downloaded_bytes', 0)
+                                                  + (d.get('total_bytes') or d.get('downloaded_bytes') or 0))
+                info = d.get('info_dict') or {}
+                task.files.append({'filename': d.get('filename') or info.get('filepath'),
+                                   'format_id': info.get('format_id'), 'ext': info.get('ext'),
+                                   'vcodec': info.get('vcodec'), 'acodec': info.get('acodec'),
+                                   'duration': info.get('duration')})
+                task.stats['filepath'] = task.files[-1]['filename']
+                self.progress.set_status(task_id, '下载完成', percent=100.0, speed=0.0, eta=None)
             elif d['status'] == 'error':
-                progress.status = '错误'
-                self.progress_updated.emit(url, progress)
-                self.download_error.emit(url, str(d.get('error', '未知错误')))
-                self.queue_manager.task_completed(url)
-                self._process_queue()
-                self._emit_queue_status()
+                self.progress.set_status(task_id, '错误')
+                self.download_error.emit(task_id, str(d.get('error', '未知错误')))
 
         return progress_hook
 
-    def download(self, url, save_path, options):
+    def create_postprocessor_handler(self, task: DownloadTask):
+        started = False
+
+        def postprocessor_hook(d):
+            nonlocal started
+            if d.get('postprocessor') == 'MoveFiles':
+                # 只是把文件从临时目录移到保存目录，记录移动后的路径
+                info = d.get('info_dict') or {}
+                if d['status'] == 'finished' and info.get('filepath'):
+                    for entry in task.files:
+                        if entry.get('format_id') == info.get('format_id'):
+                            entry['filename'] = info['filepath']
+                    task.stats['filepath'] = info['filepath']
+                return
+            if d['status'] != 'started' or started:
+                return
+            started = True
+            self._journal_state(task.job_id, TaskState.POSTPROCESSING)
+            self.progress.set_status(task.task_id, '后处理中')
+            self.task_state_changed.emit(task.task_id, TaskState.POSTPROCESSING)
+
+        return postprocessor_hook
+
+    def download(self, task: DownloadTask) -> str:
+        """执行下载，返回任务的结束状态"""
+        task.files = []
+        if task.metadata is not None and os.path.exists(task.metadata.filepath):
+            # 合并后的文件已经存在（分开下载时 yt-dlp 无法识别），视为已下载
+            task.stats['filepath'] = task.metadata.filepath
+            return TaskState.DONE
+        journal_files, task.journal_files = task.journal_files, []
+        if journal_files and all(os.path.exists(entry.get('filename') or '') for entry in journal_files):
+            # 上次退出时各个流已经下载完，只差合并/转码
+            task.files = journal_files
+            task.stats['filepath'] = journal_files[-1]['filename']
+            return TaskState.DONE
+        info_path = self.info_cache.get_path(task.key)
+        started = time.monotonic()
+        succeeded = False
         try:
-            ydl_opts = self.create_ydl_opts(url, save_path, options)
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+            ydl_opts = self.create_ydl_opts(task)
+            workers = self._acquire_fragment_workers(task)
+            ydl_opts['concurrent_fragment_downloads'] = workers
+            with self._acquire_ydl(task, ydl_opts) as ydl:
+                # 限速写入 ydl.params['ratelimit']，按分片并发数均分给每个连接
+                self.bandwidth.register(task.task_id, ydl.params, task.priority, workers)
+                try:
+                    if info_path is None:
+                        ydl.download([task.url])
+                    else:
+                        # 缓存中的直链失效时，yt-dlp 会自动改用网页地址重新解析
+                        ydl.download_with_info_file(info_path)
+                finally:
+                    self.bandwidth.unregister(task.task_id)
+            succeeded = True
         except Exception as e:
-            self.download_error.emit(url, str(e))
-            self.queue_manager.task_completed(url)
-            self._process_queue()
-            self._emit_queue_status()
\ No newline at end of file
+            # 暂停/取消通过在进度回调中抛出 DownloadCancelled 实现，不算错误
+            if task.pause_requested:
+                return TaskState.PAUSED
+            if task.cancel_requested:
+                return TaskState.CANCELLED
+            task.error = str(e)
+            task.error_kind = classify_error(e)
+            if info_path is not None or task.error_kind == ErrorKind.EXPIRED:
+                # 缓存的直链可能已经失效，下次重新解析
+                self.info_cache.invalidate(task.key)
+            task.attempts += 1
+            return TaskState.FAILED
+        finally:
+            self.metrics.transfer_finished(task)
+            elapsed = time.monotonic() - started
+            task.stats['elapsed'] = task.stats.get('elapsed', 0.0) + elapsed
+            # 只有完整下载完成的分片任务才用来调整并发数
+            self.fragment_tuner.release(task.task_id, task.site, task.stats.get('downloaded_bytes', 0), elapsed,
+                                        tuned=succeeded and task.stats.get('fragmented', False))
+        return TaskState.DONE
+
+    def _acquire_ydl(self, task: DownloadTask, ydl_opts: dict):
+        process_downloader = self.worker_pool.process_downloader
+        if process_downloader is None:
+            return self.ydl_pool.acquire(ydl_opts)
+        # 子进程中没有进度回调时（解析网页期间）也要能及时响应暂停、取消和退出
+        return process_downloader.acquire(
+            ydl_opts, is_cancelled=lambda: task.cancel_requested or task.pause_requested
+            or self.worker_pool.is_stopping())
+
+    def _acquire_fragment_workers(self, task: DownloadTask) -> int:
+        """预解析已确认不是分片格式时不占用分片并发名额"""
+        if task.metadata is not None and not task.metadata.fragmented:
+            workers = 1
+        else:
+            workers = self.fragment_tuner.acquire(task.task_id, task.site, task.options.get('fragment_workers'),
+                                                  self.queue_manager.get_active_count())
+        task.stats['fragment_workers'] = workers
+        return workers
\ No newline at end of file
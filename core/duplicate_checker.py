@@ -17,7 +17,8 @@ def check_duplicate_download(url: str, save_path: str, filename: str, history_ma
         如果 URL 已经存在于历史记录中，或者保存路径下已经存在同名的文件，返回 True，否则返回 (False, filename)。
     """
     # 检查历史记录
-    history_entries = history_manager.search_history(url)
+    # 按视频规范键（extractor:id）查找，不同形式的链接指向同一视频时也能识别
+    history_entries = history_manager.find_by_url(url, offline_only=True)
     if history_entries:
         reply = QMessageBox.question(parent, "警告", "该视频已下载过，是否继续？",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import Executor
+from typing import Callable, Coroutine, Optional
+
+class CoreLoop:
+    """
+    调度核心的 asyncio 事件循环，运行在独立的 core-loop 线程中。
+
+    队列调度、任务结束处理、自动重试的定时器、进度合并和限速分配都在这个线程里执行，
+    彼此之间不再需要额外的线程和锁；阻塞的 yt-dlp 调用交给 run_in_executor 指定的线程池或进程池。
+    其他线程（界面、下载工作线程）通过 call_soon / call_later 把回调投递到循环中。
+    """
+
+    def __init__(self, name: str = 'core-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop(self) -> bool:
+        return threading.get_ident() == self._thread.ident
+
+    def call_soon(self, callback: Callable, *args):
+        """在事件循环中执行 callback，可以在任意线程调用；循环已停止时忽略"""
+        if self._stopped:
+            return
+        if self.in_loop():
+            self.loop.call_soon(self._guard, callback, *args)
+        else:
+            self.loop.call_soon_threadsafe(self._guard, callback, *args)
+
+    def call_later(self, delay: float, callback: Callable, *args):
+        self.call_soon(lambda: self.loop.call_later(delay, self._guard, callback, *args))
+
+    def call_every(self, interval: float, callback: Callable):
+        """每隔 interval 秒在事件循环中执行一次 callback，直到 stop() 或 callback 返回 False"""
+        def tick():
+            if self._stopped or self._guard(callback) is False:
+                return
+            self.loop.call_later(interval, tick)
+
+        self.call_soon(lambda: self.loop.call_later(interval, tick))
+
+    def spawn(self, coro: Coroutine):
+        """在事件循环中运行协程，返回 concurrent.futures.Future；循环已停止时返回 None"""
+        if self._stopped:
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(self._guard_async(coro), self.loop)
+
+    def run_in_executor(self, executor: Optional[Executor], fn: Callable, *args) -> asyncio.Future:
+        """只能在事件循环中调用：把阻塞调用交给 executor，返回可以 await 的 Future"""
+        return self.loop.run_in_executor(executor, fn, *args)
+
+    @staticmethod
+    def _guard(callback: Callable, *args):
+        try:
+            return callback(*args)
+        except Exception as e:
+            print(f"Error in core loop callback: {e}")
+
+    @staticmethod
+    async def _guard_async(coro: Coroutine):
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in core loop task: {e}")
+
+    def stop(self):
+        """
+        停止事件循环。循环不关闭：工作线程中还未结束的 run_in_executor 仍然可以安全地投递结果，
+        只是不再被处理（程序退出时中止的任务在任务日志中保持原状态）。
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,33 @@
+import threading
+from typing import Callable, List
+
+class Event:
+    """
+    纯 Python 的事件/回调，接口与 Qt 的 Signal 类似（connect / disconnect / emit）。
+
+    core 中的模块只依赖它，不依赖 PySide6，因此可以在没有图形界面的服务器上运行。
+    回调在 emit 所在的线程中同步执行；需要回到 GUI 线程时由 ui 层的桥接对象负责转发。
+    """
+
+    def __init__(self):
+        self._callbacks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def connect(self, callback: Callable):
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def disconnect(self, callback: Callable):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def emit(self, *args):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in event callback: {e}")
@@ -0,0 +1,157 @@
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# 界面上的质量选项 -> 最大高度，None 表示不限
+QUALITY_HEIGHTS = {'最佳质量': None, '1080p': 1080, '720p': 720, '480p': 480, '360p': 360}
+# 视频容器 -> (优先的视频流扩展名, 优先的音频流扩展名)：选中这样的流时合并只需复制（remux），不用重新编码
+REMUX_EXTS = {'mp4': ('mp4', 'm4a'), 'webm': ('webm', 'webm'), 'mkv': None}
+# 音频格式 -> 可以直接复制、无需转码的源音频流（见 core.postprocess.AUDIO_CODECS）
+AUDIO_SOURCES = {'mp3': 'bestaudio[acodec=mp3]', 'm4a': 'bestaudio[ext=m4a]', 'flac': 'bestaudio[acodec=flac]'}
+
+
+class ProfileError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class FormatProfile:
+    """
+    声明式的格式配置：质量、编码偏好、容器、音频和字幕策略。
+
+    编译（compile_profile）后得到 yt-dlp 的格式选择、排序和后处理参数；相同的配置只编译一次。
+    """
+    name: str = ''
+    max_height: Optional[int] = None  # None 表示不限
+    container: Optional[str] = 'mp4'  # 视频：mp4/mkv/webm；音频：mp3/m4a/flac；None 表示保留原格式
+    audio_only: bool = False
+    include_audio: bool = True  # 下载视频时是否包含音频
+    video_codec: Optional[str] = None  # 同等分辨率下优先的视频编码，例如 'avc1'
+    subtitles: bool = False
+
+
+@dataclass(frozen=True)
+class CompiledProfile:
+    profile: FormatProfile
+    format: str  # yt-dlp 格式选择
+    format_sort: Tuple[str, ...] = ()  # 同一选择中各个格式的优先顺序（yt-dlp 的 -S）
+    postprocessors: Tuple[Dict, ...] = ()
+    merge_output_format: Optional[str] = None  # 预解析得到的文件名按这个扩展名生成
+
+    def ydl_params(self) -> Dict:
+        """每次返回新的字典，调用方可以修改"""
+        params = {'format': self.format}
+        if self.format_sort:
+            params['format_sort'] = list(self.format_sort)
+        if self.postprocessors:
+            params['postprocessors'] = [dict(pp) for pp in self.postprocessors]
+        if self.merge_output_format:
+            params['merge_output_format'] = self.merge_output_format
+        if self.profile.subtitles:
+            params.update({'writesubtitles': True, 'subtitleslangs': ['all']})
+        return params
+
+
+# 内置的命名配置，可以通过选项中的 'profile'（命令行 --profile）直接使用
+PROFILES = {profile.name: profile for profile in (
+    FormatProfile('best'),
+    FormatProfile('1080p', max_height=1080),
+    FormatProfile('720p', max_height=720),
+    FormatProfile('480p', max_height=480),
+    FormatProfile('compat', max_height=1080, video_codec='avc1'),  # H.264 + AAC，旧设备和播放器也能播放
+    FormatProfile('archive', container='mkv'),  # 不挑编码，任何流都能直接封装
+    FormatProfile('m4a', container='m4a', audio_only=True),
+    FormatProfile('mp3', container='mp3', audio_only=True),
+)}
+
+
+def _validate(selector: str) -> str:
+    """
+    检查格式选择的每个备选项都非空、方括号成对且不含括号，
+    后者保证 core.postprocess.separate_streams 能按 '/' 和 '+' 改写。
+    """
+    for alternative in selector.split('/'):
+        depth = 0
+        for char in alternative:
+            depth += {'[': 1, ']': -1}.get(char, 0)
+            if depth not in (0, 1) or (depth == 0 and char in '(),'):
+                raise ProfileError(f"无效的格式选择: {selector}")
+        if not alternative or depth:
+            raise ProfileError(f"无效的格式选择: {selector}")
+    return selector
+
+
+@lru_cache(maxsize=64)
+def compile_profile(profile: FormatProfile) -> CompiledProfile:
+    if profile.audio_only:
+        if profile.container is not None and profile.container not in AUDIO_SOURCES:
+            raise ProfileError(f"不支持的音频格式: {profile.container}")
+        if profile.container is None:
+            return CompiledProfile(profile, _validate('bestaudio/best'))
+        # 源音频流已经是目标编码时只需复制，否则才转码
+        selector = f"{AUDIO_SOURCES[profile.container]}/bestaudio/best"
+        return CompiledProfile(profile, _validate(selector), postprocessors=(
+            {'key': 'FFmpegExtractAudio', 'preferredcodec': profile.container},))
+
+    if profile.container is not None and profile.container not in REMUX_EXTS:
+        raise ProfileError(f"不支持的视频容器: {profile.container}")
+    # height<=? 也接受高度未知的格式，避免部分站点因此一个格式都选不到
+    height = f"[height<=?{profile.max_height}]" if profile.max_height else ''
+    if profile.include_audio:
+        selector = f"bestvideo{height}+bestaudio/best{height}"
+    else:
+        selector = f"bestvideo{height}/best{height}"
+    # 不用 [ext=...] 过滤（过滤不到时会整体退回到别的备选项），而是在分辨率相同的格式中
+    # 优先选择能直接封装进目标容器的编码，合并时只需复制
+    sort = ['res']
+    if profile.video_codec:
+        sort.append(f"vcodec:{profile.video_codec}")
+    exts = REMUX_EXTS.get(profile.container)
+    if exts is not None:
+        sort.append(f"ext:{exts[0]}:{exts[1]}")
+    return CompiledProfile(profile, _validate(selector), tuple(sort) if len(sort) > 1 else (),
+                           merge_output_format=profile.container)
+
+
+def profile_from_options(options: Dict) -> FormatProfile:
+    """由任务选项得到格式配置；选项中指定了 'profile' 时使用对应的内置配置"""
+    subtitles = bool(options.get('subtitle_enabled'))
+    name = options.get('profile')
+    if name:
+        if name not in PROFILES:
+            raise ProfileError(f"未知的格式配置: {name}（可用: {', '.join(PROFILES)}）")
+        profile = PROFILES[name]
+        if profile.audio_only != (options.get('download_type') == '音频'):
+            raise ProfileError(f"格式配置 {name} 与下载类型不符")
+        return replace(profile, subtitles=profile.subtitles or subtitles)
+    if options.get('download_type') == '音频':
+        container = options.get('format', 'mp3')
+        return FormatProfile(container=container if container in AUDIO_SOURCES else None,
+                             audio_only=True, subtitles=subtitles)
+    container = options.get('format')
+    return FormatProfile(max_height=QUALITY_HEIGHTS.get(options.get('quality', '最佳质量')),
+                         container=container if container in REMUX_EXTS else None,
+                         include_audio=options.get('include_audio', True), subtitles=subtitles)
+
+
+def with_profile(options: Dict, name: str) -> Dict:
+    """
+    返回使用内置配置 name 的任务选项；同时改写下载类型和格式，
+    其他模块（后处理、磁盘空间预留）按这两项判断是否为音频任务以及输出格式。
+    """
+    if name not in PROFILES:
+        raise ProfileError(f"未知的格式配置: {name}（可用: {', '.join(PROFILES)}）")
+    profile = PROFILES[name]
+    options = dict(options, profile=name, format=profile.container)
+    if profile.audio_only:
+        if options.get('download_type') == '播放列表':
+            raise ProfileError(f"播放列表不能使用音频配置 {name}")
+        options['download_type'] = '音频'
+    elif options.get('download_type') == '音频':
+        options['download_type'] = '视频'
+    return options
+
+
+def format_params(options: Dict) -> Dict:
+    """任务选项对应的 yt-dlp 格式相关参数"""
+    return compile_profile(profile_from_options(options)).ydl_params()
@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, Optional
+
+class FragmentTuner:
+    """
+    为 HLS/DASH 分片下载分配并发数（yt-dlp 的 concurrent_fragment_downloads）。
+
+    所有下载中任务的分片并发数之和以 max_total 为上限（软上限，见下）；每个站点的并发数按上一次的
+    实测吞吐量增减（吞吐量明显提高则加一，明显下降则减一），同时不超过
+    max_total 在下载中任务之间的平均份额。
+
+    max_total 是软上限：每个任务至少需要一个连接，名额用完后开始的任务仍分到 1
+    （逐个下载分片，与普通下载相同），不等待名额；合计超出 max_total 的部分
+    不超过这些只分到 1 的任务数。下载槽位（max_concurrent）限制了这类任务的个数。
+    """
+
+    def __init__(self, max_total: int = 16, max_per_task: int = 8, initial: int = 4):
+        self.max_total = max_total
+        self.max_per_task = max_per_task
+        self.initial = initial
+        self._allocated: Dict[int, int] = {}  # task_id -> 分配的并发数
+        self._site_workers: Dict[str, int] = {}  # 站点 -> 当前调优的并发数
+        self._site_throughput: Dict[str, float] = {}  # 站点 -> 上一次的吞吐量（字节/秒）
+        self._lock = threading.Lock()
+
+    def acquire(self, task_id: int, site: str, requested: Optional[int] = None, active_tasks: int = 1) -> int:
+        """
+        下载开始时调用，返回该任务的分片并发数（至少为 1，见类说明中的软上限）。
+        requested 为用户指定的并发数（None 或 0 表示自动），同样受总数限制。
+        """
+        with self._lock:
+            available = max(self.max_total - sum(self._allocated.values()), 1)
+            if requested:
+                workers = requested
+            else:
+                fair_share = max(self.max_total // max(active_tasks, 1), 1)
+                workers = min(self._site_workers.get(site, self.initial), fair_share, self.max_per_task)
+            workers = max(min(workers, available), 1)
+            self._allocated[task_id] = workers
+            return workers
+
+    def release(self, task_id: int, site: str, downloaded_bytes: int = 0, elapsed: float = 0.0,
+                tuned: bool = True):
+        """下载结束时调用；tuned 为 True 时用本次吞吐量调整该站点的并发数"""
+        with self._lock:
+            workers = self._allocated.pop(task_id, None)
+            if workers is None or not tuned or elapsed <= 0 or downloaded_bytes <= 0:
+                return
+            throughput = downloaded_bytes / elapsed
+            previous = self._site_throughput.get(site)
+            current = self._site_workers.get(site, self.initial)
+            if previous is None or throughput > previous * 1.1:
+                current = min(workers + 1, self.max_per_task)
+            elif throughput < previous * 0.9:
+                current = max(workers - 1, 1)
+            self._site_workers[site] = current
+            self._site_throughput[site] = throughput
+
+    def total_allocated(self) -> int:
+        with self._lock:
+            return sum(self._allocated.values())
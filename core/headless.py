@@ -0,0 +1,300 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable
+
+from .bandwidth import BandwidthSchedule, parse_rate
+from .control_api import ControlApi, serve_control_api
+from .disk_space import parse_size
+from .download_manager import DownloadManager
+from .format_profiles import PROFILES, ProfileError, with_profile
+from .history_manager import HistoryBatcher, HistoryManager
+from .job_journal import JobJournal
+from .metrics import JsonMetricsWriter, serve_metrics
+from .retry_policy import RetryPolicy
+from .worker_pool import EXECUTOR_MODES
+
+# 命令行参数与界面下拉框取值之间的对应关系
+DOWNLOAD_TYPES = {'video': '视频', 'audio': '音频', 'playlist': '播放列表'}
+QUALITIES = {'best': '最佳质量', '1080p': '1080p', '720p': '720p', '480p': '480p', '360p': '360p'}
+FORMATS = ['mp4', 'mkv', 'webm', 'mp3', 'm4a', 'flac']
+
+
+def _checked(parse, keep_text: bool = False):
+    """把解析函数包装为 argparse 的 type：格式错误时报告为用法错误（退出码 2），而不是异常堆栈"""
+    def convert(text: str):
+        try:
+            value = parse(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+        return text if keep_text else value
+    return convert
+
+
+def _host_limit(text: str):
+    site, sep, limit = text.partition('=')
+    if not sep or not site.strip() or not limit.strip().isdigit():
+        raise ValueError(f"无法识别的站点并发数: {text}（应为 SITE=N）")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='main.py --headless',
+        description='无界面批量下载：从文件、标准输入或监视目录中读取 URL（每行一个）')
+    parser.add_argument('inputs', nargs='*',
+                        help="URL 列表文件，'-' 表示从标准输入读取")
+    parser.add_argument('--watch', metavar='DIR',
+                        help='守护模式：持续监视该目录中的 *.txt 文件，处理后重命名为 *.done')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='监视目录的轮询间隔（秒）')
+    parser.add_argument('-o', '--save-path', default=os.path.expanduser(os.path.join('~', 'Downloads')),
+                        help='保存路径')
+    parser.add_argument('--type', choices=DOWNLOAD_TYPES, default='video', help='下载类型')
+    parser.add_argument('--quality', choices=QUALITIES, default='best', help='视频质量')
+    parser.add_argument('--format', choices=FORMATS, default='mp4', help='输出格式')
+    parser.add_argument('--profile', choices=PROFILES,
+                        help='使用内置的格式配置（代替 --type/--quality/--format），'
+                             '例如 compat 为 H.264+AAC 的 mp4，mp3 为提取音频')
+    parser.add_argument('--subtitles', action='store_true', help='下载字幕')
+    parser.add_argument('--no-audio', action='store_true', help='下载视频时不包含音频')
+    parser.add_argument('-j', '--jobs', type=int, default=3, help='最大并发下载数')
+    parser.add_argument('--host-limit', action='append', default=[], metavar='SITE=N',
+                        type=_checked(_host_limit, keep_text=True),
+                        help='单个站点的最大并发数，例如 bilibili=2（可重复指定）')
+    parser.add_argument('--fragments', type=int, default=0, metavar='N',
+                        help='HLS/DASH 分片并发数，0 表示按实测吞吐量自动调整')
+    parser.add_argument('--limit-rate', metavar='RATE', type=_checked(parse_rate),
+                        help='总下载速度上限，例如 2M、500K；按优先级在下载中的任务之间分配')
+    parser.add_argument('--rate-schedule', action='append', default=[], metavar='HH:MM-HH:MM=RATE',
+                        type=_checked(lambda text: BandwidthSchedule.parse([text]), keep_text=True),
+                        help='按时间段限速，例如 09:00-18:00=1M（可重复指定，时间段内优先于 --limit-rate）')
+    parser.add_argument('--executor', choices=EXECUTOR_MODES, default='thread',
+                        help='yt-dlp 的运行方式：thread 在工作线程中；process 在子进程中，'
+                             '并发 8 个以上时避免争抢 GIL')
+    parser.add_argument('--temp-dir', metavar='DIR',
+                        help='下载中的 .part 文件和分片写入该目录（例如 SSD），完成后移入保存路径')
+    parser.add_argument('--min-free', default='512M', metavar='SIZE', type=_checked(parse_size),
+                        help='每个磁盘至少保留的剩余空间，例如 2G；按预计文件大小不够时任务暂缓开始')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='每个任务最多尝试的次数（网络错误、限流时自动重试），1 表示不重试')
+    parser.add_argument('--force', action='store_true', help='忽略下载历史，重复下载')
+    parser.add_argument('--history-file', default='download_history.db',
+                        help='下载历史文件（.db SQLite / .jsonl 追加日志 / .json 旧格式）')
+    parser.add_argument('--history-limit', type=int, default=1000,
+                        help='保留的历史记录条数，0 表示不限制')
+    parser.add_argument('--journal', default='download_queue.db',
+                        help="任务日志文件，启动时恢复其中未完成的任务并断点续传；'' 表示不记录")
+    parser.add_argument('--metrics-port', type=int, default=0, metavar='PORT',
+                        help='在 127.0.0.1:PORT 提供 /metrics（Prometheus 文本）和 /metrics.json')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='定期把汇总指标写入 JSON 文件，退出时再写一次')
+    parser.add_argument('--api-port', type=int, default=0, metavar='PORT',
+                        help='在 127.0.0.1:PORT 提供控制接口（/api/tasks 提交和管理任务，/api/events 进度事件流），'
+                             '持续运行直到 Ctrl+C')
+    parser.add_argument('--api-host', default='127.0.0.1', help='控制接口监听的地址')
+    parser.add_argument('--api-token', help='控制接口的访问令牌（Authorization: Bearer <令牌>）')
+    return parser
+
+
+def read_urls(lines: Iterable[str]):
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def parse_host_limits(values):
+    if not values:
+        return None
+    from .queue_manager import DEFAULT_HOST_LIMITS
+    limits = dict(DEFAULT_HOST_LIMITS)
+    for value in values:
+        site, _, limit = value.partition('=')
+        limits[site.strip().lower()] = int(limit)
+    return limits
+
+
+class HeadlessRunner:
+    """复用 DownloadManager / QueueManager / HistoryManager，通过事件回调输出进度"""
+
+    def __init__(self, args):
+        self.args = args
+        self.download_manager = DownloadManager(max_concurrent=args.jobs,
+                                                host_limits=parse_host_limits(args.host_limit),
+                                                journal=JobJournal(args.journal) if args.journal else None,
+                                                retry_policy=RetryPolicy(max_attempts=args.retries),
+                                                rate_limit=args.limit_rate,
+                                                rate_schedule=BandwidthSchedule.parse(args.rate_schedule),
+                                                executor=args.executor,
+                                                temp_path=args.temp_dir,
+                                                min_free_space=args.min_free)
+        self.history_manager = HistoryManager(args.history_file, max_entries=args.history_limit)
+        self.history_writer = HistoryBatcher(self.history_manager)
+        self.options = {
+            'download_type': DOWNLOAD_TYPES[args.type],
+            'quality': QUALITIES[args.quality],
+            'format': args.format,
+            'subtitle_enabled': args.subtitles,
+            'include_audio': not args.no_audio,
+            'fragment_workers': args.fragments
+        }
+        if args.profile:
+            self.options = with_profile(self.options, args.profile)
+        self.tasks: Dict[int, str] = {}  # 任务 id -> url
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self.download_manager.download_completed.connect(self.on_completed)
+        self.download_manager.download_error.connect(self.on_error)
+        self.download_manager.queue_updated.connect(self.on_queue_updated)
+        self.download_manager.task_added.connect(self.on_task_added)
+        self.download_manager.group_updated.connect(self.on_group_updated)
+        self.download_manager.metadata_ready.connect(self.on_metadata_ready)
+        self.download_manager.retry_scheduled.connect(self.on_retry_scheduled)
+
+    def add_url(self, url: str):
+        playlist = self.options['download_type'] == '播放列表'
+        self.history_writer.flush()  # 刚完成的任务也要参与重复检查
+        if not self.args.force and self.history_manager.find_by_url(url, playlist):
+            self.log(f"跳过（已下载过）: {url}")
+            return
+        self._idle.clear()
+        with self._lock:
+            task_id = self.download_manager.add_download(url, self.args.save_path, dict(self.options))
+            if task_id is None:
+                self.log(f"跳过（已在队列中）: {url}")
+                return
+            self.tasks[task_id] = url
+        self.log(f"加入队列: {url}")
+
+    def on_task_added(self, task):
+        with self._lock:
+            self.tasks[task.task_id] = task.url
+
+    def on_metadata_ready(self, task_id, metadata):
+        size = f"（约 {metadata.filesize_text}）" if metadata.filesize_text else ''
+        self.log(f"已解析: {metadata.filename}{size}")
+
+    def on_group_updated(self, group):
+        if group.finished or not group.done + group.failed:
+            self.log(f"播放列表 {group.title or group.url}: {group.done + group.failed + group.skipped}/{group.total}")
+
+    def on_completed(self, task_id):
+        result = self.download_manager.task_result(task_id)
+        if result is None:
+            return
+        self.history_writer.add(result.url, result.filename, result.save_path, result.options,
+                                video_key=result.video_key, stats=result.stats, files=result.files)
+        self.log(f"完成: {result.filename}")
+
+    def on_error(self, task_id, error):
+        with self._lock:
+            self.failed += 1
+            url = self.tasks.get(task_id, '')
+        self.log(f"错误: {url}: {error}")
+
+    def on_retry_scheduled(self, retry):
+        with self._lock:
+            url = self.tasks.get(retry.task_id, '')
+        self.log(f"{retry.text}: {url}: {retry.error}")
+
+    def on_queue_updated(self, queue_size, active_count):
+        if queue_size == 0 and active_count == 0:
+            self._idle.set()
+
+    def wait_idle(self):
+        # queue_updated 可能先于 add_download 返回就触发，这里再用 is_idle 兜底确认
+        while True:
+            self._idle.wait(1.0)
+            if self.download_manager.is_idle():
+                return
+            self._idle.clear()  # 仍有合并/转码中的任务，继续等待
+
+    def watch(self, directory: str):
+        self.log(f"监视目录: {directory}")
+        while True:
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.txt'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        urls = list(read_urls(f))
+                    os.replace(path, path[:-len('.txt')] + '.done')
+                except OSError as e:
+                    self.log(f"读取 {path} 失败: {e}")
+                    continue
+                for url in urls:
+                    self.add_url(url)
+            time.sleep(self.args.poll_interval)
+
+    def restore(self):
+        self._idle.clear()
+        with self._lock:
+            jobs = self.download_manager.restore_jobs()
+            for job in jobs:
+                self.tasks[job['task_id']] = job['url']
+        for job in jobs:
+            self.log(f"恢复未完成的任务: {job['url']}")
+
+    def run(self) -> int:
+        metrics = self.download_manager.metrics
+        server = serve_metrics(metrics, self.args.metrics_port) if self.args.metrics_port else None
+        writer = JsonMetricsWriter(metrics, self.args.metrics_file) if self.args.metrics_file else None
+        api_server = None
+        if self.args.api_port:
+            api = ControlApi(self.download_manager, self.args.save_path, self.options,
+                             history_writer=None if self.args.force else self.history_writer)
+            api_server = serve_control_api(api, self.args.api_port, self.args.api_host, self.args.api_token)
+            self.log(f"控制接口: http://{self.args.api_host}:{api_server.server_address[1]}/api/status")
+        try:
+            self.restore()
+            for source in self.args.inputs:
+                if source == '-':
+                    # 逐行读取标准输入，读到一行就加入队列
+                    for url in read_urls(sys.stdin):
+                        self.add_url(url)
+                else:
+                    with open(source, 'r', encoding='utf-8') as f:
+                        for url in read_urls(f):
+                            self.add_url(url)
+            if self.args.watch:
+                self.watch(self.args.watch)
+            while api_server is not None:
+                time.sleep(3600)  # 通过控制接口接收任务，直到 Ctrl+C
+            self.wait_idle()
+        except KeyboardInterrupt:
+            self.log("已中断，正在停止下载...")
+            self.download_manager.shutdown()
+            return 130
+        finally:
+            self.history_writer.flush()
+            if writer is not None:
+                writer.stop()
+            if server is not None:
+                server.shutdown()
+            if api_server is not None:
+                api_server.shutdown()
+        return 1 if self.failed else 0
+
+    @staticmethod
+    def log(message: str):
+        # 多个工作线程同时输出时，一次写入整行避免交错
+        sys.stdout.write(message + '\n')
+        sys.stdout.flush()
+
+
+def run_headless(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.inputs and not args.watch and not args.api_port:
+        args.inputs = ['-']
+    os.makedirs(args.save_path, exist_ok=True)
+    try:
+        runner = HeadlessRunner(args)
+    except ProfileError as e:
+        build_parser().error(str(e))
+    return runner.run()
@@ -0,0 +1,103 @@
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+from .video_id import canonical_key, normalize_url
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class HistoryIndex:
+    """
+    历史记录的内存索引，随添加/删除增量维护。
+
+    - 精确索引：视频规范键（extractor:id）和规范化 URL -> 记录 id，用于重复下载检查。
+      没有 video_key 的旧记录用离线正则补算规范键。
+    - 三元组索引：URL 与文件名的每个三字符片段 -> 记录 id 列表，用于搜索框的子串搜索。
+      查询时只遍历最短的倒排列表并逐条核对子串，不需要扫描全部记录。
+
+    记录 id 单调递增，倒排列表天然按 id 有序；删除采用惰性方式，
+    失效 id 累积过多时整体重建。
+    """
+
+    def __init__(self):
+        self._by_key: Dict[str, List[int]] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._texts: Dict[int, str] = {}
+        self._dead = 0
+
+    @staticmethod
+    def _search_text(entry: Dict) -> str:
+        return f"{entry.get('url', '')}\n{entry.get('filename', '')}".lower()
+
+    @staticmethod
+    def _exact_keys(entry: Dict) -> List[str]:
+        url = entry.get('url', '')
+        keys = {entry.get('video_key') or canonical_key(url, offline_only=True),
+                f'url:{normalize_url(url)}'}
+        return list(keys)
+
+    def add(self, entry: Dict):
+        entry_id = entry['id']
+        for key in self._exact_keys(entry):
+            self._by_key.setdefault(key, []).append(entry_id)
+        text = self._search_text(entry)
+        self._texts[entry_id] = text
+        for trigram in _trigrams(text):
+            self._postings.setdefault(trigram, []).append(entry_id)
+
+    def remove(self, entry: Dict):
+        entry_id = entry['id']
+        if self._texts.pop(entry_id, None) is None:
+            return
+        for key in self._exact_keys(entry):
+            ids = self._by_key.get(key)
+            if ids and entry_id in ids:
+                ids.remove(entry_id)
+                if not ids:
+                    del self._by_key[key]
+        self._dead += 1
+        if self._dead > 1000 and self._dead > len(self._texts):
+            self._rebuild_postings()
+
+    def clear(self):
+        self._by_key.clear()
+        self._postings.clear()
+        self._texts.clear()
+        self._dead = 0
+
+    def _rebuild_postings(self):
+        self._postings = {}
+        for entry_id, text in self._texts.items():
+            for trigram in _trigrams(text):
+                self._postings.setdefault(trigram, []).append(entry_id)
+        self._dead = 0
+
+    def lookup(self, video_key: str, url: str = '') -> List[int]:
+        """返回规范键相同、或 URL 规范化后相同的记录 id（新 -> 旧）"""
+        ids = set(self._by_key.get(video_key, []))
+        if url:
+            ids.update(self._by_key.get(f'url:{normalize_url(url)}', []))
+        return sorted(ids, reverse=True)
+
+    def search(self, keyword: str, limit: Optional[int] = None) -> List[int]:
+        """返回 URL 或文件名包含 keyword 的记录 id（新 -> 旧），最多 limit 条"""
+        keyword = keyword.lower()
+        texts = self._texts
+        if not keyword:
+            matches = reversed(texts)
+        elif len(keyword) < 3:
+            # 一两个字符无法使用三元组，直接扫描（仍然只是内存中的字符串比较）
+            matches = (entry_id for entry_id, text in reversed(texts.items()) if keyword in text)
+        else:
+            candidates = None
+            for trigram in _trigrams(keyword):
+                postings = self._postings.get(trigram)
+                if not postings:
+                    return []
+                if candidates is None or len(postings) < len(candidates):
+                    candidates = postings
+            matches = (entry_id for entry_id in reversed(candidates)
+                       if entry_id in texts and keyword in texts[entry_id])
+        return list(islice(matches, limit))
@@ -1,54 +1,200 @@
-import json
 import os
+import threading
 from datetime import datetime
-from typing import List, Dict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .history_index import HistoryIndex
+from .history_store import HistoryStore, create_history_store, migrate_legacy_json
+from .video_id import canonical_key
+
+LEGACY_HISTORY_FILE = "download_history.json"
 
 class HistoryManager:
-    def __init__(self, history_file: str = "download_history.json"):
+    def __init__(self, history_file: str = "download_history.db", max_entries: Optional[int] = 1000,
+                 store: Optional[HistoryStore] = None, preload: bool = True):
+        """
+        Args:
+            history_file: 历史文件路径，扩展名决定后端（.db SQLite / .jsonl 追加日志 / .json 旧格式）。
+            max_entries: 保留的最大记录数，None 或 0 表示不限制。
+            store: 直接指定后端，优先于 history_file。
+            preload: 为 False 时不在构造时读取历史，由 load() 在后台线程中读取，
+                或在第一次查询时读取（查询会等待读取完成）。
+        """
         self.history_file = history_file
-        self.history: List[Dict] = self.load_history()
-    
+        self.max_entries = max_entries
+        self.store = store or create_history_store(history_file)
+        self._lock = threading.Lock()
+        # id -> 记录，按添加顺序（旧 -> 新）排列
+        self._entries: Dict[int, Dict] = {}
+        self.index = HistoryIndex()
+        self._loaded = False
+        if preload:
+            self.load()
+
+    def load(self):
+        """读取历史记录并建立索引；已读取过时直接返回"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        # 同目录下的旧版 JSON 历史会自动迁移到新后端
+        legacy_file = os.path.join(os.path.dirname(self.history_file), LEGACY_HISTORY_FILE)
+        migrate_legacy_json(self.store, legacy_file)
+        for entry in self.load_history():
+            self._entries[entry['id']] = entry
+            self.index.add(entry)
+        self._apply_retention()
+
     def load_history(self) -> List[Dict]:
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return self.store.load()
         except Exception as e:
             print(f"Error loading history: {e}")
         return []
-    
-    def save_history(self):
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving history: {e}")
-    
-    def add_entry(self, url: str, filename: str, save_path: str, options: Dict):
+
+    @staticmethod
+    def make_entry(url: str, filename: str, save_path: str, options: Dict, video_key: Optional[str] = None,
+                   stats: Optional[Dict] = None, files: Optional[List[Dict]] = None) -> Dict:
+        """
+        stats 为任务各阶段耗时、下载字节数、平均/峰值速度等（见 core.metrics），
+        files 为最终文件的路径和大小。
+        """
+        if video_key is None:
+            video_key = canonical_key(url, options.get('download_type') == '播放列表')
         entry = {
             'url': url,
+            'video_key': video_key,
             'filename': filename,
             'save_path': save_path,
             'options': options,
             'timestamp': datetime.now().isoformat(),
             'status': 'completed'
         }
-        self.history.insert(0, entry)  # 添加到列表开头
-        if len(self.history) > 1000:  # 限制历史记录数量
-            self.history = self.history[:1000]
-        self.save_history()
-    
+        if files:
+            entry['files'] = files
+        if stats:
+            entry['stats'] = stats
+        return entry
+
+    def add_entry(self, url: str, filename: str, save_path: str, options: Dict,
+                  video_key: Optional[str] = None, stats: Optional[Dict] = None,
+                  files: Optional[List[Dict]] = None):
+        self.add_entries([self.make_entry(url, filename, save_path, options, video_key, stats, files)])
+
+    def add_entries(self, entries: List[Dict]):
+        """批量写入 make_entry 生成的记录（SQLite 后端在一个事务中完成）"""
+        if not entries:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                self.store.append_many(entries)
+            except Exception as e:
+                print(f"Error saving history: {e}")
+                return
+            for entry in entries:
+                self._entries[entry['id']] = entry
+                self.index.add(entry)
+            self._apply_retention()
+
+    def _apply_retention(self):
+        if not self.max_entries or len(self._entries) <= self.max_entries:
+            return
+        # 超出保留上限时删除最旧的记录
+        removed = list(islice(iter(self._entries), len(self._entries) - self.max_entries))
+        try:
+            self.store.remove(removed)
+        except Exception as e:
+            print(f"Error pruning history: {e}")
+            return
+        for entry_id in removed:
+            self.index.remove(self._entries.pop(entry_id))
+
+    def remove_entries(self, entries: List[Dict]):
+        with self._lock:
+            self._ensure_loaded()
+            ids = [entry['id'] for entry in entries if entry.get('id') in self._entries]
+            try:
+                self.store.remove(ids)
+            except Exception as e:
+                print(f"Error saving history: {e}")
+                return
+            for entry_id in ids:
+                self.index.remove(self._entries.pop(entry_id))
+
     def get_recent_entries(self, limit: int = 100) -> List[Dict]:
-        return self.history[:limit]
-    
+        with self._lock:
+            self._ensure_loaded()
+            return list(islice(reversed(self._entries.values()), limit))
+
     def clear_history(self):
-        self.history.clear()
-        self.save_history()
-    
-    def search_history(self, keyword: str) -> List[Dict]:
-        keyword = keyword.lower()
-        return [
-            entry for entry in self.history
-            if keyword in entry['url'].lower() or
-               keyword in entry['filename'].lower()
-        ]
\ No newline at end of file
+        with self._lock:
+            self._ensure_loaded()
+            self._entries.clear()
+            self.index.clear()
+            try:
+                self.store.clear()
+            except Exception as e:
+                print(f"Error saving history: {e}")
+
+    def search_history(self, keyword: str, limit: Optional[int] = None) -> List[Dict]:
+        """搜索 URL 或文件名中包含 keyword 的记录（新 -> 旧），使用三元组索引"""
+        with self._lock:
+            self._ensure_loaded()
+            ids = self.index.search(keyword, limit)
+            return [self._entries[entry_id] for entry_id in ids]
+
+    def find_by_url(self, url: str, playlist: bool = False, offline_only: bool = False) -> List[Dict]:
+        """查找同一视频（按 extractor:id 规范键）的记录，用于重复下载检查；界面线程中传入 offline_only=True"""
+        return self.find_by_key(canonical_key(url, playlist, offline_only), url)
+
+    def find_known(self, urls_and_keys: Iterable[Tuple[str, str]]) -> Set[str]:
+        """批量版 find_by_key：传入 (url, 规范键)，返回下载历史中已有的 url，只加锁一次"""
+        with self._lock:
+            self._ensure_loaded()
+            return {url for url, key in urls_and_keys if self.index.lookup(key, url)}
+
+    def find_by_key(self, video_key: str, url: str = '') -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return [self._entries[entry_id] for entry_id in self.index.lookup(video_key, url)]
+
+
+class HistoryBatcher:
+    """
+    攒批写入下载历史：大量任务同时完成时，每隔 interval 秒（或攒满 max_batch 条）写一次，
+    而不是每完成一个任务写一次。程序退出前调用 flush()。
+    """
+
+    def __init__(self, history_manager: HistoryManager, interval: float = 1.0, max_batch: int = 100):
+        self.history_manager = history_manager
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, url: str, filename: str, save_path: str, options: Dict, video_key: Optional[str] = None,
+            stats: Optional[Dict] = None, files: Optional[List[Dict]] = None):
+        entry = HistoryManager.make_entry(url, filename, save_path, options, video_key, stats, files)
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.max_batch
+            if not full and self._timer is None:
+                # 非守护线程：flush() 之后才完成的任务，其记录也会在进程退出前写入
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.history_manager.add_entries(entries)
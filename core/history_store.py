@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+class HistoryStore:
+    """
+    下载历史的持久化后端。
+
+    load() 按添加顺序（旧 -> 新）返回全部记录，每条记录带有整数 'id'。
+    append() 为单条记录分配 id 并写入，复杂度与已有记录数无关。
+    """
+
+    def load(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def append(self, entry: Dict) -> Dict:
+        return self.append_many([entry])[0]
+
+    def append_many(self, entries: List[Dict]) -> List[Dict]:
+        raise NotImplementedError
+
+    def remove(self, ids: Iterable[int]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        return not self.load()
+
+    def close(self):
+        pass
+
+
+def _atomic_write(path: str, text: str):
+    """先写临时文件再替换，保证崩溃时原文件要么是旧内容要么是新内容"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SqliteHistoryStore(HistoryStore):
+    """SQLite（WAL 模式）后端，每次添加只写入一行"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # 下载完成事件可能来自工作线程，连接在加锁的前提下跨线程共享
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS history ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'url TEXT NOT NULL, '
+            'timestamp TEXT, '
+            'data TEXT NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_history_url ON history(url)')
+        self._conn.commit()
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute('SELECT id, data FROM history ORDER BY id').fetchall()
+        entries = []
+        for entry_id, data in rows:
+            try:
+                entry = json.loads(data)
+            except ValueError:
+                continue
+            entry['id'] = entry_id
+            entries.append(entry)
+        return entries
+
+    def append_many(self, entries: List[Dict]) -> List[Dict]:
+        with self._lock, self._conn:
+            for entry in entries:
+                data = {k: v for k, v in entry.items() if k != 'id'}
+                cursor = self._conn.execute(
+                    'INSERT INTO history (url, timestamp, data) VALUES (?, ?, ?)',
+                    (entry.get('url', ''), entry.get('timestamp'), json.dumps(data, ensure_ascii=False)))
+                entry['id'] = cursor.lastrowid
+        return entries
+
+    def remove(self, ids: Iterable[int]):
+        ids = [(entry_id,) for entry_id in ids]
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM history WHERE id = ?', ids)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM history')
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM history LIMIT 1').fetchone() is None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JsonlHistoryStore(HistoryStore):
+    """
+    追加写日志后端：每行一个操作（add / remove / clear）。
+
+    删除只追加一条记录，失效行过多时整体压缩（写临时文件后原子替换）。
+    崩溃时最多丢失最后一行不完整的记录，加载时会被跳过。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._ids = set()  # 仍有效的记录 id，删除时只统计其中的 id
+        self._dead = 0
+        self._loaded = False
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            return list(self._replay().values())
+
+    @property
+    def _live(self) -> int:
+        return len(self._ids)
+
+    def _replay(self) -> Dict[int, Dict]:
+        entries: Dict[int, Dict] = {}
+        lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    lines += 1
+                    op = record.get('op')
+                    if op == 'add':
+                        entry = record['entry']
+                        entries[entry['id']] = entry
+                        self._next_id = max(self._next_id, entry['id'] + 1)
+                    elif op == 'remove':
+                        for entry_id in record.get('ids', []):
+                            entries.pop(entry_id, None)
+                    elif op == 'clear':
+                        entries.clear()
+        self._ids = set(entries)
+        self._dead = lines - self._live
+        self._loaded = True
+        return entries
+
+    def _append_records(self, records: List[Dict]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append_many(self, entries: List[Dict]) -> List[Dict]:
+        with self._lock:
+            if not self._loaded:
+                self._replay()
+            for entry in entries:
+                entry['id'] = self._next_id
+                self._next_id += 1
+            self._append_records([{'op': 'add', 'entry': entry} for entry in entries])
+            self._ids.update(entry['id'] for entry in entries)
+        return entries
+
+    def remove(self, ids: Iterable[int]):
+        with self._lock:
+            if not self._loaded:
+                self._replay()
+            # 不存在或已删除的 id 不计入：否则 _live 会偏小，导致过早压缩
+            ids = [entry_id for entry_id in dict.fromkeys(ids) if entry_id in self._ids]
+            if not ids:
+                return
+            self._append_records([{'op': 'remove', 'ids': ids}])
+            self._ids.difference_update(ids)
+            self._dead += len(ids) + 1
+            self._maybe_compact()
+
+    def clear(self):
+        with self._lock:
+            _atomic_write(self.path, '')
+            self._ids.clear()
+            self._dead = 0
+
+    def _maybe_compact(self):
+        if self._dead > 100 and self._dead > self._live:
+            entries = self._replay()
+            _atomic_write(self.path, ''.join(
+                json.dumps({'op': 'add', 'entry': entry}, ensure_ascii=False) + '\n'
+                for entry in entries.values()))
+            self._dead = 0
+
+    def is_empty(self) -> bool:
+        return not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+
+class JsonHistoryStore(HistoryStore):
+    """
+    旧版 download_history.json 格式（新 -> 旧的列表）。
+
+    每次修改都会重写整个文件，仅为兼容保留；写入是原子的。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: List[Dict] = []
+        self._next_id = 1  # 只增不减：删除末尾的记录后也不重复使用 id，HistoryIndex 按 id 索引
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = list(reversed(json.load(f)))
+            for i, entry in enumerate(entries, 1):
+                entry['id'] = i
+            self._entries = entries
+            self._next_id = len(entries) + 1
+
+    def _save(self):
+        _atomic_write(self.path, json.dumps(
+            [{k: v for k, v in entry.items() if k != 'id'} for entry in reversed(self._entries)],
+            ensure_ascii=False, indent=2))
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._entries)
+
+    def append_many(self, entries: List[Dict]) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            for entry in entries:
+                entry['id'] = self._next_id
+                self._next_id += 1
+            self._entries.extend(entries)
+            self._save()
+        return entries
+
+    def remove(self, ids: Iterable[int]):
+        ids = set(ids)
+        with self._lock:
+            self._ensure_loaded()
+            self._entries = [entry for entry in self._entries if entry['id'] not in ids]
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._loaded = True
+            self._save()
+
+
+def create_history_store(path: str) -> HistoryStore:
+    """根据文件扩展名选择后端：.db/.sqlite 使用 SQLite，.jsonl 使用追加日志，.json 使用旧格式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.jsonl':
+        return JsonlHistoryStore(path)
+    if ext == '.json':
+        return JsonHistoryStore(path)
+    return SqliteHistoryStore(path)
+
+
+def migrate_legacy_json(store: HistoryStore, legacy_path: str) -> int:
+    """
+    若新后端为空且存在旧版 JSON 历史文件，则导入并把旧文件重命名为 .bak。
+
+    Returns:
+        导入的记录数。
+    """
+    if isinstance(store, JsonHistoryStore) or not os.path.exists(legacy_path) or not store.is_empty():
+        return 0
+    try:
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except Exception as e:
+        print(f"Error migrating history: {e}")
+        return 0
+    entries = [entry for entry in reversed(entries) if isinstance(entry, dict) and 'url' in entry]
+    for entry in entries:
+        entry.pop('id', None)
+    if entries:
+        store.append_many(entries)
+    os.replace(legacy_path, legacy_path + '.bak')
+    return len(entries)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class InfoCache:
+    """
+    yt-dlp 信息字典（info JSON）的磁盘缓存，按视频规范键存储。
+
+    每个键一个 JSON 文件；超过 ttl 的条目视为过期（视频直链通常几小时后失效），
+    条目数超过 max_entries 时按最近最少使用淘汰。
+    """
+
+    def __init__(self, cache_dir: str = "info_cache", ttl: float = 1800, max_entries: int = 500):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, float]" = OrderedDict()  # 文件名 -> 写入时间，按使用顺序排列
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    files.append((os.path.getmtime(os.path.join(self.cache_dir, name)), name))
+                except OSError:
+                    continue
+        for mtime, name in sorted(files):
+            self._index[name] = mtime
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+
+    def get_path(self, key: str) -> Optional[str]:
+        """返回未过期缓存文件的路径（可直接交给 YoutubeDL.download_with_info_file）"""
+        name = self._file_name(key)
+        with self._lock:
+            stored_at = self._index.get(name)
+            if stored_at is None:
+                return None
+            if time.time() - stored_at > self.ttl:
+                self._delete(name)
+                return None
+            self._index.move_to_end(name)
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """返回缓存的信息字典（每次都是新的字典，可以随意修改）；不存在或已过期返回 None"""
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self.invalidate(key)
+            return None
+
+    def put(self, key: str, info: Dict):
+        name = self._file_name(key)
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing info cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._index[name] = time.time()
+            self._index.move_to_end(name)
+            while len(self._index) > self.max_entries:
+                self._delete(next(iter(self._index)))
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._delete(self._file_name(key))
+
+    def _delete(self, name: str):
+        self._index.pop(name, None)
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
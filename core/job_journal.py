@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .queue_manager import TaskState
+
+class JobJournal:
+    """
+    下载任务日志（SQLite，WAL 模式），程序崩溃或关闭后用于恢复队列。
+
+    每个任务一行，记录状态变化（queued / running / postprocessing / paused / done / failed / cancelled）
+    以及已下载的字节数。启动时未结束的任务重新加入队列，yt-dlp 会从 .part 文件断点续传。
+    进入后处理时记录实际落盘的文件（分开下载的流按 STREAM_OUTTMPL 命名），恢复时直接合并。
+    播放列表在展开之前作为一行记录，展开后每个条目各自记录，任务组本身标记为完成。
+    """
+
+    UNFINISHED = (TaskState.QUEUED, TaskState.RUNNING, TaskState.POSTPROCESSING, TaskState.PAUSED)
+
+    def __init__(self, path: str = "download_queue.db", progress_interval: float = 5.0):
+        self.path = path
+        self.progress_interval = progress_interval  # 下载进度最多每隔这么多秒写一次
+        self._last_progress: Dict[int, float] = {}  # 由下载线程和事件循环共同访问，受 _lock 保护
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'url TEXT NOT NULL, '
+            'save_path TEXT NOT NULL, '
+            'options TEXT NOT NULL, '
+            'priority INTEGER NOT NULL DEFAULT 0, '
+            'state TEXT NOT NULL, '
+            'filename TEXT, '
+            'downloaded_bytes INTEGER NOT NULL DEFAULT 0, '
+            'total_bytes INTEGER, '
+            'error TEXT, '
+            'files TEXT, '
+            'updated_at REAL NOT NULL)')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'files' not in columns:
+            # 旧版日志没有 files 列
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN files TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)')
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def add(self, url: str, save_path: str, options: Dict, priority: int = 0) -> int:
+        cursor = self._execute(
+            'INSERT INTO jobs (url, save_path, options, priority, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (url, save_path, json.dumps(options, ensure_ascii=False), priority, TaskState.QUEUED, time.time()))
+        return cursor.lastrowid
+
+    def add_many(self, urls: List[str], save_path: str, options: Dict, priority: int = 0) -> List[int]:
+        """批量加入的任务在一个事务中写入"""
+        data = json.dumps(options, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._conn:
+            return [self._conn.execute(
+                'INSERT INTO jobs (url, save_path, options, priority, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (url, save_path, data, priority, TaskState.QUEUED, now)).lastrowid for url in urls]
+
+    def remove(self, job_id: int):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            self._last_progress.pop(job_id, None)
+
+    def set_state(self, job_id: int, state: str, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                               (state, error, time.time(), job_id))
+            if state not in self.UNFINISHED:
+                self._last_progress.pop(job_id, None)
+
+    def record_files(self, job_id: int, files: List[Dict]):
+        """记录已经下载完成的文件（路径、格式 id、编码等，见 DownloadTask.files）"""
+        self._execute('UPDATE jobs SET files = ?, updated_at = ? WHERE job_id = ?',
+                      (json.dumps(files, ensure_ascii=False), time.time(), job_id))
+
+    def set_priority(self, job_id: int, priority: int):
+        self._execute('UPDATE jobs SET priority = ? WHERE job_id = ?', (priority, job_id))
+
+    def record_progress(self, job_id: int, downloaded_bytes: int, total_bytes: Optional[int],
+                        filename: Optional[str]):
+        """记录断点位置；进度回调很频繁，这里按 progress_interval 限频"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress.get(job_id, 0.0) < self.progress_interval:
+                return
+            self._last_progress[job_id] = now
+        self._execute(
+            'UPDATE jobs SET downloaded_bytes = ?, total_bytes = ?, filename = COALESCE(?, filename), '
+            'updated_at = ? WHERE job_id = ?',
+            (int(downloaded_bytes or 0), total_bytes, filename, time.time(), job_id))
+
+    def load_unfinished(self) -> List[Dict]:
+        """按加入顺序返回未结束的任务"""
+        placeholders = ','.join('?' * len(self.UNFINISHED))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT job_id, url, save_path, options, priority, state, filename, downloaded_bytes, total_bytes, '
+                f'files FROM jobs WHERE state IN ({placeholders}) ORDER BY job_id', self.UNFINISHED).fetchall()
+        jobs = []
+        for job_id, url, save_path, options, priority, state, filename, downloaded, total, files in rows:
+            try:
+                options = json.loads(options)
+                files = json.loads(files) if files else []
+            except ValueError:
+                continue
+            jobs.append({'job_id': job_id, 'url': url, 'save_path': save_path, 'options': options,
+                         'priority': priority, 'state': state, 'filename': filename,
+                         'downloaded_bytes': downloaded, 'total_bytes': total, 'files': files})
+        return jobs
+
+    def purge_finished(self):
+        """删除已结束的任务，它们的结果已经记录在下载历史中"""
+        placeholders = ','.join('?' * len(self.UNFINISHED))
+        self._execute(f'DELETE FROM jobs WHERE state NOT IN ({placeholders})', self.UNFINISHED)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
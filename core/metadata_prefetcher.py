@@ -0,0 +1,128 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional
+
+from .info_cache import InfoCache
+from .video_id import resolved_key
+from .ydl_pool import YoutubeDLPool
+
+@dataclass(frozen=True)
+class TaskMetadata:
+    """下载开始前通过 extract_info(download=False) 得到的信息摘要"""
+    video_key: str  # yt-dlp 实际解析出的 extractor_key:id（Generic 等 id 不可靠时为 url:...），见 resolved_key
+    title: str
+    filename: str  # 按当前选项将要写入的文件名
+    filepath: str
+    filesize: Optional[int]  # 预计大小（字节），未知时为 None
+    format_count: int
+    exists: bool  # 目标文件是否已经存在
+    fragmented: bool = False  # 是否为 HLS/DASH 等分片格式，可以并发下载分片
+    extract_seconds: float = 0.0  # 解析（或从缓存重新选择格式）所用的时间
+    stream_count: int = 1  # 分开下载的流的个数，大于 1 时下载后需要合并
+
+    @property
+    def filesize_text(self) -> str:
+        if not self.filesize:
+            return ''
+        return f"{self.filesize / 1024 / 1024:.1f} MB"
+
+
+def estimate_filesize(info: Dict) -> Optional[int]:
+    """合并下载时累加各个分量格式的大小"""
+    formats = info.get('requested_formats') or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size:
+            return None
+        total += int(size)
+    return total or None
+
+
+FRAGMENT_PROTOCOLS = ('m3u8', 'm3u8_native', 'http_dash_segments', 'http_dash_segments_generator', 'ism', 'f4m')
+
+def is_fragmented(info: Dict) -> bool:
+    formats = info.get('requested_formats') or [info]
+    return any(fmt.get('fragments') or fmt.get('protocol') in FRAGMENT_PROTOCOLS for fmt in formats)
+
+
+def summarize_info(ydl, info: Dict) -> TaskMetadata:
+    filepath = ydl.prepare_filename(info)
+    return TaskMetadata(
+        video_key=resolved_key(info.get('extractor_key') or info.get('ie_key'), info.get('id'),
+                               info.get('webpage_url') or info.get('original_url') or ''),
+        title=info.get('title') or '',
+        filename=os.path.basename(filepath),
+        filepath=filepath,
+        filesize=estimate_filesize(info),
+        format_count=len(info.get('formats') or []),
+        exists=os.path.exists(filepath),
+        fragmented=is_fragmented(info),
+        stream_count=len(info.get('requested_formats') or [info]))
+
+
+class MetadataPrefetcher:
+    """
+    在独立的小线程池中为排队任务预先解析视频信息，结果写入 InfoCache。
+
+    下载阶段直接使用缓存的信息字典，不必再次解析网页。
+    """
+
+    def __init__(self, cache: InfoCache, max_workers: int = 2, pool: Optional[YoutubeDLPool] = None):
+        self.cache = cache
+        self.pool = pool if pool is not None else YoutubeDLPool(max_idle=max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='metadata-prefetch')
+
+    def prefetch(self, key: str, url: str, ydl_opts: Dict,
+                 callback: Callable[[Optional[TaskMetadata], Optional[str]], None]):
+        """异步解析 url；完成后在线程池中调用 callback(metadata, error)"""
+        try:
+            self._executor.submit(self._fetch, key, url, ydl_opts, callback)
+        except RuntimeError:
+            pass  # 已关闭
+
+    def _fetch(self, key: str, url: str, ydl_opts: Dict, callback):
+        started = time.monotonic()
+        try:
+            with self.pool.acquire(self._quiet_opts(ydl_opts)) as ydl:
+                metadata = self._summarize_cached(ydl, key)
+                if metadata is None:
+                    info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+                    if not info:
+                        callback(None, '无法解析视频信息')
+                        return
+                    self.cache.put(key, info)
+                    metadata = summarize_info(ydl, info)
+        except Exception as e:
+            callback(None, str(e))
+            return
+        callback(replace(metadata, extract_seconds=time.monotonic() - started), None)
+
+    def lookup(self, key: str, ydl_opts: Dict) -> Optional[TaskMetadata]:
+        """只查缓存，不访问网络；缓存中没有时返回 None"""
+        if self.cache.get_path(key) is None:
+            return None
+        try:
+            with self.pool.acquire(self._quiet_opts(ydl_opts)) as ydl:
+                return self._summarize_cached(ydl, key)
+        except Exception:
+            return None
+
+    def _summarize_cached(self, ydl, key: str) -> Optional[TaskMetadata]:
+        info = self.cache.get(key)
+        if info is None:
+            return None
+        # 缓存的信息可能是按其他画质选项解析的，按当前选项重新选择格式（不访问网络）
+        info = ydl.process_ie_result(info, download=False)
+        return summarize_info(ydl, info)
+
+    @staticmethod
+    def _quiet_opts(ydl_opts: Dict) -> Dict:
+        opts = {k: v for k, v in ydl_opts.items() if k not in ('progress_hooks', 'postprocessor_hooks')}
+        opts.update(quiet=True, no_warnings=True, skip_download=True)
+        return opts
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from .queue_manager import DownloadTask, TaskState
+
+# 写入 task.stats 的各阶段耗时（秒）
+STAGES = ('queue_wait', 'metadata', 'transfer', 'postprocess')
+
+class TaskLogger:
+    """
+    传给 yt-dlp 的 logger：统计分片/HTTP 重试次数，警告和错误照常打印。
+    yt-dlp 的普通输出（包括进度条）经 debug() 传入，这里直接丢弃。
+    """
+
+    def __init__(self, task: DownloadTask):
+        self.task = task
+
+    def _count_retry(self, message: str):
+        if 'Retrying' in message:
+            self.task.stats['fragment_retries'] = self.task.stats.get('fragment_retries', 0) + 1
+
+    def debug(self, message: str):
+        self._count_retry(message)
+
+    def info(self, message: str):
+        pass
+
+    def warning(self, message: str):
+        self._count_retry(message)
+        print(message)
+
+    def error(self, message: str):
+        print(message)
+
+
+class MetricsCollector:
+    """
+    记录每个任务各阶段的耗时、字节数和速度，并汇总全局计数。
+
+    DownloadManager 在任务状态变化时直接调用这里的方法；结束的任务的统计保留最近 max_recent 条，
+    供界面和无界面模式写入下载历史。gauges 为导出时才读取的即时值（活动下载数、队列长度等）。
+    """
+
+    def __init__(self, gauges: Optional[Dict[str, Callable[[], float]]] = None, max_recent: int = 1000):
+        self.gauges = gauges or {}
+        self.max_recent = max_recent
+        self._lock = threading.Lock()
+        self._marks: Dict[int, Dict[str, float]] = {}  # task_id -> 阶段开始的 monotonic 时间
+        self._recent: "OrderedDict[int, Dict]" = OrderedDict()
+        self.counters: Dict[str, float] = {
+            'tasks_added': 0, 'tasks_done': 0, 'tasks_failed': 0, 'tasks_cancelled': 0,
+            'retries_scheduled': 0, 'fragment_retries': 0, 'bytes_downloaded': 0,
+        }
+        self.stage_sums: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.started_at = time.time()
+
+    def _mark(self, task_id: int, name: str, now: float):
+        self._marks.setdefault(task_id, {})[name] = now
+
+    def _add_stage(self, task: DownloadTask, stage: str, since: Optional[float], now: float):
+        if since is not None:
+            task.stats[stage] = task.stats.get(stage, 0.0) + max(now - since, 0.0)
+
+    def task_added(self, task: DownloadTask):
+        with self._lock:
+            self.counters['tasks_added'] += 1
+            self._mark(task.task_id, 'queued', time.monotonic())
+
+    def task_requeued(self, task: DownloadTask, retry: bool = False):
+        """失败后等待自动重试（retry=True）或暂停后恢复，重新开始计算排队时间"""
+        with self._lock:
+            if retry:
+                self.counters['retries_scheduled'] += 1
+            self._mark(task.task_id, 'queued', time.monotonic())
+            self._marks[task.task_id].pop('attempt', None)
+
+    def task_started(self, task: DownloadTask):
+        now = time.monotonic()
+        with self._lock:
+            marks = self._marks.setdefault(task.task_id, {})
+            self._add_stage(task, 'queue_wait', marks.pop('queued', None), now)
+            marks['started'] = now
+            marks['attempt'] = task.attempts  # 开始时已失败的次数，见 task_finished
+
+    def metadata_extracted(self, task: DownloadTask, seconds: float):
+        """排队期间预解析视频信息所用的时间"""
+        task.stats['metadata'] = task.stats.get('metadata', 0.0) + seconds
+
+    def transfer_started(self, task: DownloadTask):
+        """收到第一个进度回调：之前的时间用于解析网页和建立连接"""
+        now = time.monotonic()
+        with self._lock:
+            marks = self._marks.setdefault(task.task_id, {})
+            self._add_stage(task, 'metadata', marks.pop('started', None), now)
+            marks['transfer'] = now
+
+    def transfer_finished(self, task: DownloadTask):
+        """一次下载尝试结束（无论成败）"""
+        now = time.monotonic()
+        with self._lock:
+            marks = self._marks.setdefault(task.task_id, {})
+            marks.pop('started', None)
+            self._add_stage(task, 'transfer', marks.pop('transfer', None), now)
+
+    def postprocess_started(self, task: DownloadTask):
+        with self._lock:
+            self._mark(task.task_id, 'postprocess', time.monotonic())
+
+    def task_finished(self, task: DownloadTask, state: str):
+        now = time.monotonic()
+        with self._lock:
+            marks = self._marks.pop(task.task_id, {})
+            self._add_stage(task, 'postprocess', marks.get('postprocess'), now)
+            stats = task.stats
+            transfer = stats.get('transfer', 0.0)
+            downloaded = stats.get('downloaded_bytes', 0)
+            if transfer and downloaded:
+                stats['average_speed'] = downloaded / transfer
+            # task.attempts 只计失败的尝试；最后一次尝试已经开始、又没有作为失败计入时（下载完成，
+            # 或下载中被取消）再加上这一次。排队中被取消、失败的同时被取消都不会多算
+            attempt = marks.get('attempt')
+            stats['attempts'] = task.attempts + (1 if attempt is not None and attempt == task.attempts else 0)
+            counter = {TaskState.DONE: 'tasks_done', TaskState.FAILED: 'tasks_failed',
+                       TaskState.CANCELLED: 'tasks_cancelled'}.get(state)
+            if counter:
+                self.counters[counter] += 1
+            self.counters['bytes_downloaded'] += downloaded
+            self.counters['fragment_retries'] += stats.get('fragment_retries', 0)
+            for stage in STAGES:
+                self.stage_sums[stage] += stats.get(stage, 0.0)
+            self._recent[task.task_id] = dict(stats, state=state)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def task_stats(self, task_id: int) -> Optional[Dict]:
+        """已结束任务的统计（各阶段耗时、字节数、平均/峰值速度等）"""
+        with self._lock:
+            stats = self._recent.get(task_id)
+            return dict(stats) if stats else None
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            stage_sums = dict(self.stage_sums)
+        finished = counters['tasks_done'] + counters['tasks_failed']
+        gauges = {}
+        for name, read in self.gauges.items():
+            try:
+                gauges[name] = read()
+            except Exception:
+                continue
+        gauges['error_ratio'] = counters['tasks_failed'] / finished if finished else 0.0
+        gauges['uptime_seconds'] = time.time() - self.started_at
+        return {'counters': counters, 'gauges': gauges, 'stage_seconds': stage_sums}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = 'streamdowner') -> str:
+        """Prometheus 文本格式"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot['counters'].items():
+            lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value:g}']
+        for name, value in snapshot['gauges'].items():
+            lines += [f'# TYPE {prefix}_{name} gauge', f'{prefix}_{name} {value:g}']
+        lines.append(f'# TYPE {prefix}_stage_seconds_total counter')
+        for stage, value in snapshot['stage_seconds'].items():
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {value:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(collector: MetricsCollector, port: int, host: str = '127.0.0.1'):
+    """在后台线程中提供 /metrics（Prometheus 文本）和 /metrics.json，返回 ThreadingHTTPServer"""
+    # http.server 导入较慢，只在启用指标端口时导入
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = collector.to_prometheus(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = collector.to_json(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+class JsonMetricsWriter:
+    """定期把汇总指标写入 JSON 文件（先写临时文件再替换），stop() 时再写一次"""
+
+    def __init__(self, collector: MetricsCollector, path: str, interval: float = 10.0):
+        self.collector = collector
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self._thread.start()
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.collector.to_json())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop.set()
+        self.write()
@@ -0,0 +1,113 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+@dataclass
+class PlaylistEntry:
+    url: str
+    title: str = ''
+
+@dataclass
+class PlaylistGroup:
+    """一个播放列表展开后的任务组，用于汇总各条目的进度"""
+    group_id: int
+    url: str
+    save_path: str
+    options: Dict
+    key: str = ''
+    title: str = ''
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0  # 已在队列中的重复条目
+    child_ids: List[int] = field(default_factory=list)
+    job_id: Optional[int] = None  # 任务日志中的行 id，展开完成前用于恢复
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.total > 0 and self.done + self.failed + self.skipped >= self.total
+
+    @property
+    def percent(self) -> float:
+        return (self.done + self.failed + self.skipped) / self.total * 100 if self.total else 0.0
+
+    def record_result(self, success: bool) -> bool:
+        """记录一个条目的结果，返回整个组是否刚好全部结束"""
+        with self._lock:
+            if success:
+                self.done += 1
+            else:
+                self.failed += 1
+            return self.finished
+
+
+def _entry_url(entry: Dict) -> Optional[str]:
+    url = entry.get('webpage_url') or entry.get('url')
+    if not url:
+        return None
+    if '://' not in url and entry.get('ie_key') == 'Youtube':
+        # 部分提取器在扁平模式下只给出视频 id
+        url = f'https://www.youtube.com/watch?v={url}'
+    return url
+
+
+def _iter_entries(result: Dict):
+    for entry in result.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') == 'playlist' and entry.get('entries') is not None:
+            # 嵌套的播放列表（如频道的各个分页）直接展开
+            yield from _iter_entries(entry)
+            continue
+        url = _entry_url(entry)
+        if url:
+            yield PlaylistEntry(url, entry.get('title') or '')
+
+
+_MAX_REDIRECTS = 5  # 跟随 'url' / 'url_transparent' 结果的最大次数，防止循环跳转
+
+
+def _extract_flat(ydl, url: str) -> Optional[Dict]:
+    """
+    process=False 时短链接、跳转页面只返回 _type 为 'url' / 'url_transparent' 的结果，
+    需要自己继续解析目标地址；'url_transparent' 的外层字段（标题等）覆盖内层结果。
+    """
+    result = ydl.extract_info(url, download=False, process=False)
+    for _ in range(_MAX_REDIRECTS):
+        if not result or result.get('_type') not in ('url', 'url_transparent') or not result.get('url'):
+            break
+        outer = result
+        result = ydl.extract_info(outer['url'], download=False, ie_key=outer.get('ie_key'), process=False)
+        if result and outer['_type'] == 'url_transparent':
+            overrides = {k: v for k, v in outer.items()
+                         if k not in ('_type', 'url', 'ie_key', 'id') and v is not None}
+            result = dict(result, **overrides)
+    return result
+
+
+def expand_playlist(url: str):
+    """
+    只枚举播放列表条目，不解析每个视频的格式（extract_flat + process=False），
+    返回 (播放列表标题, [PlaylistEntry])。单个视频的链接返回只包含它自己的列表。
+    """
+    import yt_dlp
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        result = _extract_flat(ydl, url)
+    if not result:
+        return '', []
+    if result.get('_type') not in ('playlist', 'multi_video'):
+        return result.get('title') or '', [PlaylistEntry(_entry_url(result) or url, result.get('title') or '')]
+    entries = []
+    seen = set()
+    for entry in _iter_entries(result):
+        if entry.url not in seen:
+            seen.add(entry.url)
+            entries.append(entry)
+    return result.get('title') or '', entries
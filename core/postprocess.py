@@ -0,0 +1,225 @@
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# 音频格式 -> (扩展名, ffmpeg 编码参数)；源文件编码已经符合时直接复制音频流
+AUDIO_CODECS = {
+    'mp3': ('mp3', ['-c:a', 'libmp3lame', '-q:a', '5'], ('mp3',)),
+    'm4a': ('m4a', ['-c:a', 'aac', '-b:a', '192k'], ('mp4a', 'aac')),
+    'flac': ('flac', ['-c:a', 'flac'], ('flac',)),
+}
+MERGE_EXTS = ('mp4', 'mkv', 'webm')
+# 视频流和音频流分开下载时的文件名，带上格式 id 以免扩展名相同时互相覆盖
+STREAM_OUTTMPL = '%(title)s [%(id)s].f%(format_id)s.%(ext)s'
+
+class PostprocessError(Exception):
+    pass
+
+class PostprocessCancelled(PostprocessError):
+    pass
+
+@dataclass
+class PostprocessJob:
+    """下载完成后交给后处理线程池的合并/转码任务"""
+    task_id: int
+    kind: str  # 'merge' 合并视频和音频，'extract_audio' 提取/转换音频
+    inputs: List[str]
+    output: str
+    codec_args: List[str] = field(default_factory=list)
+    duration: Optional[float] = None  # 用于计算进度（秒）
+
+    @property
+    def label(self) -> str:
+        return '合并中' if self.kind == 'merge' else '转码中'
+
+
+def separate_streams(format_selector: str) -> str:
+    """
+    把 'bestvideo+bestaudio/best' 形式的格式选择改写为 '(bestvideo,bestaudio)/best'，
+    让 yt-dlp 分别下载视频流和音频流而不在下载线程中合并，合并由 PostprocessStage 完成。
+    """
+    alternatives = []
+    for alternative in format_selector.split('/'):
+        if '+' in alternative and not alternative.startswith('('):
+            alternative = '(' + alternative.replace('+', ',') + ')'
+        alternatives.append(alternative)
+    return '/'.join(alternatives)
+
+
+def strip_format_id(entry: Dict) -> Optional[str]:
+    """按 STREAM_OUTTMPL 保存的 '标题 [id].f18.mp4' 去掉格式 id 得到 '标题 [id].mp4'；不带格式 id 时返回 None"""
+    filename = entry.get('filename')
+    suffix = f".f{entry.get('format_id')}.{entry.get('ext')}"
+    if not filename or not filename.endswith(suffix):
+        return None
+    return f"{filename[:-len(suffix)]}.{entry.get('ext')}"
+
+
+def _has(codec) -> bool:
+    return codec not in (None, 'none')
+
+
+def plan_postprocess(task_id: int, files: List[Dict], options: Dict,
+                     target_path: Optional[str] = None) -> Optional[PostprocessJob]:
+    """
+    根据下载到磁盘的文件决定需要的后处理；不需要时返回 None。
+
+    files 中每一项包含 filename、format_id、ext、vcodec、acodec、duration，
+    target_path 为预解析得到的最终文件路径（合并后的文件名）。
+    """
+    if options.get('download_type') == '音频':
+        sources = [f for f in files if _has(f.get('acodec'))]
+        codec = AUDIO_CODECS.get(options.get('format'))
+        if not sources or codec is None:
+            return None
+        source = sources[-1]
+        ext, args, copy_codecs = codec
+        if source.get('ext') == ext:
+            return None
+        if str(source.get('acodec') or '').startswith(copy_codecs):
+            args = ['-c:a', 'copy']
+        output = os.path.splitext(source['filename'])[0] + '.' + ext
+        return PostprocessJob(task_id, 'extract_audio', [source['filename']], output, args, source.get('duration'))
+
+    videos = [f for f in files if _has(f.get('vcodec'))]
+    audios = [f for f in files if not _has(f.get('vcodec')) and _has(f.get('acodec'))]
+    if not videos or not audios:
+        return None
+    video, audio = videos[-1], audios[-1]
+    if target_path:
+        output = target_path
+    else:
+        # 分开下载时文件名形如 '标题 [id].f137.mp4'，去掉格式 id 得到合并后的文件名
+        base = os.path.splitext(strip_format_id(video) or video['filename'])[0]
+        ext = options.get('format') if options.get('format') in MERGE_EXTS else 'mkv'
+        output = f"{base}.{ext}"
+    return PostprocessJob(task_id, 'merge', [video['filename'], audio['filename']], output,
+                          duration=video.get('duration') or audio.get('duration'))
+
+
+class PostprocessStage:
+    """
+    独立于下载线程池的后处理阶段。
+
+    合并和转码在 ffmpeg 子进程中进行，线程只负责等待子进程并读取进度，
+    因此并发数按 CPU 核数设置；下载槽位在文件落盘后即可释放给下一个下载。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='postprocess')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._stopping = False
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def submit(self, job: PostprocessJob, on_progress: Callable[[float], None],
+               on_done: Callable[[Optional[Exception]], None],
+               is_cancelled: Callable[[], bool] = lambda: False) -> bool:
+        with self._lock:
+            if self._stopping:
+                return False
+            self._pending += 1
+        try:
+            self._executor.submit(self._run, job, on_progress, on_done, is_cancelled)
+        except RuntimeError:
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def _run(self, job, on_progress, on_done, is_cancelled):
+        error = None
+        try:
+            self.process(job, on_progress, is_cancelled)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self._pending -= 1
+        on_done(error)
+
+    def process(self, job: PostprocessJob, on_progress: Callable[[float], None],
+                is_cancelled: Callable[[], bool] = lambda: False):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise PostprocessError('未检测到 FFmpeg，无法合并/转码，已保留原始文件')
+        outputs = [job.output]
+        if job.kind == 'merge' and not job.output.endswith('.mkv'):
+            # 编码与 mp4/webm 容器不兼容时改用 mkv
+            outputs.append(os.path.splitext(job.output)[0] + '.mkv')
+        for output in outputs:
+            try:
+                self._run_ffmpeg(ffmpeg, job, output, on_progress, is_cancelled)
+            except PostprocessCancelled:
+                raise
+            except PostprocessError:
+                if output == outputs[-1]:
+                    raise
+                continue
+            job.output = output
+            break
+        for path in job.inputs:
+            if path != job.output and os.path.exists(path):
+                os.remove(path)
+
+    def _run_ffmpeg(self, ffmpeg, job, output, on_progress, is_cancelled):
+        root, ext = os.path.splitext(output)
+        tmp_output = f"{root}.temp{ext}"
+        args = [ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-progress', 'pipe:1', '-nostats']
+        for path in job.inputs:
+            args += ['-i', path]
+        if job.kind == 'merge':
+            args += ['-map', '0:v:0', '-map', '1:a:0', '-c', 'copy']
+        else:
+            args += ['-vn'] + job.codec_args
+        args.append(tmp_output)
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, encoding='utf-8', errors='replace')
+        with self._lock:
+            self._processes[job.task_id] = process
+        try:
+            for line in process.stdout:
+                if is_cancelled() or self._stopping:
+                    process.kill()
+                    break
+                key, _, value = line.strip().partition('=')
+                if key in ('out_time_us', 'out_time_ms') and job.duration and value.isdigit():
+                    # ffmpeg 的 out_time_ms 实际单位也是微秒
+                    on_progress(min(int(value) / 1e6 / job.duration * 100, 100.0))
+            stderr = process.stderr.read()
+            returncode = process.wait()
+        finally:
+            with self._lock:
+                self._processes.pop(job.task_id, None)
+        if is_cancelled() or self._stopping:
+            self._remove(tmp_output)
+            raise PostprocessCancelled('后处理已取消')
+        if returncode != 0:
+            self._remove(tmp_output)
+            raise PostprocessError(f"ffmpeg 失败: {stderr.strip().splitlines()[-1] if stderr.strip() else returncode}")
+        os.replace(tmp_output, output)
+        on_progress(100.0)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            processes = list(self._processes.values())
+        for process in processes:
+            process.kill()
+        self._executor.shutdown(wait=False, cancel_futures=True)
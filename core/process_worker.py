@@ -0,0 +1,225 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from .retry_policy import status_code
+from .startup import preload_yt_dlp
+from .ydl_pool import YoutubeDLPool
+
+# 进度回调中跨进程传递的字段；info_dict 很大，只保留回调里用到的部分
+_PROGRESS_KEYS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'filename',
+                  'speed', 'eta', 'elapsed', 'fragment_index', 'fragment_count', 'postprocessor')
+_INFO_KEYS = ('format_id', 'ext', 'vcodec', 'acodec', 'duration', 'filepath')
+_LOCAL_PARAMS = ('progress_hooks', 'postprocessor_hooks', 'logger')
+_RELAY_INTERVAL = 0.1  # 子进程转发 'downloading' 进度、读取取消标志和限速的最小间隔（秒）
+
+
+class RemoteDownloadError(Exception):
+    """子进程中 yt-dlp 抛出的异常；保留 HTTP 状态码，供 classify_error 判断是否重试"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        return type(self), (str(self), self.status)
+
+
+def _portable(d: Dict) -> Dict:
+    portable = {k: d[k] for k in _PROGRESS_KEYS if k in d}
+    if d.get('error') is not None:
+        portable['error'] = str(d['error'])
+    info = d.get('info_dict') or {}
+    portable['info_dict'] = {k: info[k] for k in _INFO_KEYS if k in info}
+    return portable
+
+
+class _ChildRelay:
+    """子进程一侧：把 yt-dlp 的回调和日志转发给父进程，并按父进程的要求取消或调整限速"""
+
+    def __init__(self, channel, control):
+        self.channel = channel
+        self.control = control
+        self.params: Dict = {}
+        self._last = 0.0
+
+    def poll_control(self):
+        control = dict(self.control.items())
+        if control.get('cancel'):
+            import yt_dlp
+            raise yt_dlp.utils.DownloadCancelled('下载已取消')
+        self.params['ratelimit'] = control.get('ratelimit')
+
+    def progress(self, d):
+        # 'downloading' 进度按间隔抽样转发，完成、出错等状态变化每次都转发
+        now = time.monotonic()
+        if d.get('status') == 'downloading' and now - self._last < _RELAY_INTERVAL:
+            return
+        self._last = now
+        self.poll_control()
+        self.channel.put(('progress', _portable(d)))
+
+    def postprocess(self, d):
+        self.channel.put(('postprocess', _portable(d)))
+
+    def debug(self, message: str):
+        if 'Retrying' in message:
+            self.channel.put(('log', 'debug', message))
+
+    def info(self, message: str):
+        pass
+
+    def warning(self, message: str):
+        self.channel.put(('log', 'warning', message))
+
+    def error(self, message: str):
+        self.channel.put(('log', 'error', message))
+
+
+_child_pool: Optional[YoutubeDLPool] = None
+
+
+def _child_run(params: Dict, method: str, argument, channel, control):
+    """在子进程中执行 ydl.download / ydl.download_with_info_file；同一进程内复用 YoutubeDL 实例"""
+    global _child_pool
+    if _child_pool is None:
+        _child_pool = YoutubeDLPool(max_idle=2)
+    relay = _ChildRelay(channel, control)
+    params = dict(params, progress_hooks=[relay.progress], postprocessor_hooks=[relay.postprocess],
+                  logger=relay)
+    try:
+        with _child_pool.acquire(params) as ydl:
+            relay.params = ydl.params
+            relay.poll_control()
+            getattr(ydl, method)(argument)
+    except Exception as e:
+        # yt-dlp 的异常可能无法序列化，只传回错误信息和状态码
+        raise RemoteDownloadError(str(e), status_code(e)) from None
+    finally:
+        channel.put(('done', None))
+
+
+class RemoteYoutubeDL:
+    """
+    父进程一侧的替身，接口与 YoutubeDL 的 download / download_with_info_file / params 相同。
+
+    params 是本地字典：BandwidthManager 写入的 ratelimit 会随下一条消息转给子进程；
+    子进程发来的回调在调用 download 的线程中依次执行，回调抛出的异常（暂停、取消）会让子进程停止下载。
+    """
+
+    def __init__(self, downloader: 'ProcessDownloader', params: Dict, is_cancelled: Callable[[], bool]):
+        self._downloader = downloader
+        self._hooks = params
+        self._is_cancelled = is_cancelled
+        self.params = {'ratelimit': params.get('ratelimit')}
+
+    def download(self, urls):
+        self._run('download', list(urls))
+
+    def download_with_info_file(self, info_path: str):
+        self._run('download_with_info_file', info_path)
+
+    def _run(self, method: str, argument):
+        manager = self._downloader.manager()
+        channel = manager.Queue()
+        control = manager.dict(cancel=False, ratelimit=self.params.get('ratelimit'))
+        # 回调和 logger 留在父进程，其余参数（包括每个任务自己的 paths 等）原样传给子进程
+        portable = {k: v for k, v in self._hooks.items() if k not in _LOCAL_PARAMS}
+        future = self._downloader.executor().submit(_child_run, portable, method, argument, channel, control)
+        failure = None
+        cancel_sent = False
+        ratelimit = self.params.get('ratelimit')
+        while True:
+            try:
+                message = channel.get(timeout=0.2)
+            except queue.Empty:
+                message = None
+            if failure is None and self._is_cancelled():
+                failure = RemoteDownloadError('下载已取消')
+            if failure is not None and not cancel_sent:
+                control['cancel'] = True
+                cancel_sent = True
+            if self.params.get('ratelimit') != ratelimit:
+                ratelimit = self.params.get('ratelimit')
+                control['ratelimit'] = ratelimit
+            if message is None:
+                if future.done() and channel.empty():
+                    break
+                continue
+            kind = message[0]
+            if kind == 'done':
+                break
+            if failure is not None:
+                continue  # 已经要求子进程停止，剩下的消息只需取出
+            try:
+                self._dispatch(kind, message)
+            except Exception as e:
+                failure = e
+        try:
+            future.result()
+        except Exception as e:
+            if failure is None:
+                raise
+            raise failure from e
+        if failure is not None:
+            raise failure
+
+    def _dispatch(self, kind: str, message):
+        if kind == 'progress':
+            for hook in self._hooks.get('progress_hooks') or []:
+                hook(message[1])
+        elif kind == 'postprocess':
+            for hook in self._hooks.get('postprocessor_hooks') or []:
+                hook(message[1])
+        elif kind == 'log':
+            logger = self._hooks.get('logger')
+            if logger is not None:
+                getattr(logger, message[1])(message[2])
+
+
+class ProcessDownloader:
+    """
+    在进程池中运行 yt-dlp。
+
+    yt-dlp 的网页解析、格式选择和分片处理都是纯 Python 代码，同时下载的任务很多（8 个以上）时
+    在同一进程中会争抢 GIL；放到子进程中各自独占解释器。子进程以 spawn 方式启动并预先导入 yt-dlp，
+    同一子进程中按参数复用 YoutubeDL 实例；回调通过 multiprocessing.Manager 的队列转回父进程。
+    """
+
+    def __init__(self, max_workers: int = 3):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=preload_yt_dlp)
+            return self._executor
+
+    def manager(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context('spawn').Manager()
+            return self._manager
+
+    @contextmanager
+    def acquire(self, params: Dict, is_cancelled: Callable[[], bool] = lambda: False):
+        """与 YoutubeDLPool.acquire 用法相同"""
+        yield RemoteYoutubeDL(self, params, is_cancelled)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
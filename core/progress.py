@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+@dataclass(frozen=True)
+class DownloadProgress:
+    """某个任务在某一时刻的进度快照，不可变，可以安全地跨线程传递"""
+    task_id: int
+    filename: str = ''
+    percent: float = 0.0
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: float = 0.0  # 平滑后的速度，字节/秒
+    eta: Optional[float] = None  # 预计剩余秒数
+    status: str = '等待中'
+
+    @property
+    def speed_text(self) -> str:
+        if not self.speed:
+            return ''
+        return f"{self.speed / 1024 / 1024:.1f} MB/s"
+
+    @property
+    def eta_text(self) -> str:
+        if self.eta is None:
+            return ''
+        minutes, seconds = divmod(int(self.eta), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class _TaskProgress:
+    """聚合器内部为每个任务维护的可变状态"""
+    __slots__ = ('snapshot', 'sample_time', 'sample_bytes', 'speed')
+
+    def __init__(self, task_id: int):
+        self.snapshot = DownloadProgress(task_id)
+        self.sample_time = 0.0
+        self.sample_bytes = 0
+        self.speed = 0.0
+
+
+class ProgressAggregator:
+    """
+    进度聚合：yt-dlp 每个数据块都会回调一次进度钩子，这里只记录最新状态，
+    按固定频率（默认 10 Hz）把有变化的任务合并成一批快照发出。
+    传入 loop（core.event_loop.CoreLoop）时由事件循环定时发出，否则使用自己的后台线程。
+
+    速度根据 downloaded_bytes 的变化自行测量并做指数平滑，
+    总大小未知时使用 total_bytes_estimate 估算百分比和剩余时间。
+    """
+
+    SAMPLE_INTERVAL = 0.5  # 测速采样间隔（秒）
+
+    def __init__(self, emit: Callable[[List[DownloadProgress]], None], rate_hz: float = 10.0,
+                 smoothing: float = 0.3, loop=None):
+        self._emit = emit
+        self.interval = 1.0 / rate_hz if rate_hz > 0 else 0.1
+        self.smoothing = smoothing
+        self._tasks: Dict[int, _TaskProgress] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if loop is not None:
+            loop.call_every(self.interval, self._tick)
+        else:
+            threading.Thread(target=self._run, name='progress-aggregator', daemon=True).start()
+
+    def _state(self, task_id: int) -> _TaskProgress:
+        state = self._tasks.get(task_id)
+        if state is None:
+            state = self._tasks[task_id] = _TaskProgress(task_id)
+        return state
+
+    def update(self, task_id: int, d: dict):
+        """记录一次 yt-dlp 'downloading' 进度回调，开销很小，可在下载线程中直接调用"""
+        now = time.monotonic()
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        with self._lock:
+            state = self._state(task_id)
+            elapsed = now - state.sample_time
+            if downloaded < state.sample_bytes or not state.sample_time:
+                # 新文件开始（例如视频下完后开始下音频），重新采样
+                state.sample_time, state.sample_bytes = now, downloaded
+            elif elapsed >= self.SAMPLE_INTERVAL:
+                instant = (downloaded - state.sample_bytes) / elapsed
+                state.speed = instant if not state.speed else (
+                    self.smoothing * instant + (1 - self.smoothing) * state.speed)
+                state.sample_time, state.sample_bytes = now, downloaded
+            speed = state.speed or d.get('speed') or 0.0
+            eta = max(total - downloaded, 0) / speed if total and speed else d.get('eta')
+            state.snapshot = replace(
+                state.snapshot,
+                filename=os.path.basename(d.get('filename') or '') or state.snapshot.filename or '未知文件',
+                percent=min(downloaded / total * 100, 100.0) if total else state.snapshot.percent,
+                downloaded_bytes=downloaded,
+                total_bytes=total,
+                speed=speed,
+                eta=eta,
+                status='下载中')
+            self._dirty.add(task_id)
+
+    def set_status(self, task_id: int, status: str, **changes) -> DownloadProgress:
+        """状态变化（完成、出错等）立即发出，不等待下一次采样"""
+        with self._lock:
+            state = self._state(task_id)
+            state.snapshot = replace(state.snapshot, status=status, **changes)
+            self._dirty.discard(task_id)
+            snapshot = state.snapshot
+        self._emit([snapshot])
+        return snapshot
+
+    def get(self, task_id: int) -> Optional[DownloadProgress]:
+        with self._lock:
+            state = self._tasks.get(task_id)
+            return state.snapshot if state else None
+
+    def remove(self, task_id: int):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._dirty.discard(task_id)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshots = [self._tasks[task_id].snapshot for task_id in self._dirty if task_id in self._tasks]
+            self._dirty.clear()
+        if snapshots:
+            self._emit(snapshots)
+
+    def _tick(self) -> bool:
+        if self._stop.is_set():
+            return False
+        self.flush()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
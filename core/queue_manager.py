@@ -1,36 +1,320 @@
-from queue import Queue
-from dataclasses import dataclass
-from typing import Dict, Any
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, List, Optional
+
+from .video_id import site_of
+
+_task_ids = itertools.count(1)
+
+def new_task_id() -> int:
+    """任务和播放列表任务组共用同一个 id 序列"""
+    return next(_task_ids)
+
+class TaskState:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    POSTPROCESSING = 'postprocessing'  # 文件已落盘，正在合并/转码，不占用下载槽位
+    PAUSED = 'paused'
+    CANCELLED = 'cancelled'
+    DONE = 'done'
+    FAILED = 'failed'
 
 @dataclass
 class DownloadTask:
     url: str
     save_path: str
     options: Dict[str, Any]
-    priority: int = 0
+    priority: int = 0  # 数值越大越先下载
+    key: str = ''  # 去重用的视频规范键（extractor:id），见 core.video_id
+    task_id: int = field(default_factory=new_task_id)
+    group_id: Optional[int] = None  # 所属播放列表任务组
+    job_id: Optional[int] = None  # 任务日志中的行 id，见 core.job_journal
+    error: Optional[str] = None  # 下载失败时的错误信息
+    error_kind: Optional[str] = None  # 错误类型，见 core.retry_policy.ErrorKind
+    attempts: int = 0  # 已失败的次数
+    next_attempt_at: float = 0.0  # 自动重试前不早于该时间（time.time()）开始
+    files: List[Dict[str, Any]] = field(default_factory=list)  # 本次下载落盘的文件，供后处理使用
+    # 上次退出时已经下载完、尚未合并/转码的文件（从任务日志恢复），下载时直接交给后处理
+    journal_files: List[Dict[str, Any]] = field(default_factory=list)
+    # 下载统计：fragment_workers（分片并发数）、fragmented、downloaded_bytes、elapsed（秒）、filepath
+    stats: Dict[str, Any] = field(default_factory=dict)
+    state: str = TaskState.QUEUED
+    metadata: Optional[Any] = None  # 预解析得到的 TaskMetadata，见 core.metadata_prefetcher
+    alias_keys: List[str] = field(default_factory=list)  # 预解析后才知道的其他规范键
+    # 下载中的任务收到取消/暂停请求后，由进度回调中止下载
+    cancel_requested: bool = False
+    pause_requested: bool = False
+
+    @property
+    def site(self) -> str:
+        return site_of(self.url)
+
+@dataclass(frozen=True)
+class TaskResult:
+    """已完成任务（或播放列表任务组）的结果，按任务自己的选项写入下载历史"""
+    task_id: int
+    url: str
+    save_path: str
+    options: Dict[str, Any]
+    filename: str
+    video_key: Optional[str] = None  # None 时由 HistoryManager 按 URL 计算
+    files: List[Dict[str, Any]] = field(default_factory=list)  # 最终文件：[{'path': 路径, 'size': 字节数}]
+    stats: Optional[Dict[str, Any]] = None  # 各阶段耗时等，见 core.metrics
+
+# 各站点的默认并发上限，避免触发限流；未列出的站点只受总并发数限制
+DEFAULT_HOST_LIMITS = {'bilibili': 2, 'youtube': 4}
 
 class QueueManager:
-    def __init__(self, max_concurrent=3):
-        self.queue = Queue()
-        self.active_tasks = set()
+    """
+    下载任务调度器。
+
+    排队任务保存在按 (-priority, 序号) 排序的堆中，同优先级保持加入顺序。
+    修改优先级或恢复任务时压入新的堆项，旧堆项通过序号比对惰性丢弃。
+    """
+
+    def __init__(self, max_concurrent=3, host_limits: Optional[Dict[str, int]] = None):
         self.max_concurrent = max_concurrent
-    
-    def add_task(self, task: DownloadTask):
-        self.queue.put(task)
-    
-    def get_next_task(self) -> DownloadTask:
-        if not self.queue.empty() and len(self.active_tasks) < self.max_concurrent:
-            task = self.queue.get()
-            self.active_tasks.add(task.url)
-            return task
-        return None
-    
-    def task_completed(self, url: str):
-        if url in self.active_tasks:
-            self.active_tasks.remove(url)
-    
+        self.host_limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+        self.tasks: Dict[int, DownloadTask] = {}  # 排队、暂停和下载中的任务
+        self.active_tasks: Dict[int, DownloadTask] = {}  # task_id -> 下载中的任务
+        self.pending_keys = set()  # 排队中和下载中的视频规范键
+        self._heap: List[tuple] = []
+        self._heap_seq: Dict[int, int] = {}  # task_id -> 最新有效堆项的序号
+        self._seq = itertools.count()
+        self._queued = 0
+        self._active_per_site: Dict[str, int] = {}
+        self._host_not_before: Dict[str, float] = {}  # 被限流的站点在此时间之前不再开始新下载
+        # 取任务前的额外检查（例如磁盘剩余空间），返回 False 的任务暂时跳过
+        self.admission: Optional[Callable[[DownloadTask], bool]] = None
+        # 工作线程完成任务时会回调 task_completed，需要加锁保证取任务与释放槽位的一致性
+        self._lock = threading.Lock()
+
+    def _push(self, task: DownloadTask):
+        seq = next(self._seq)
+        self._heap_seq[task.task_id] = seq
+        heapq.heappush(self._heap, (-task.priority, seq, task.task_id))
+
+    def add_task(self, task: DownloadTask) -> bool:
+        """加入队列；同一视频已在排队或下载中时返回 False"""
+        with self._lock:
+            key = task.key or task.url
+            if key in self.pending_keys:
+                return False
+            self.pending_keys.add(key)
+            self.tasks[task.task_id] = task
+            task.state = TaskState.QUEUED
+            self._queued += 1
+            self._push(task)
+            return True
+
+    def reserve_key(self, key: str) -> bool:
+        """占用一个规范键（用于正在展开的播放列表），已被占用时返回 False"""
+        with self._lock:
+            if key in self.pending_keys:
+                return False
+            self.pending_keys.add(key)
+            return True
+
+    def release_key(self, key: str):
+        with self._lock:
+            self.pending_keys.discard(key)
+
+    def add_alias(self, task_id: int, key: str) -> bool:
+        """
+        为任务追加一个规范键（预解析得到的真实 extractor:id），任务结束时一并释放。
+        该键已被其他任务占用时返回 False。
+        """
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None or key == (task.key or task.url) or key in task.alias_keys:
+                return True
+            if key in self.pending_keys:
+                return False
+            self.pending_keys.add(key)
+            task.alias_keys.append(key)
+            return True
+
+    def _release_keys(self, task: DownloadTask):
+        self.pending_keys.discard(task.key or task.url)
+        for key in task.alias_keys:
+            self.pending_keys.discard(key)
+
+    def is_pending(self, key: str) -> bool:
+        with self._lock:
+            return key in self.pending_keys
+
+    def get_task(self, task_id: int) -> Optional[DownloadTask]:
+        with self._lock:
+            return self.tasks.get(task_id)
+
+    def _site_available(self, site: str, now: float) -> bool:
+        if self._host_not_before.get(site, 0.0) > now:
+            return False
+        limit = self.host_limits.get(site)
+        return limit is None or self._active_per_site.get(site, 0) < limit
+
+    def get_next_task(self) -> Optional[DownloadTask]:
+        with self._lock:
+            if len(self.active_tasks) >= self.max_concurrent:
+                return None
+            skipped = []
+            chosen = None
+            now = time.time()
+            while self._heap:
+                item = heapq.heappop(self._heap)
+                _, seq, task_id = item
+                task = self.tasks.get(task_id)
+                if task is None or task.state != TaskState.QUEUED or self._heap_seq.get(task_id) != seq:
+                    continue  # 已取消、暂停或优先级已变更的旧堆项
+                if task.next_attempt_at > now or not self._site_available(task.site, now):
+                    skipped.append(item)  # 等待重试或该站点并发已满，先跳过，保留其位置
+                    continue
+                if self.admission is not None and not self.admission(task):
+                    skipped.append(item)
+                    continue
+                chosen = task
+                break
+            for item in skipped:
+                heapq.heappush(self._heap, item)
+            if chosen is None:
+                return None
+            del self._heap_seq[chosen.task_id]
+            chosen.state = TaskState.RUNNING
+            self._queued -= 1
+            self.active_tasks[chosen.task_id] = chosen
+            site = chosen.site
+            self._active_per_site[site] = self._active_per_site.get(site, 0) + 1
+            return chosen
+
+    def start_postprocessing(self, task_id: int) -> bool:
+        """下载完成、进入后处理：释放下载槽位，但任务和规范键保留到后处理结束"""
+        with self._lock:
+            task = self.active_tasks.pop(task_id, None)
+            if task is None:
+                return False
+            self._active_per_site[task.site] -= 1
+            task.state = TaskState.POSTPROCESSING
+            return True
+
+    def task_completed(self, task_id: int, state: str = TaskState.DONE) -> bool:
+        """
+        释放下载槽位（或结束后处理）；state 为 PAUSED 时任务保留在队列中等待恢复。
+        每个任务只有第一次调用返回 True，重复调用不会再次释放槽位。
+        """
+        with self._lock:
+            task = self.active_tasks.pop(task_id, None)
+            if task is not None:
+                self._active_per_site[task.site] -= 1
+            else:
+                task = self.tasks.get(task_id)
+                if task is None or task.state != TaskState.POSTPROCESSING:
+                    return False
+            task.cancel_requested = False
+            task.pause_requested = False
+            task.state = state
+            if state != TaskState.PAUSED:
+                self.tasks.pop(task_id, None)
+                self._release_keys(task)
+            return True
+
+    def retry(self, task_id: int, not_before: float) -> bool:
+        """释放下载中任务的槽位并重新排队，not_before 之前不会再次开始"""
+        with self._lock:
+            task = self.active_tasks.pop(task_id, None)
+            if task is None:
+                return False
+            self._active_per_site[task.site] -= 1
+            task.next_attempt_at = not_before
+            if task.cancel_requested:
+                # 失败的同时用户取消了任务
+                task.state = TaskState.CANCELLED
+                self.tasks.pop(task_id, None)
+                self._release_keys(task)
+                return False
+            task.state = TaskState.PAUSED if task.pause_requested else TaskState.QUEUED
+            task.pause_requested = False
+            if task.state == TaskState.QUEUED:
+                self._queued += 1
+                self._push(task)
+            return True
+
+    def backoff_host(self, site: str, not_before: float):
+        """站点限流时，在 not_before 之前不再开始该站点的任何下载"""
+        with self._lock:
+            self._host_not_before[site] = max(self._host_not_before.get(site, 0.0), not_before)
+
+    def cancel(self, task_id: int) -> bool:
+        """取消任务：排队/暂停中的直接移除，下载中的请求中止"""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return False
+            if task.state in (TaskState.RUNNING, TaskState.POSTPROCESSING):
+                task.cancel_requested = True
+                return True
+            if task.state == TaskState.QUEUED:
+                self._queued -= 1
+            task.state = TaskState.CANCELLED
+            self._heap_seq.pop(task_id, None)
+            del self.tasks[task_id]
+            self._release_keys(task)
+            return True
+
+    def pause(self, task_id: int) -> bool:
+        """暂停任务：下载中的任务会中止并保留 .part 文件，恢复后继续下载"""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return False
+            if task.state == TaskState.RUNNING:
+                task.pause_requested = True
+                return True
+            if task.state != TaskState.QUEUED:
+                return False
+            task.state = TaskState.PAUSED
+            self._queued -= 1
+            self._heap_seq.pop(task_id, None)
+            return True
+
+    def resume(self, task_id: int) -> bool:
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None or task.state != TaskState.PAUSED:
+                return False
+            task.state = TaskState.QUEUED
+            task.next_attempt_at = 0.0  # 手动恢复时不再等待自动重试
+            self._queued += 1
+            self._push(task)
+            return True
+
+    def set_priority(self, task_id: int, priority: int) -> bool:
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return False
+            task.priority = priority
+            if task.state == TaskState.QUEUED:
+                self._push(task)
+            return True
+
+    def move_to_top(self, task_id: int) -> bool:
+        """把任务提到所有排队任务之前"""
+        with self._lock:
+            top = max((t.priority for t in self.tasks.values() if t.task_id != task_id), default=0)
+        return self.set_priority(task_id, top + 1)
+
+    def list_tasks(self) -> List[DownloadTask]:
+        """排队、暂停、下载中和后处理中的任务，按加入顺序"""
+        with self._lock:
+            return list(self.tasks.values())
+
     def get_queue_size(self) -> int:
-        return self.queue.qsize()
-    
+        with self._lock:
+            return self._queued
+
     def get_active_count(self) -> int:
-        return len(self.active_tasks)
\ No newline at end of file
+        with self._lock:
+            return len(self.active_tasks)
@@ -0,0 +1,111 @@
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+class ErrorKind:
+    TRANSIENT = 'transient'  # 网络中断、超时、5xx，稍后重试
+    THROTTLED = 'throttled'  # 429 等限流，整个站点一起退避
+    EXPIRED = 'expired'  # 403：多半是解析得到的直链过期或签名失效，重新解析后再试一次
+    PERMANENT = 'permanent'  # 视频不存在、私有、地区限制等，重试无意义
+
+# 按顺序匹配 yt-dlp 的错误信息（不区分大小写）
+_PATTERNS = [
+    (ErrorKind.THROTTLED, re.compile(
+        r'HTTP Error 429|Too Many Requests|rate[- ]?limit|throttl|请求过于频繁', re.I)),
+    (ErrorKind.EXPIRED, re.compile(r'HTTP Error 403|403: Forbidden', re.I)),
+    (ErrorKind.PERMANENT, re.compile(
+        r'HTTP Error (?:400|401|404|410|451)|Unsupported URL|Video unavailable|Private video|'
+        r'is not available|has been removed|copyright|members[- ]only|Sign in to confirm|'
+        r'Requested format is not available|not available in your country|geo[- ]?restrict', re.I)),
+    (ErrorKind.TRANSIENT, re.compile(
+        r'HTTP Error (?:408|5\d\d)|timed? ?out|Connection (?:reset|refused|aborted)|Remote end closed|'
+        r'IncompleteRead|bytes read|Temporary failure|Name or service not known|getaddrinfo|'
+        r'Network is unreachable|SSL|EOF occurred|urlopen error|Unable to download (?:webpage|JSON|API)|'
+        r'fragment .* not found|did not get any data', re.I)),
+]
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """yt-dlp 把底层异常保存在 DownloadError.exc_info 中，HTTP 错误带有状态码"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        for attr in ('status', 'code'):
+            value = getattr(exc, attr, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+        exc_info = getattr(exc, 'exc_info', None)
+        exc = (exc_info[1] if exc_info else None) or getattr(exc, 'cause', None) or exc.__cause__
+    return None
+
+def classify_error(exc: BaseException) -> str:
+    status = status_code(exc)
+    if status == 429:
+        return ErrorKind.THROTTLED
+    if status == 403:
+        return ErrorKind.EXPIRED
+    if status is not None and (status >= 500 or status == 408):
+        return ErrorKind.TRANSIENT
+    if status is not None and status >= 400:
+        return ErrorKind.PERMANENT
+    message = str(exc)
+    for kind, pattern in _PATTERNS:
+        if pattern.search(message):
+            return kind
+    # 无法识别的错误不自动重试，避免对解析失败等问题反复请求
+    return ErrorKind.PERMANENT
+
+
+@dataclass(frozen=True)
+class RetryInfo:
+    """一次自动重试的安排，通过 DownloadManager.retry_scheduled 通知界面"""
+    task_id: int
+    attempt: int  # 即将进行的是第几次尝试
+    max_attempts: int
+    kind: str
+    error: str
+    next_attempt_at: float  # time.time() 时间戳
+
+    @property
+    def text(self) -> str:
+        when = time.strftime('%H:%M:%S', time.localtime(self.next_attempt_at))
+        reason = {ErrorKind.THROTTLED: '限流', ErrorKind.EXPIRED: '链接失效'}.get(self.kind, '出错')
+        return f"{reason}，{when} 重试（{self.attempt}/{self.max_attempts}）"
+
+
+class RetryPolicy:
+    """
+    指数退避加随机抖动。
+
+    等待时间按任务已失败次数与该站点连续失败次数中较大的一个翻倍，
+    站点下载成功后连续失败次数清零。403（EXPIRED）只重新解析后重试一次，仍然 403 时视为永久错误。
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 5.0, throttled_delay: float = 60.0,
+                 max_delay: float = 900.0, jitter: float = 0.3):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.throttled_delay = throttled_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._host_failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def next_delay(self, site: str, kind: str, attempts: int) -> Optional[float]:
+        """attempts 为已经失败的次数；不应再重试时返回 None"""
+        if kind == ErrorKind.PERMANENT or attempts >= self.max_attempts:
+            return None
+        if kind == ErrorKind.EXPIRED and attempts > 1:
+            return None
+        with self._lock:
+            failures = self._host_failures.get(site, 0) + 1
+            self._host_failures[site] = failures
+        base = self.throttled_delay if kind == ErrorKind.THROTTLED else self.base_delay
+        delay = min(self.max_delay, base * 2 ** (max(attempts, failures) - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def record_success(self, site: str):
+        with self._lock:
+            self._host_failures.pop(site, None)
@@ -0,0 +1,58 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+class StartupTimer:
+    """
+    记录启动各阶段的耗时，用于发现启动变慢的回归。
+
+    mark(name) 记录从上一个 mark 到现在的耗时（主线程上顺序执行的阶段）；
+    measure(name) 用于后台线程中的阶段。enabled 为 True 时每个阶段结束即输出到标准错误。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self._last = self.started
+        self._lock = threading.Lock()
+        self.phases: List[Tuple[str, float]] = []
+
+    def _record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append((name, seconds))
+        if self.enabled:
+            sys.stderr.write(f"[启动] {name}: {seconds * 1000:.0f} ms"
+                             f"（累计 {(time.perf_counter() - self.started) * 1000:.0f} ms）\n")
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        seconds, self._last = now - self._last, now
+        self._record(name, seconds)
+
+    @contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - started)
+
+    def run_in_background(self, name: str, target, *args):
+        """在守护线程中执行 target 并记录耗时，异常只输出不抛出"""
+        def run():
+            try:
+                with self.measure(name):
+                    target(*args)
+            except Exception as e:
+                print(f"Error during startup ({name}): {e}")
+
+        thread = threading.Thread(target=run, name=f'startup-{name}', daemon=True)
+        thread.start()
+        return thread
+
+
+def preload_yt_dlp():
+    """提前导入 yt-dlp（提取器注册表很大），让第一次解析/下载不必等待导入"""
+    import yt_dlp  # noqa: F401
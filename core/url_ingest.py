@@ -0,0 +1,75 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from .video_id import canonical_key
+
+# 文本中的链接：带协议的任意网址，以及省略协议的常用视频站点地址
+URL_PATTERN = re.compile(
+    r'(?:https?://|(?<![\w.@/])(?:(?:www|m|music)\.)?(?:youtube\.com|youtu\.be|bilibili\.com|b23\.tv)/)'
+    r'[^\s<>"\'`，。；！？、）】》]+',
+    re.IGNORECASE)
+# 句末标点和不成对的右括号不属于链接
+_TRAILING = '.,;:!?)]}>\'"'
+
+def extract_urls(text: str) -> List[str]:
+    """从粘贴的文本、文件内容中提取链接，按出现顺序返回（未去重）"""
+    urls = []
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip(_TRAILING)
+        if '://' not in url:
+            url = 'https://' + url
+        urls.append(url)
+    return urls
+
+
+def read_url_file(path: str) -> List[str]:
+    """读取文本、CSV、HTML 等文件中的所有链接"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return extract_urls(f.read())
+
+
+@dataclass
+class UrlBatch:
+    """一批待加入队列的链接按规范键去重、与下载历史比对后的结果"""
+    new: List[str] = field(default_factory=list)  # 未下载过的链接
+    downloaded: List[str] = field(default_factory=list)  # 下载历史中已有
+    repeated: int = 0  # 同一批中重复出现（不同形式的链接指向同一视频也算）
+
+    @property
+    def total(self) -> int:
+        return len(self.new) + len(self.downloaded) + self.repeated
+
+
+def prepare_batch(urls: Iterable[str], history_manager=None, playlist: bool = False,
+                  offline_only: bool = False) -> UrlBatch:
+    """
+    按规范键去重，并在一次加锁的索引查询中找出下载历史中已有的链接。
+    history_manager 为 None 时不比对历史；在界面线程调用时传入 offline_only=True，不加载 yt-dlp。
+    """
+    batch = UrlBatch()
+    unique: List[Tuple[str, str]] = []
+    seen = set()
+    for url in urls:
+        key = canonical_key(url, playlist, offline_only)
+        if key in seen:
+            batch.repeated += 1
+            continue
+        seen.add(key)
+        unique.append((url, key))
+    known = history_manager.find_known(unique) if history_manager is not None else set()
+    for url, _ in unique:
+        (batch.downloaded if url in known else batch.new).append(url)
+    return batch
+
+
+def summarize_batch(batch: UrlBatch, added: int, pending: int, skipped_downloaded: Optional[int] = None) -> str:
+    """批量加入后的汇总文字"""
+    parts = [f"共 {batch.total} 个链接，已加入队列 {added} 个"]
+    if pending:
+        parts.append(f"已在队列中 {pending} 个")
+    if skipped_downloaded:
+        parts.append(f"已下载过（跳过）{skipped_downloaded} 个")
+    if batch.repeated:
+        parts.append(f"重复 {batch.repeated} 个")
+    return "，".join(parts)
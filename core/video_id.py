@@ -0,0 +1,149 @@
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 分享链接里常见的跟踪参数，不影响指向的视频
+TRACKING_PARAMS = {'si', 'feature', 'pp', 'spm_id_from', 'vd_source', 'from', 'share_source',
+                   'share_medium', 'share_plat', 'share_session_id', 'share_tag', 'timestamp',
+                   'unique_k', 'bbid', 'ts'}
+
+# 常用站点的离线快速匹配，返回值与 yt-dlp 的 (extractor_key, id) 一致
+_YOUTUBE_HOST = r'(?:https?://)?(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com'
+_YOUTUBE_PATTERNS = [
+    re.compile(r'(?:https?://)?(?:www\.)?youtu\.be/(?P<id>[0-9A-Za-z_-]{11})'),
+    re.compile(_YOUTUBE_HOST + r'/(?:shorts|embed|live|v|e)/(?P<id>[0-9A-Za-z_-]{11})'),
+]
+_YOUTUBE_WATCH = re.compile(_YOUTUBE_HOST + r'/watch\b')
+_YOUTUBE_PLAYLIST = re.compile(_YOUTUBE_HOST + r'/(?:playlist|watch)\b')
+_YOUTUBE_ID = re.compile(r'^[0-9A-Za-z_-]{11}$')
+_BILIBILI_VIDEO = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?bilibili\.com/(?:video|bangumi/play)/(?P<id>BV[0-9A-Za-z]{10}|av\d+)',
+    re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化 URL 用于精确匹配：
+    忽略协议与大小写不敏感的主机名差异、www./m. 前缀、锚点、末尾斜杠和跟踪参数。
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url if '://' in url else f'https://{url}')
+    except ValueError:
+        return url.lower()
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in TRACKING_PARAMS and not k.startswith('utm_')]
+    query.sort()
+    return urlunsplit(('', host, parts.path.rstrip('/'), urlencode(query), '')).lstrip('/')
+
+
+def _query(url: str) -> dict:
+    try:
+        return parse_qs(urlsplit(url).query)
+    except ValueError:
+        return {}
+
+
+def match_known_site(url: str, playlist: bool = False) -> Optional[Tuple[str, str]]:
+    """离线正则匹配 YouTube / Bilibili，无法识别时返回 None"""
+    url = url.strip()
+    if playlist and _YOUTUBE_PLAYLIST.match(url):
+        list_id = _query(url).get('list', [None])[0]
+        if list_id:
+            return 'YoutubeTab', list_id
+    for pattern in _YOUTUBE_PATTERNS:
+        m = pattern.match(url)
+        if m:
+            return 'Youtube', m.group('id')
+    if _YOUTUBE_WATCH.match(url):
+        video_id = _query(url).get('v', [''])[0]
+        if _YOUTUBE_ID.match(video_id):
+            return 'Youtube', video_id
+    m = _BILIBILI_VIDEO.match(url)
+    if m:
+        video_id = m.group('id')
+        video_id = 'BV' + video_id[2:] if video_id[:2].lower() == 'bv' else video_id.lower()
+        part = _query(url).get('p', ['1'])[0]
+        # 与 yt-dlp 一致：多 P 视频的分 P 编号附加在 id 后面
+        if part.isdigit() and int(part) > 1:
+            video_id = f'{video_id}_p{part}'
+        return 'BiliBili', video_id
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _match_with_extractors(url: str) -> Optional[Tuple[str, str]]:
+    """用 yt-dlp 的提取器正则识别 URL（首次调用会加载提取器列表，较慢）"""
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+    except ImportError:
+        return None
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic':
+            continue
+        try:
+            if not ie.suitable(url):
+                continue
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            continue
+        if video_id:
+            return ie.ie_key(), str(video_id)
+        return None
+    return None
+
+
+@lru_cache(maxsize=16384)
+def canonical_key(url: str, playlist: bool = False, offline_only: bool = False) -> str:
+    """
+    把 URL 解析为去重用的规范键 "extractor_key:id"。
+
+    youtu.be/X、youtube.com/watch?v=X&t=30 以及带播放列表参数的链接都会得到同一个键。
+    先走常用站点的离线正则，再用 yt-dlp 的提取器匹配，都失败时退回规范化后的 URL。
+
+    Args:
+        url: 视频地址。
+        playlist: 是否按播放列表下载；为 True 时带 list 参数的链接解析为播放列表键。
+        offline_only: 只使用离线正则，不加载 yt-dlp（用于批量处理旧历史记录）。
+    """
+    match = match_known_site(url, playlist)
+    if match is None and not offline_only:
+        match = _match_with_extractors(url.strip())
+    if match is None:
+        return f'url:{normalize_url(url)}'
+    return f'{match[0]}:{match[1]}'
+
+
+# 这些提取器的 id 取自 URL 中的文件名（如 .../index.m3u8 -> index），不同视频之间会重复，不能用于去重
+UNSTABLE_ID_EXTRACTORS = frozenset({'Generic'})
+
+
+def resolved_key(extractor_key: Optional[str], video_id, url: str) -> str:
+    """yt-dlp 解析后得到的规范键；id 不可靠时退回按 URL 的键，与 canonical_key 对未知站点的结果一致"""
+    if not extractor_key or video_id is None or extractor_key in UNSTABLE_ID_EXTRACTORS:
+        return f'url:{normalize_url(url)}'
+    return f'{extractor_key}:{video_id}'
+
+
+@lru_cache(maxsize=4096)
+def site_of(url: str) -> str:
+    """返回 URL 所属站点，用于按站点限制并发（如 'youtube'、'bilibili'，其他站点为主机名）"""
+    url = url.strip()
+    try:
+        host = urlsplit(url if '://' in url else f'https://{url}').netloc.lower()
+    except ValueError:
+        return ''
+    host = host.rsplit('@', 1)[-1].split(':', 1)[0]
+    if host == 'youtu.be' or host.endswith('youtube.com') or host.endswith('youtube-nocookie.com'):
+        return 'youtube'
+    if host == 'b23.tv' or host.endswith('bilibili.com'):
+        return 'bilibili'
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
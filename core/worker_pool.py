@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from .process_worker import ProcessDownloader
+
+EXECUTOR_MODES = ('thread', 'process')
+
+class WorkerPool:
+    """
+    下载工作线程池。
+
+    yt-dlp 的下载调用是阻塞的，不能在调度所在的事件循环（core.event_loop.CoreLoop）中执行。
+    线程池最多同时运行 max_workers 个任务，与 QueueManager 的并发上限保持一致。
+    mode 为 'process' 时 yt-dlp 在 process_downloader 的子进程中运行，工作线程只负责转发回调。
+    """
+
+    def __init__(self, max_workers: int = 3, mode: str = 'thread'):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"未知的执行方式: {mode}")
+        self.max_workers = max_workers
+        self.mode = mode
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='download-worker')
+        self.process_downloader = ProcessDownloader(max_workers) if mode == 'process' else None
+        self._stopping = threading.Event()
+
+    def run(self, loop, fn: Callable, *args):
+        """在事件循环中调用：把 fn 交给工作线程，返回可以 await 的 Future；已关闭时返回 None"""
+        if self._stopping.is_set():
+            return None
+        return loop.run_in_executor(self._executor, fn, *args)
+
+    def is_stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def shutdown(self, wait: bool = False):
+        """停止接收新任务，并取消尚未开始的任务"""
+        self._stopping.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        if self.process_downloader is not None:
+            self.process_downloader.shutdown()
@@ -0,0 +1,137 @@
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# 每个任务各自设置的参数，不参与实例分组；其余参数相同的任务共用同一组 YoutubeDL 实例
+TASK_VALUES = ('paths', 'logger', 'concurrent_fragment_downloads', 'ratelimit')
+TASK_PARAMS = TASK_VALUES + ('progress_hooks', 'postprocessor_hooks')
+
+class _PooledInstance:
+    """池中的一个 YoutubeDL 实例；回调通过固定的分发函数转给当前使用它的任务"""
+
+    def __init__(self, ydl_class, params: Dict):
+        self.progress_hooks: List[Callable] = []
+        self.postprocessor_hooks: List[Callable] = []
+        self.uses = 0
+        params = dict(params, progress_hooks=[self._on_progress], postprocessor_hooks=[self._on_postprocess])
+        self.ydl = ydl_class(params)
+
+    def _on_progress(self, d):
+        for hook in self.progress_hooks:
+            hook(d)
+
+    def _on_postprocess(self, d):
+        for hook in self.postprocessor_hooks:
+            hook(d)
+
+    def close(self):
+        close = getattr(self.ydl, 'close', None)
+        try:
+            if close is not None:
+                close()  # 保存 cookies、关闭 HTTP 连接
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {e}")
+
+
+class YoutubeDLPool:
+    """
+    按参数分组复用 YoutubeDL 实例。
+
+    新建 YoutubeDL 要初始化提取器、cookies 和 HTTP 会话，YouTube 等站点还要重新下载播放器脚本、
+    解析签名算法；复用实例可以让同一批任务共享这些状态。每个实例同一时间只借给一个任务，
+    任务的回调在借出时挂上、归还时摘下；出错的实例不再放回，使用 max_uses 次后也会重建。
+    签名算法等还会写入 yt-dlp 的磁盘缓存（cachedir，None 表示使用 yt-dlp 的默认目录），跨进程保留。
+    """
+
+    def __init__(self, max_idle: int = 8, max_uses: int = 200, cachedir: Optional[str] = None):
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.cachedir = cachedir
+        self._idle: "OrderedDict[str, List[_PooledInstance]]" = OrderedDict()  # 参数分组 -> 空闲实例
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def profile_key(params: Dict) -> str:
+        profile = {k: v for k, v in params.items() if k not in TASK_PARAMS}
+        return json.dumps(profile, sort_keys=True, ensure_ascii=False, default=repr)
+
+    @contextmanager
+    def acquire(self, params: Dict):
+        """借出一个按 params 配置好的 YoutubeDL；with 块内抛出异常时丢弃该实例"""
+        key = self.profile_key(params)
+        instance = self._checkout(key, params)
+        ydl_params = instance.ydl.params
+        for name in TASK_VALUES:
+            if params.get(name) is not None:
+                ydl_params[name] = params[name]
+            else:
+                ydl_params.pop(name, None)
+        instance.progress_hooks = list(params.get('progress_hooks') or [])
+        instance.postprocessor_hooks = list(params.get('postprocessor_hooks') or [])
+        healthy = False
+        try:
+            yield instance.ydl
+            healthy = True
+        finally:
+            instance.progress_hooks = []
+            instance.postprocessor_hooks = []
+            ydl_params.pop('logger', None)  # 不再引用已结束的任务
+            self._checkin(key, instance, healthy)
+
+    def _checkout(self, key: str, params: Dict) -> _PooledInstance:
+        with self._lock:
+            instances = self._idle.get(key)
+            if instances:
+                instance = instances.pop()
+                if not instances:
+                    del self._idle[key]
+                self._idle_count -= 1
+                self.reused += 1
+                instance.uses += 1
+                return instance
+            self.created += 1
+        import yt_dlp
+        params = {k: v for k, v in params.items() if k not in TASK_PARAMS}
+        if self.cachedir:
+            params['cachedir'] = self.cachedir
+        instance = _PooledInstance(yt_dlp.YoutubeDL, params)
+        instance.uses = 1
+        return instance
+
+    def _checkin(self, key: str, instance: _PooledInstance, healthy: bool):
+        evicted = []
+        with self._lock:
+            if not healthy or self._closed or instance.uses >= self.max_uses:
+                evicted.append(instance)
+            else:
+                self._idle.setdefault(key, []).append(instance)
+                self._idle.move_to_end(key)
+                self._idle_count += 1
+                # 超出空闲上限时关闭最久未使用的参数分组中的实例
+                while self._idle_count > self.max_idle:
+                    oldest_key, instances = next(iter(self._idle.items()))
+                    evicted.append(instances.pop(0))
+                    self._idle_count -= 1
+                    if not instances:
+                        del self._idle[oldest_key]
+        for item in evicted:
+            item.close()
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return self._idle_count
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            instances = [instance for group in self._idle.values() for instance in group]
+            self._idle.clear()
+            self._idle_count = 0
+        for instance in instances:
+            instance.close()
@@ -1,29 +1,73 @@
+import multiprocessing
 import sys
-from PySide6.QtWidgets import QApplication, QMessageBox
-from ui.main_window import MainWindow
 import shutil
 import os  # 导入 os 模块
 
-def check_ffmpeg():
-    if not shutil.which('ffmpeg'):
-        # 检查根目录下是否存在 ffmpeg 程序
-        ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg.exe')  # 假设 ffmpeg 程序名为 ffmpeg.exe
-        if os.path.exists(ffmpeg_path):
-            os.environ['PATH'] += os.pathsep + os.getcwd()  # 将根目录添加到 PATH 环境变量
-        else:
-            QMessageBox.warning(
-                None,
-                "缺少依赖",
-                "未检测到FFmpeg。为了确保视频和音频能正确合并，请先安装FFmpeg。\n"
-                "Windows用户可以从 https://www.gyan.dev/ffmpeg/builds/ 下载安装。"
-            )
+def find_ffmpeg() -> bool:
+    if shutil.which('ffmpeg'):
+        return True
+    # 检查根目录下是否存在 ffmpeg 程序
+    ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg.exe')  # 假设 ffmpeg 程序名为 ffmpeg.exe
+    if os.path.exists(ffmpeg_path):
+        os.environ['PATH'] += os.pathsep + os.getcwd()  # 将根目录添加到 PATH 环境变量
+        return True
+    return False
+
+def check_ffmpeg(parent=None):
+    if not find_ffmpeg():
+        from PySide6.QtWidgets import QMessageBox
+        QMessageBox.warning(
+            parent,
+            "缺少依赖",
+            "未检测到FFmpeg。为了确保视频和音频能正确合并，请先安装FFmpeg。\n"
+            "Windows用户可以从 https://www.gyan.dev/ffmpeg/builds/ 下载安装。"
+        )
+
+def main_headless(argv):
+    # 无界面模式不导入 PySide6
+    from core.headless import run_headless
+    if not find_ffmpeg():
+        print("警告: 未检测到FFmpeg，视频和音频可能无法合并。", file=sys.stderr)
+    return run_headless(argv)
 
 def main():
+    if '--headless' in sys.argv[1:]:
+        argv = [arg for arg in sys.argv[1:] if arg != '--headless']
+        sys.exit(main_headless(argv))
+
+    # 本机控制接口：python main.py --api-port 8765（或环境变量 STREAMDOWNER_API_PORT），
+    # 访问令牌通过环境变量 STREAMDOWNER_API_TOKEN 设置
+    api_port = os.environ.get('STREAMDOWNER_API_PORT')
+    if '--api-port' in sys.argv[1:-1]:
+        api_port = sys.argv[sys.argv.index('--api-port') + 1]
+
+    # 启动耗时报告：python main.py --startup-report（或设置环境变量 STREAMDOWNER_STARTUP_REPORT=1）
+    from core.startup import StartupTimer
+    timer = StartupTimer(enabled='--startup-report' in sys.argv[1:]
+                         or bool(os.environ.get('STREAMDOWNER_STARTUP_REPORT')))
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    timer.mark('导入 PySide6')
+    from ui.main_window import MainWindow
+    timer.mark('导入界面模块')
     app = QApplication(sys.argv)
-    check_ffmpeg()  # 添加FFmpeg检查
-    window = MainWindow()
+    timer.mark('创建 QApplication')
+    window = MainWindow(timer)
+    timer.mark('创建主窗口')
     window.show()
+
+    def after_first_paint():
+        # 窗口已经显示，再做恢复任务、读取历史、检查 FFmpeg 等较慢的初始化
+        timer.mark('首次绘制')
+        window.finish_startup()
+        if api_port:
+            window.start_control_api(int(api_port), os.environ.get('STREAMDOWNER_API_TOKEN'))
+        check_ffmpeg(window)  # 添加FFmpeg检查
+
+    QTimer.singleShot(0, after_first_paint)
     sys.exit(app.exec())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # --executor process 的子进程以 spawn 方式启动；打包后的程序需要先处理子进程的启动参数，否则会再次打开界面
+    multiprocessing.freeze_support()
+    main()
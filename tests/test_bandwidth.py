@@ -0,0 +1,43 @@
+import unittest
+
+from core.bandwidth import BandwidthManager
+
+MB = 1024 * 1024
+
+
+class BandwidthFragmentTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = BandwidthManager(global_limit=8 * MB, interval=3600)
+
+    def tearDown(self):
+        self.manager.stop()
+
+    def test_fragmented_share_is_split_between_connections(self):
+        params = {}
+        self.manager.register(1, params, connections=4)
+        self.assertEqual(self.manager.rate_of(1), 8 * MB)
+        # 每个分片连接各自限速，合计不超过任务的份额
+        self.assertEqual(params['ratelimit'] * 4, 8 * MB)
+
+    def test_global_limit_holds_with_mixed_tasks(self):
+        fragmented, progressive = {}, {}
+        self.manager.register(1, fragmented, connections=4)
+        self.manager.register(2, progressive)
+        total = fragmented['ratelimit'] * 4 + progressive['ratelimit']
+        self.assertAlmostEqual(total, 8 * MB)
+
+    def test_set_connections(self):
+        params = {}
+        self.manager.register(1, params, connections=4)
+        self.manager.set_connections(1, 1)  # 实际是普通下载
+        self.assertEqual(params['ratelimit'], 8 * MB)
+
+    def test_no_limit(self):
+        params = {}
+        self.manager.global_limit = None
+        self.manager.register(1, params, connections=4)
+        self.assertIsNone(params['ratelimit'])
+
+
+if __name__ == '__main__':
+    unittest.main()
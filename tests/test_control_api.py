@@ -0,0 +1,67 @@
+import http.client
+import os
+import tempfile
+import types
+import unittest
+
+from core.control_api import ApiError, ControlApi, serve_control_api
+
+
+class SavePathTest(unittest.TestCase):
+    """提交时的 save_path 只能在下载目录之内"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.api = ControlApi.__new__(ControlApi)
+        self.api.save_path = self.tmp.name
+
+    def test_default_and_subdirectory(self):
+        root = os.path.realpath(self.tmp.name)
+        self.assertEqual(self.api._resolve_save_path(None), self.tmp.name)
+        self.assertEqual(self.api._resolve_save_path('music'), os.path.join(root, 'music'))
+        self.assertEqual(self.api._resolve_save_path(os.path.join(root, 'a', 'b')), os.path.join(root, 'a', 'b'))
+
+    def test_outside_is_rejected(self):
+        for path in ('..', '/etc', os.path.join(self.tmp.name, '..', 'other'), self.tmp.name + '-other'):
+            with self.assertRaises(ApiError) as cm:
+                self.api._resolve_save_path(path)
+            self.assertEqual(cm.exception.status, 403)
+
+
+class RequestCheckTest(unittest.TestCase):
+    """Host 头（防 DNS 重绑定）和访问令牌"""
+
+    def setUp(self):
+        api = types.SimpleNamespace(status=lambda: {'idle': True})
+        self.server = serve_control_api(api, 0, token='secret')
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def _get(self, path, host=None, headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        try:
+            conn.putrequest('GET', path, skip_host=True)
+            conn.putheader('Host', host or f'127.0.0.1:{self.port}')
+            for name, value in (headers or {}).items():
+                conn.putheader(name, value)
+            conn.endheaders()
+            return conn.getresponse().status
+        finally:
+            conn.close()
+
+    def test_token(self):
+        self.assertEqual(self._get('/api/status'), 401)
+        self.assertEqual(self._get('/api/status', headers={'Authorization': 'Bearer wrong'}), 401)
+        self.assertEqual(self._get('/api/status', headers={'Authorization': 'Bearer secret'}), 200)
+        self.assertEqual(self._get('/api/status?token=secret'), 200)
+
+    def test_host(self):
+        self.assertEqual(self._get('/api/status?token=secret', host=f'localhost:{self.port}'), 200)
+        self.assertEqual(self._get('/api/status?token=secret', host=f'evil.example:{self.port}'), 403)
+        self.assertEqual(self._get('/api/status?token=secret', host='127.0.0.1'), 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
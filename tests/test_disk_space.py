@@ -0,0 +1,54 @@
+import collections
+import tempfile
+import types
+import unittest
+
+from core.disk_space import DiskSpaceGuard
+
+MB = 1024 * 1024
+Usage = collections.namedtuple('Usage', 'total used free')
+
+
+class DiskSpaceGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.calls = 0
+        self.free = 100 * MB
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _usage(self, path):
+        self.calls += 1
+        return Usage(0, 0, self.free)
+
+    def _task(self, task_id):
+        return types.SimpleNamespace(task_id=task_id, save_path=self.tmp.name)
+
+    def test_reservations_are_subtracted_from_cached_usage(self):
+        guard = DiskSpaceGuard(min_free=10 * MB, usage=self._usage)
+        self.assertIsNone(guard.admit(self._task(1), 50 * MB, postprocess=False))
+        shortage = guard.admit(self._task(2), 50 * MB, postprocess=False)
+        self.assertIsNotNone(shortage)
+        self.assertEqual(shortage.available, 50 * MB)
+        self.assertIsNone(guard.admit(self._task(3), 30 * MB, postprocess=False))
+        self.assertEqual(self.calls, 1)  # 同一轮调度只查询一次剩余空间
+
+    def test_release_returns_space(self):
+        guard = DiskSpaceGuard(min_free=10 * MB, usage=self._usage)
+        guard.admit(self._task(1), 80 * MB, postprocess=False)
+        self.assertIsNotNone(guard.admit(self._task(2), 20 * MB, postprocess=False))
+        guard.release(1)
+        self.assertIsNone(guard.admit(self._task(2), 20 * MB, postprocess=False))
+
+    def test_written_bytes_reduce_reservation(self):
+        written = {1: 0}
+        guard = DiskSpaceGuard(min_free=0, usage=self._usage, written=lambda task: written[task.task_id])
+        guard.admit(self._task(1), 60 * MB, postprocess=False)
+        self.assertEqual(guard.reserved(), 60 * MB)
+        written[1] = 20 * MB
+        self.assertEqual(guard.reserved(), 40 * MB)
+
+
+if __name__ == '__main__':
+    unittest.main()
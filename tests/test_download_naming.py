@@ -0,0 +1,129 @@
+import os
+import sys
+import tempfile
+import threading
+import types
+import unittest
+from unittest import mock
+
+from core.download_manager import DownloadManager
+from core.info_cache import InfoCache
+from core.postprocess import STREAM_OUTTMPL
+from core.queue_manager import DownloadTask
+
+OPTIONS = {'download_type': '视频', 'quality': '最佳质量', 'format': 'mp4',
+           'subtitle_enabled': False, 'include_audio': True}
+DEFAULT_OUTTMPL = '%(title)s [%(id)s].%(ext)s'
+
+
+def _fake_yt_dlp(prefetch_ok: bool):
+    """只提供一个渐进式（音视频合一）格式的假 yt-dlp：按 outtmpl 写文件并调用进度回调"""
+
+    class DownloadCancelled(Exception):
+        pass
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def _info(self, url):
+            name = url.rsplit('/', 1)[-1]
+            return {'id': name, 'title': name, 'ext': 'mp4', 'format_id': '18', 'vcodec': 'avc1',
+                    'acodec': 'mp4a.40.2', 'webpage_url': url, 'extractor_key': 'Fake', 'filesize': 4}
+
+        def prepare_filename(self, info):
+            outtmpl = (self.params.get('outtmpl') or {}).get('default', DEFAULT_OUTTMPL)
+            return os.path.join(self.params['paths']['home'], outtmpl % info)
+
+        def extract_info(self, url, download=True, **kwargs):
+            if not prefetch_ok:
+                raise RuntimeError('预解析失败')
+            return self._info(url)
+
+        def sanitize_info(self, info):
+            return info
+
+        def process_ie_result(self, info, download=True):
+            return info
+
+        def download(self, urls):
+            info = self._info(urls[0])
+            filename = self.prepare_filename(info)
+            with open(filename, 'wb') as f:
+                f.write(b'data')
+            for hook in self.params.get('progress_hooks') or []:
+                hook({'status': 'downloading', 'filename': filename, 'downloaded_bytes': 2, 'total_bytes': 4})
+                hook({'status': 'finished', 'filename': filename, 'total_bytes': 4, 'info_dict': info})
+
+        def download_with_info_file(self, path):
+            import json
+            with open(path, 'r', encoding='utf-8') as f:
+                self.download([json.load(f)['webpage_url']])
+
+    return types.SimpleNamespace(YoutubeDL=YoutubeDL,
+                                 utils=types.SimpleNamespace(DownloadCancelled=DownloadCancelled))
+
+
+class SingleStreamNamingTest(unittest.TestCase):
+    """单个（渐进式）格式不需要合并，最终文件名不能带 .f<格式 id>"""
+
+    def _download(self, prefetch_ok: bool, ffmpeg: bool = True):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(sys.modules, {'yt_dlp': _fake_yt_dlp(prefetch_ok)}), \
+                mock.patch.object(DownloadManager, '_ffmpeg_available', return_value=ffmpeg):
+            manager = DownloadManager(info_cache=InfoCache(os.path.join(tmp, 'cache')), min_free_space=0)
+            done = threading.Event()
+            manager.download_completed.connect(lambda task_id: done.set())
+            manager.download_error.connect(lambda task_id, error: done.set())
+            try:
+                task_id = manager.add_download('https://fake.example/v/alpha', tmp, dict(OPTIONS))
+                self.assertTrue(done.wait(10))
+                result = manager.task_result(task_id)
+                files = sorted(name for name in os.listdir(tmp) if name != 'cache')
+            finally:
+                manager.shutdown()
+        return result, files
+
+    def _check(self, prefetch_ok: bool, ffmpeg: bool = True):
+        result, files = self._download(prefetch_ok, ffmpeg)
+        self.assertIsNotNone(result)
+        self.assertEqual(files, ['alpha [alpha].mp4'])
+        self.assertEqual(result.filename, 'alpha [alpha].mp4')
+        self.assertEqual([os.path.basename(f['path']) for f in result.files], ['alpha [alpha].mp4'])
+
+    def test_without_metadata(self):
+        self._check(prefetch_ok=False)
+
+    def test_with_metadata(self):
+        self._check(prefetch_ok=True)
+
+    def test_without_ffmpeg(self):
+        self._check(prefetch_ok=False, ffmpeg=False)
+
+
+class StreamSplittingTest(unittest.TestCase):
+    """只有检测到 FFmpeg 时才分开下载视频流和音频流（否则无法合并）"""
+
+    def _opts(self, ffmpeg: bool):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(sys.modules, {'yt_dlp': _fake_yt_dlp(True)}), \
+                mock.patch.object(DownloadManager, '_ffmpeg_available', return_value=ffmpeg):
+            manager = DownloadManager(info_cache=InfoCache(os.path.join(tmp, 'cache')), min_free_space=0)
+            try:
+                return manager.create_ydl_opts(DownloadTask('https://fake.example/v/beta', tmp, dict(OPTIONS)))
+            finally:
+                manager.shutdown()
+
+    def test_split_with_ffmpeg(self):
+        opts = self._opts(ffmpeg=True)
+        self.assertEqual(opts['format'], '(bestvideo,bestaudio)/best')
+        self.assertEqual(opts['outtmpl'], {'default': STREAM_OUTTMPL})
+
+    def test_merged_format_without_ffmpeg(self):
+        opts = self._opts(ffmpeg=False)
+        self.assertEqual(opts['format'], 'bestvideo+bestaudio/best')
+        self.assertNotIn('outtmpl', opts)
+
+
+if __name__ == '__main__':
+    unittest.main()
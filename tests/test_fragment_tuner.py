@@ -0,0 +1,36 @@
+import unittest
+
+from core.fragment_tuner import FragmentTuner
+
+
+class FragmentTunerBudgetTest(unittest.TestCase):
+    def test_total_within_budget(self):
+        tuner = FragmentTuner(max_total=8, max_per_task=8, initial=4)
+        self.assertEqual(tuner.acquire(1, 'a', active_tasks=2), 4)
+        self.assertEqual(tuner.acquire(2, 'b', active_tasks=2), 4)
+        self.assertEqual(tuner.total_allocated(), 8)
+
+    def test_requested_is_capped_by_remaining_budget(self):
+        tuner = FragmentTuner(max_total=8)
+        tuner.acquire(1, 'a', requested=6)
+        self.assertEqual(tuner.acquire(2, 'b', requested=6), 2)
+
+    def test_exhausted_budget_is_soft(self):
+        # 名额用完时仍给 1 个连接（不并发下载分片），超出部分等于这类任务的个数
+        tuner = FragmentTuner(max_total=8)
+        tuner.acquire(1, 'a', requested=8)
+        self.assertEqual(tuner.acquire(2, 'b', requested=4), 1)
+        self.assertEqual(tuner.acquire(3, 'c'), 1)
+        self.assertEqual(tuner.total_allocated(), 8 + 2)
+
+    def test_release_returns_budget(self):
+        tuner = FragmentTuner(max_total=8)
+        tuner.acquire(1, 'a', requested=8)
+        tuner.acquire(2, 'b', requested=4)
+        tuner.release(1, 'a', tuned=False)
+        self.assertEqual(tuner.acquire(3, 'c', requested=4), 4)
+        self.assertEqual(tuner.total_allocated(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
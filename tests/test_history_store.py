@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from core.history_store import JsonHistoryStore, JsonlHistoryStore
+
+
+class HistoryStoreIdTest(unittest.TestCase):
+    """删除末尾的记录后新记录不能重复使用旧 id（HistoryIndex 按 id 索引）"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _check_ids_not_reused(self, store):
+        first, second = store.append_many([{'url': 'https://a'}, {'url': 'https://b'}])
+        store.remove([second['id']])
+        third, = store.append_many([{'url': 'https://c'}])
+        self.assertNotIn(third['id'], (first['id'], second['id']))
+        urls = [entry['url'] for entry in store.load()]
+        self.assertIn('https://c', urls)
+        self.assertNotIn('https://b', urls)
+        ids = [entry['id'] for entry in store.load()]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_json_store(self):
+        self._check_ids_not_reused(JsonHistoryStore(os.path.join(self.tmp.name, 'history.json')))
+
+    def test_json_store_after_reload(self):
+        path = os.path.join(self.tmp.name, 'history.json')
+        JsonHistoryStore(path).append_many([{'url': 'https://old'}])
+        self._check_ids_not_reused(JsonHistoryStore(path))
+
+    def test_jsonl_store(self):
+        self._check_ids_not_reused(JsonlHistoryStore(os.path.join(self.tmp.name, 'history.jsonl')))
+
+
+class JsonlCompactionTest(unittest.TestCase):
+    """重复删除或删除不存在的 id 不能让有效记录数变少（否则会过早压缩）"""
+
+    def test_remove_counts_only_live_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JsonlHistoryStore(os.path.join(tmp, 'history.jsonl'))
+            entries = store.append_many([{'url': f'https://v/{i}'} for i in range(3)])
+            store.remove([entries[0]['id'], entries[0]['id'], 999])
+            store.remove([entries[0]['id']])
+            self.assertEqual(store._live, 2)
+            self.assertEqual(store._dead, 2)
+            self.assertEqual(len(store.load()), 2)
+            self.assertEqual(store._live, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from core.job_journal import JobJournal
+from core.queue_manager import TaskState
+
+
+class JobJournalFilesTest(unittest.TestCase):
+    """进入后处理时记录实际的文件名（分开下载的流带格式 id），恢复时原样取回"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'queue.db')
+
+    def test_files_round_trip(self):
+        journal = JobJournal(self.path)
+        job_id = journal.add('https://fake.example/v/alpha', self.tmp.name, {'download_type': '视频'})
+        files = [{'filename': os.path.join(self.tmp.name, 'alpha [alpha].f137.mp4'), 'format_id': '137'},
+                 {'filename': os.path.join(self.tmp.name, 'alpha [alpha].f140.m4a'), 'format_id': '140'}]
+        journal.record_files(job_id, files)
+        journal.set_state(job_id, TaskState.POSTPROCESSING)
+        journal.close()
+        job, = JobJournal(self.path).load_unfinished()
+        self.assertEqual(job['state'], TaskState.POSTPROCESSING)
+        self.assertEqual(job['files'], files)
+
+    def test_old_schema_is_migrated(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE jobs (job_id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, '
+                     'save_path TEXT NOT NULL, options TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, '
+                     'state TEXT NOT NULL, filename TEXT, downloaded_bytes INTEGER NOT NULL DEFAULT 0, '
+                     'total_bytes INTEGER, error TEXT, updated_at REAL NOT NULL)')
+        conn.execute("INSERT INTO jobs (url, save_path, options, state, updated_at) "
+                     "VALUES ('https://fake.example/v/beta', '/tmp', '{}', 'queued', 0)")
+        conn.commit()
+        conn.close()
+        journal = JobJournal(self.path)
+        job, = journal.load_unfinished()
+        self.assertEqual(job['files'], [])
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from core.metrics import MetricsCollector
+from core.queue_manager import DownloadTask, TaskState
+
+
+class AttemptsTest(unittest.TestCase):
+    """完成、失败和取消的任务按同样的方式统计尝试次数"""
+
+    def setUp(self):
+        self.metrics = MetricsCollector()
+        self.task = DownloadTask('https://fake.example/v/alpha', '/tmp', {})
+        self.metrics.task_added(self.task)
+
+    def _finish(self, state):
+        self.metrics.task_finished(self.task, state)
+        return self.metrics.task_stats(self.task.task_id)['attempts']
+
+    def _fail_and_requeue(self):
+        self.metrics.task_started(self.task)
+        self.task.attempts += 1
+        self.metrics.task_requeued(self.task, retry=True)
+
+    def test_done(self):
+        self._fail_and_requeue()
+        self.metrics.task_started(self.task)
+        self.assertEqual(self._finish(TaskState.DONE), 2)
+
+    def test_failed(self):
+        self.metrics.task_started(self.task)
+        self.task.attempts += 1
+        self.assertEqual(self._finish(TaskState.FAILED), 1)
+
+    def test_cancelled_while_downloading(self):
+        self.metrics.task_started(self.task)
+        self.assertEqual(self._finish(TaskState.CANCELLED), 1)
+
+    def test_cancelled_while_failing(self):
+        self.metrics.task_started(self.task)
+        self.task.attempts += 1
+        self.assertEqual(self._finish(TaskState.CANCELLED), 1)
+
+    def test_cancelled_while_waiting_for_retry(self):
+        self._fail_and_requeue()
+        self.assertEqual(self._finish(TaskState.CANCELLED), 1)
+
+    def test_cancelled_before_start(self):
+        self.assertEqual(self._finish(TaskState.CANCELLED), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys
+import types
+import unittest
+from unittest import mock
+
+from core.playlist_expander import expand_playlist
+
+PLAYLIST = {
+    '_type': 'playlist', 'title': '合集',
+    'entries': [{'_type': 'url', 'url': 'https://example.com/v/1', 'title': '第一集'},
+                {'_type': 'url', 'url': 'https://example.com/v/2', 'title': '第二集'}],
+}
+
+
+def _fake_yt_dlp(results):
+    calls = []
+
+    class YoutubeDL:
+        def __init__(self, params):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=True, ie_key=None, process=True):
+            calls.append(url)
+            return results[url]
+
+    return types.SimpleNamespace(YoutubeDL=YoutubeDL), calls
+
+
+class ExpandPlaylistTest(unittest.TestCase):
+    def _expand(self, url, results):
+        module, calls = _fake_yt_dlp(results)
+        with mock.patch.dict(sys.modules, {'yt_dlp': module}):
+            return expand_playlist(url), calls
+
+    def test_follows_url_result(self):
+        (title, entries), calls = self._expand('https://short.example/abc', {
+            'https://short.example/abc': {'_type': 'url', 'url': 'https://example.com/list/9'},
+            'https://example.com/list/9': PLAYLIST,
+        })
+        self.assertEqual(calls, ['https://short.example/abc', 'https://example.com/list/9'])
+        self.assertEqual(title, '合集')
+        self.assertEqual([entry.url for entry in entries], ['https://example.com/v/1', 'https://example.com/v/2'])
+
+    def test_url_transparent_keeps_outer_title(self):
+        (title, entries), _ = self._expand('https://example.com/embed/9', {
+            'https://example.com/embed/9': {'_type': 'url_transparent', 'url': 'https://example.com/list/9',
+                                            'title': '外层标题'},
+            'https://example.com/list/9': PLAYLIST,
+        })
+        self.assertEqual(title, '外层标题')
+        self.assertEqual(len(entries), 2)
+
+    def test_redirect_loop_stops(self):
+        (_, entries), calls = self._expand('https://a.example/x', {
+            'https://a.example/x': {'_type': 'url', 'url': 'https://a.example/x'},
+        })
+        self.assertEqual(len(entries), 1)
+        self.assertLessEqual(len(calls), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from core.queue_manager import DownloadTask, QueueManager, TaskState
+from core.retry_policy import ErrorKind, RetryPolicy, classify_error
+
+
+class _HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP Error {status}')
+        self.status = status
+
+
+class ClassifyErrorTest(unittest.TestCase):
+    def test_forbidden_is_retried_after_re_extract(self):
+        self.assertEqual(classify_error(_HttpError(403)), ErrorKind.EXPIRED)
+        self.assertEqual(classify_error(Exception('ERROR: unable to download video data: HTTP Error 403: Forbidden')),
+                         ErrorKind.EXPIRED)
+
+    def test_not_found_is_permanent(self):
+        self.assertEqual(classify_error(_HttpError(404)), ErrorKind.PERMANENT)
+
+    def test_expired_retries_once(self):
+        policy = RetryPolicy(jitter=0.0)
+        self.assertIsNotNone(policy.next_delay('youtube', ErrorKind.EXPIRED, 1))
+        self.assertIsNone(policy.next_delay('youtube', ErrorKind.EXPIRED, 2))
+
+
+class RetryCancelledTest(unittest.TestCase):
+    """失败的同时被取消的任务不能重新排队"""
+
+    def test_retry_after_cancel(self):
+        queue = QueueManager()
+        task = DownloadTask('https://fake.example/v/alpha', '/tmp', {}, key='Fake:alpha')
+        queue.add_task(task)
+        self.assertIs(queue.get_next_task(), task)
+        task.cancel_requested = True
+        self.assertFalse(queue.retry(task.task_id, 0.0))
+        self.assertEqual(task.state, TaskState.CANCELLED)
+        self.assertFalse(queue.is_pending('Fake:alpha'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import video_id
+from core.download_manager import DownloadManager
+from core.history_manager import HistoryManager
+from core.metadata_prefetcher import summarize_info
+from core.queue_manager import DownloadTask, QueueManager
+from core.url_ingest import prepare_batch
+from core.video_id import canonical_key
+
+
+class _FakeYdl:
+    def prepare_filename(self, info):
+        return os.path.join('/nonexistent', f"{info['title']} [{info['id']}].{info.get('ext', 'mp4')}")
+
+
+def _info(url, extractor_key, video_id):
+    return {'webpage_url': url, 'extractor_key': extractor_key, 'id': video_id, 'title': video_id}
+
+
+class ResolvedKeyTest(unittest.TestCase):
+    def test_generic_ids_are_not_shared_between_urls(self):
+        # 两个不同的 HLS 地址都被 Generic 解析为 id 'index'
+        first = summarize_info(_FakeYdl(), _info('https://a.example.com/live/index.m3u8', 'Generic', 'index'))
+        second = summarize_info(_FakeYdl(), _info('https://b.example.com/vod/index.m3u8', 'Generic', 'index'))
+        self.assertNotEqual(first.video_key, second.video_key)
+        self.assertNotIn('Generic:', first.video_key)
+
+    def test_generic_key_matches_url_key(self):
+        url = 'https://a.example.com/live/index.m3u8'
+        metadata = summarize_info(_FakeYdl(), _info(url, 'Generic', 'index'))
+        self.assertEqual(metadata.video_key, canonical_key(url, offline_only=True))
+
+    def test_stable_extractor_key(self):
+        metadata = summarize_info(_FakeYdl(), _info('https://youtu.be/dQw4w9WgXcQ', 'Youtube', 'dQw4w9WgXcQ'))
+        self.assertEqual(metadata.video_key, 'Youtube:dQw4w9WgXcQ')
+
+    def test_distinct_generic_urls_can_both_be_aliased(self):
+        queue = QueueManager()
+        urls = ['https://a.example.com/live/index.m3u8', 'https://b.example.com/vod/index.m3u8']
+        tasks = [DownloadTask(url, '/tmp', {}, key=canonical_key(url, offline_only=True)) for url in urls]
+        for task in tasks:
+            self.assertTrue(queue.add_task(task))
+        for task in tasks:
+            metadata = summarize_info(_FakeYdl(), _info(task.url, 'Generic', 'index'))
+            self.assertTrue(queue.add_alias(task.task_id, metadata.video_key))
+
+
+class GuiThreadKeyTest(unittest.TestCase):
+    """界面线程调用的去重路径只用离线规则，不能加载 yt-dlp 的提取器列表（首次加载要数秒）"""
+
+    def setUp(self):
+        patcher = mock.patch.object(video_id, '_match_with_extractors',
+                                    side_effect=AssertionError('界面线程加载了 yt-dlp 提取器'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # 不在离线正则中的站点，确保不会命中 canonical_key 的缓存
+        self.urls = ['https://gui-thread.example.org/watch/1', 'https://gui-thread.example.org/watch/2']
+
+    def test_task_key(self):
+        for url in self.urls:
+            self.assertTrue(DownloadManager.task_key(url, {'download_type': '视频'}).startswith('url:'))
+            self.assertTrue(DownloadManager.task_key(url, {'download_type': '播放列表'}).startswith('playlist:'))
+
+    def test_history_checks(self):
+        history = HistoryManager(os.path.join(self.tmp.name, 'history.jsonl'))
+        batch = prepare_batch(self.urls + self.urls[:1], history, offline_only=True)
+        self.assertEqual((batch.new, batch.repeated), (self.urls, 1))
+        self.assertEqual(history.find_by_url(self.urls[0], offline_only=True), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
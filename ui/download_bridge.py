@@ -0,0 +1,32 @@
+from PySide6.QtCore import QObject, Signal
+
+class DownloadBridge(QObject):
+    """
+    把 DownloadManager 的纯 Python 事件转发为 Qt 信号。
+
+    事件在调度核心的事件循环线程（core.event_loop.CoreLoop）或下载工作线程中触发，这里再 emit Qt 信号；
+    接收方位于 GUI 线程时，Qt 会自动以队列方式投递到 GUI 线程执行。
+    Qt 的事件循环和 asyncio 事件循环各自运行在自己的线程中，不需要 qasync 之类的整合。
+    """
+    progress_updated = Signal(object)  # List[DownloadProgress]，已合并限频
+    download_completed = Signal(int)
+    download_error = Signal(int, str)
+    task_state_changed = Signal(int, str)
+    task_added = Signal(object)  # DownloadTask，播放列表展开出的子任务、通过控制接口提交的任务
+    group_updated = Signal(object)  # PlaylistGroup
+    queue_updated = Signal(int, int)  # 队列大小, 活动下载数
+    metadata_ready = Signal(int, object)  # task_id, TaskMetadata
+    retry_scheduled = Signal(object)  # RetryInfo
+
+    def __init__(self, download_manager, parent=None):
+        super().__init__(parent)
+        self.download_manager = download_manager
+        download_manager.progress_updated.connect(self.progress_updated.emit)
+        download_manager.download_completed.connect(self.download_completed.emit)
+        download_manager.download_error.connect(self.download_error.emit)
+        download_manager.task_state_changed.connect(self.task_state_changed.emit)
+        download_manager.task_added.connect(self.task_added.emit)
+        download_manager.group_updated.connect(self.group_updated.emit)
+        download_manager.queue_updated.connect(self.queue_updated.emit)
+        download_manager.metadata_ready.connect(self.metadata_ready.emit)
+        download_manager.retry_scheduled.connect(self.retry_scheduled.emit)
@@ -1,7 +1,7 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, 
                                     QTableWidget, QTableWidgetItem, QPushButton,
                                     QLineEdit, QLabel)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from datetime import datetime
 import os
 
@@ -22,7 +22,12 @@ class HistoryDialog(QDialog):
         search_layout = QHBoxLayout()
         search_label = QLabel("搜索:")
         self.search_input = QLineEdit()
-        self.search_input.textChanged.connect(self.search_history)
+        # 输入停顿后再搜索，避免每次按键都刷新表格
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.search_history)
+        self.search_input.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(search_label)
         search_layout.addWidget(self.search_input)
         layout.addLayout(search_layout)
@@ -61,7 +66,7 @@ class HistoryDialog(QDialog):
     def search_history(self):
         keyword = self.search_input.text()
         if keyword:
-            entries = self.history_manager.search_history(keyword)
+            entries = self.history_manager.search_history(keyword, limit=500)
         else:
             entries = self.history_manager.get_recent_entries()
             
@@ -1,51 +1,77 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                                     QLineEdit, QPushButton, QTabWidget, QLabel,
-                                    QProgressBar, QTableWidget, QTableWidgetItem,
+                                    QTableView,
                                     QFileDialog, QComboBox, QGroupBox, QCheckBox,
-                                    QMessageBox, QStatusBar, QDialog, QHeaderView)
-from PySide6.QtCore import Qt, QThread, Signal, QUrl
+                                    QMessageBox, QStatusBar, QDialog, QHeaderView, QMenu)
+from PySide6.QtCore import Qt, Signal, QUrl
 from PySide6.QtGui import QAction, QClipboard, QPalette, QColor
 from PySide6.QtWidgets import QApplication
 import os
+from core.bandwidth import BandwidthSchedule, format_rate, parse_rate
+from core.control_api import ControlApi, serve_control_api
+from core.disk_space import format_size, parse_size
 from core.download_manager import DownloadManager
-from core.history_manager import HistoryManager
+from core.job_journal import JobJournal
+from core.queue_manager import TaskState
+from core.history_manager import HistoryBatcher, HistoryManager
+from core.startup import StartupTimer, preload_yt_dlp
+from core.url_ingest import extract_urls, prepare_batch, read_url_file, summarize_batch
+from core.video_id import canonical_key
 from .history_dialog import HistoryDialog
+from .download_bridge import DownloadBridge
+from .task_model import TaskRecord, TaskTableModel, ProgressBarDelegate, PROGRESS_COLUMN
 from core.duplicate_checker import check_duplicate_download
 
-class DownloadThread(QThread):
-    def __init__(self, manager, url, save_path, options):
-        super().__init__()
-        self.manager = manager
-        self.url = url
-        self.save_path = save_path
-        self.options = options
-
-    def run(self):
-        self.manager.download(self.url, self.save_path, self.options)
-
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup_timer: StartupTimer = None):
         super().__init__()
+        self.startup_timer = startup_timer or StartupTimer()
         self.setWindowTitle("Alone-老李 九中内部使用")
         self.setMinimumSize(800, 600)
-        self.download_manager = DownloadManager()
-        self.history_manager = HistoryManager()
-        self.download_manager.progress_updated.connect(self.update_progress)
-        self.download_manager.download_completed.connect(self.download_completed)
-        self.download_manager.download_error.connect(self.download_error)
-        self.download_manager.queue_updated.connect(self.update_queue_status)
-        self.active_downloads = {}
+        # 任务日志保存未完成的队列，下次启动时恢复并断点续传
+        self.download_manager = DownloadManager(journal=JobJournal())
+        # 历史记录在窗口显示后由后台线程读取（见 finish_startup），不阻塞首次绘制
+        self.history_manager = HistoryManager(preload=False)
+        # 下载完成的记录攒批写入，大批任务同时完成时不逐条写库
+        self.history_writer = HistoryBatcher(self.history_manager)
+        # 下载在工作线程中进行，信号统一以队列方式回到 GUI 线程
+        self.download_bridge = DownloadBridge(self.download_manager, self)
+        self.download_bridge.progress_updated.connect(self.update_progress, Qt.QueuedConnection)
+        self.download_bridge.download_completed.connect(self.download_completed, Qt.QueuedConnection)
+        self.download_bridge.download_error.connect(self.download_error, Qt.QueuedConnection)
+        self.download_bridge.task_state_changed.connect(self.task_state_changed, Qt.QueuedConnection)
+        self.download_bridge.task_added.connect(self.task_added, Qt.QueuedConnection)
+        self.download_bridge.group_updated.connect(self.group_updated, Qt.QueuedConnection)
+        self.download_bridge.queue_updated.connect(self.update_queue_status, Qt.QueuedConnection)
+        self.download_bridge.metadata_ready.connect(self.metadata_ready, Qt.QueuedConnection)
+        self.download_bridge.retry_scheduled.connect(self.retry_scheduled, Qt.QueuedConnection)
 
         # 创建 ComboBox 对象
         self.download_type = QComboBox()
         self.quality_combo = QComboBox()
         self.format_combo = QComboBox()
+        self.fragment_combo = QComboBox()
+        # 带宽限制输入框（高级选项）
+        self.rate_limit_input = QLineEdit()
+        self.rate_schedule_input = QLineEdit()
+        # 临时目录和磁盘保留空间（高级选项）
+        self.temp_dir_input = QLineEdit()
+        self.min_free_input = QLineEdit()
 
         self.setup_ui()
         self.setup_menubar()
         self.setup_statusbar()
         self.setAcceptDrops(True)  # 启用拖放
-        
+        self._clipboard_seen = set()  # 剪贴板监视已处理过的链接
+        self.control_server = None
+
+    def finish_startup(self):
+        """窗口显示后调用：恢复未完成的任务，在后台读取下载历史、预先导入 yt-dlp"""
+        self.restore_tasks()
+        self.startup_timer.mark('恢复未完成的任务')
+        self.startup_timer.run_in_background('读取下载历史', self.history_manager.load)
+        self.startup_timer.run_in_background('导入 yt-dlp', preload_yt_dlp)
+
     def setup_menubar(self):
         menubar = self.menuBar()
         
@@ -53,9 +79,13 @@ class MainWindow(QMainWindow):
         file_menu = menubar.addMenu("文件")
         history_action = QAction("下载历史", self)
         history_action.triggered.connect(self.show_history)
+        import_action = QAction("导入链接文件...", self)
+        import_action.triggered.connect(self.import_url_file)
+        self.clipboard_action = QAction("监视剪贴板", self, checkable=True)
+        self.clipboard_action.toggled.connect(self.set_clipboard_watch)
         settings_action = QAction("设置", self)
         settings_action.triggered.connect(self.show_advanced_options)
-        file_menu.addActions([history_action, settings_action])
+        file_menu.addActions([history_action, import_action, self.clipboard_action, settings_action])
         
         # 主题菜单
         theme_menu = menubar.addMenu("主题")
@@ -128,10 +158,12 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(url_layout)
 
         # 选项区域
-        options_layout = QHBoxLayout()
-        options_layout.addWidget(self.create_basic_tab())
-        options_layout.addWidget(self.create_advanced_tab())
-        main_layout.addLayout(options_layout)
+        self.options_layout = QHBoxLayout()
+        self.options_layout.addWidget(self.create_basic_tab())
+        # 高级选项只创建一次：重复创建会重复添加下拉选项、重复连接信号，勾选框也会丢失状态
+        self.advanced_tab = self.create_advanced_tab()
+        self.options_layout.addWidget(self.advanced_tab)
+        main_layout.addLayout(self.options_layout)
         
         # 下载按钮
         download_button = QPushButton("开始下载")
@@ -140,13 +172,20 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(download_button)
         
         # 下载任务列表
-        self.tasks_table = QTableWidget(0, 4)
-        self.tasks_table.setHorizontalHeaderLabels(["文件名", "进度", "速度", "状态"])
+        # 任务列表采用模型/视图：进度条由委托绘制，不为每行创建控件
+        self.task_model = TaskTableModel(parent=self)
+        self.tasks_table = QTableView()
+        self.tasks_table.setModel(self.task_model)
+        self.tasks_table.setItemDelegateForColumn(PROGRESS_COLUMN, ProgressBarDelegate(self.tasks_table))
+        self.tasks_table.verticalHeader().setVisible(False)
         header = self.tasks_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.Stretch) # 文件名
         header.setSectionResizeMode(1, QHeaderView.Stretch)   # 进度
         header.setSectionResizeMode(2, QHeaderView.ResizeToContents) # 速度
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents) # 状态
+        self.tasks_table.setSelectionBehavior(QTableView.SelectRows)
+        self.tasks_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tasks_table.customContextMenuRequested.connect(self.show_task_menu)
         main_layout.addWidget(self.tasks_table)
         
     def create_basic_tab(self):
@@ -214,84 +253,238 @@ class MainWindow(QMainWindow):
         subtitle_layout.addWidget(self.subtitle_check)
         subtitle_group.setLayout(subtitle_layout)
         layout.addWidget(subtitle_group)
+
+        # HLS/DASH 分片并发数，自动时按实测吞吐量和下载中的任务数调整
+        fragment_group = QGroupBox("分片并发数")
+        fragment_layout = QVBoxLayout()
+        self.fragment_combo.addItems(["自动", "1", "2", "4", "8", "16"])
+        fragment_layout.addWidget(self.fragment_combo)
+        fragment_group.setLayout(fragment_layout)
+        layout.addWidget(fragment_group)
+
+        # 带宽限制：总速度按任务优先级分配
+        bandwidth_group = QGroupBox("带宽限制")
+        bandwidth_layout = QVBoxLayout()
+        self.rate_limit_input.setPlaceholderText("总速度上限，例如 2M、500K，留空不限速")
+        self.rate_schedule_input.setPlaceholderText("按时间段限速，例如 09:00-18:00=1M,22:00-06:00=0")
+        self.rate_limit_input.editingFinished.connect(self.apply_bandwidth_settings)
+        self.rate_schedule_input.editingFinished.connect(self.apply_bandwidth_settings)
+        bandwidth_layout.addWidget(self.rate_limit_input)
+        bandwidth_layout.addWidget(self.rate_schedule_input)
+        bandwidth_group.setLayout(bandwidth_layout)
+        layout.addWidget(bandwidth_group)
+
+        # 磁盘：下载中的文件可以写入单独的临时目录（例如 SSD）；剩余空间不够时任务暂缓开始
+        disk_group = QGroupBox("磁盘空间")
+        disk_layout = QVBoxLayout()
+        self.temp_dir_input.setPlaceholderText("临时目录，下载完成后移入保存路径，留空直接写入保存路径")
+        self.min_free_input.setPlaceholderText("每个磁盘至少保留的空间，例如 2G，默认 512M")
+        self.temp_dir_input.editingFinished.connect(self.apply_disk_settings)
+        self.min_free_input.editingFinished.connect(self.apply_disk_settings)
+        disk_layout.addWidget(self.temp_dir_input)
+        disk_layout.addWidget(self.min_free_input)
+        disk_group.setLayout(disk_layout)
+        layout.addWidget(disk_group)
         
         return widget
 
+    def apply_disk_settings(self):
+        try:
+            min_free = parse_size(self.min_free_input.text() or '512M')
+        except ValueError as e:
+            QMessageBox.warning(self, "错误", str(e))
+            return
+        self.download_manager.temp_path = self.temp_dir_input.text().strip() or None
+        self.download_manager.disk_guard.min_free = min_free
+        self.statusBar.showMessage(f"磁盘保留空间: {format_size(min_free)}", 5000)
+
+    def apply_bandwidth_settings(self):
+        try:
+            limit = parse_rate(self.rate_limit_input.text())
+            schedule = BandwidthSchedule.parse([self.rate_schedule_input.text()])
+        except ValueError as e:
+            QMessageBox.warning(self, "错误", str(e))
+            return
+        self.download_manager.bandwidth.schedule = schedule
+        self.download_manager.bandwidth.set_global_limit(limit)
+        self.statusBar.showMessage(f"当前限速: {format_rate(self.download_manager.bandwidth.current_limit())}", 5000)
+
     def paste_url(self):
+        text = QApplication.clipboard().text()
+        urls = extract_urls(text)
+        if len(urls) > 1:
+            # 剪贴板中有多个链接时直接批量加入
+            self.add_urls(urls)
+        else:
+            self.url_input.setText(text)
+
+    def import_url_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入链接文件", "",
+                                              "文本文件 (*.txt *.csv *.html *.htm);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            urls = read_url_file(path)
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"无法读取文件: {e}")
+            return
+        if not urls:
+            QMessageBox.information(self, "提示", "文件中没有找到链接")
+            return
+        self.add_urls(urls)
+
+    def set_clipboard_watch(self, enabled: bool):
         clipboard = QApplication.clipboard()
-        self.url_input.setText(clipboard.text())
+        if enabled:
+            # 开启前已经在剪贴板中的链接不算新复制的
+            self._clipboard_seen.update(extract_urls(clipboard.text()))
+            clipboard.dataChanged.connect(self.clipboard_changed)
+        else:
+            clipboard.dataChanged.disconnect(self.clipboard_changed)
+
+    def clipboard_changed(self):
+        """
+        复制了可识别的视频链接时自动加入队列，已下载过的直接跳过，不弹出对话框。
+        在界面线程中执行，只用离线正则识别（不加载 yt-dlp 的提取器、不解析短链接）。
+        """
+        urls = [url for url in extract_urls(QApplication.clipboard().text())
+                if url not in self._clipboard_seen
+                and not canonical_key(url, offline_only=True).startswith('url:')]
+        self._clipboard_seen.update(urls)
+        if urls:
+            self.add_urls(urls, interactive=False)
 
     def choose_save_path(self):
         path = QFileDialog.getExistingDirectory(self, "选择保存路径")
         if path:
             self.path_input.setText(path)
 
-    def start_download(self):
-        url = self.url_input.text().strip()
-        if not url:
-            QMessageBox.warning(self, "错误", "请输入URL")
-            return
-
+    def current_save_path(self) -> str:
         save_path = self.path_input.text()
         if not save_path:
             save_path = os.path.expanduser("~\Downloads")
             self.path_input.setText(save_path)
+        return save_path
 
-        options = {
+    def current_options(self) -> dict:
+        return {
             'download_type': self.download_type.currentText(),
             'quality': self.quality_combo.currentText(),
             'format': self.format_combo.currentText(),
             'subtitle_enabled': self.subtitle_check.isChecked(),
-            'include_audio': self.include_audio_check.isChecked()
+            'include_audio': self.include_audio_check.isChecked(),
+            'fragment_workers': int(self.fragment_combo.currentText()) if self.fragment_combo.currentIndex() else 0
         }
 
-        from core.duplicate_checker import check_duplicate_download
+    def add_urls(self, urls, interactive: bool = True):
+        """
+        批量加入队列：按规范键去重、一次比对下载历史，最多只弹出一个对话框。
+        interactive 为 False 时（剪贴板监视）跳过已下载过的视频，结果只显示在状态栏。
+        """
+        save_path = self.current_save_path()
+        options = self.current_options()
+        self.history_writer.flush()  # 刚完成的任务也要参与重复检查
+        batch = prepare_batch(urls, self.history_manager, options['download_type'] == '播放列表', offline_only=True)
+        selected = list(batch.new)
+        skipped = len(batch.downloaded)
+        if batch.downloaded and interactive:
+            reply = QMessageBox.question(
+                self, "批量下载",
+                f"共 {batch.total} 个链接，其中 {len(batch.downloaded)} 个视频已下载过，是否重新下载这些视频？\n"
+                "选择“否”只下载未下载过的视频。",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes:
+                selected += batch.downloaded
+                skipped = 0
+        task_ids = self.download_manager.add_downloads(selected, save_path, options) if selected else []
+        records = [TaskRecord(task_id, url, save_path, options)
+                   for url, task_id in zip(selected, task_ids) if task_id is not None]
+        self.task_model.add_tasks(records)
+        summary = summarize_batch(batch, len(records), len(selected) - len(records), skipped)
+        self.statusBar.showMessage(summary, 10000)
+        if interactive and not batch.downloaded:
+            QMessageBox.information(self, "批量下载", summary)
 
-        # 获取文件名
-        filename = url  # 默认使用 URL 作为文件名，稍后会被更新
+    def start_download(self):
+        text = self.url_input.text().strip()
+        if not text:
+            QMessageBox.warning(self, "错误", "请输入URL")
+            return
+        urls = extract_urls(text)
+        if len(urls) > 1:
+            self.add_urls(urls)
+            self.url_input.clear()
+            return
+        url = text
+
+        save_path = self.current_save_path()
+        options = self.current_options()
+        self.history_writer.flush()  # 刚完成的任务也要参与重复检查
+
+        # 同一视频（不同形式的链接也算）已在队列或下载中
+        if self.download_manager.is_pending(url, options):
+            QMessageBox.information(self, "提示", "该视频已在下载队列中")
+            return
+
+        # 获取文件名：视频信息已缓存时可以直接得到真实文件名，否则先用 URL 代替
+        metadata = self.download_manager.cached_metadata(url, save_path, options)
+        filename = metadata.filename if metadata else url
         # 检查是否重复下载
         duplicate_check_result = check_duplicate_download(url, save_path, filename, self.history_manager, self)
         if duplicate_check_result is True:
             return
         elif duplicate_check_result is not False and duplicate_check_result[1] is None:
-            # 用户选择继续下载，但文件名未知，此时文件名是 url
-            filename = url
+            # 用户选择继续下载；视频信息未缓存时文件名未知，此时文件名是 url
             from core.download_handler import handle_existing_download
             handle_existing_download(url, save_path, filename, self.history_manager)
 
-        # Add new row to tasks table
-        row = self.tasks_table.rowCount()
-        self.tasks_table.insertRow(row)
-        self.tasks_table.setItem(row, 0, QTableWidgetItem(url))
-        progress_bar = QProgressBar()
-        self.tasks_table.setCellWidget(row, 1, progress_bar)
-        self.tasks_table.setItem(row, 2, QTableWidgetItem("队列中..."))
-        self.tasks_table.setItem(row, 3, QTableWidgetItem("等待中"))
-
-        # Store row information
-        self.active_downloads[url] = {
-            'row': row,
-            'progress_bar': progress_bar
-        }
-
         # Add to download queue
-        self.download_manager.add_download(url, save_path, options)
+        task_id = self.download_manager.add_download(url, save_path, options)
+        if task_id is None:
+            QMessageBox.information(self, "提示", "该视频已在下载队列中")
+            return
+
+        # Add new row to tasks table
+        self.task_model.add_task(TaskRecord(task_id, url, save_path, options))
         
         # Clear URL input
         self.url_input.clear()
 
-    def update_progress(self, url, progress):
-        if url in self.active_downloads:
-            download = self.active_downloads[url]
-            row = download['row']
-            progress_bar = download['progress_bar']
-            
-            filename = progress.filename
-
-            self.tasks_table.setItem(row, 0, QTableWidgetItem(progress.filename))
-            progress_bar.setValue(int(progress.percent))
-            self.tasks_table.setItem(row, 2, QTableWidgetItem(progress.speed))
-            self.tasks_table.setItem(row, 3, QTableWidgetItem(progress.status))
+    def start_control_api(self, port: int, token=None):
+        """提供本机控制接口（见 core.control_api）；提交时未指定的选项取当前界面上的设置"""
+        api = ControlApi(self.download_manager, self.current_save_path(), self.current_options(),
+                         history_writer=self.history_writer)
+        try:
+            self.control_server = serve_control_api(api, port, token=token)
+        except OSError as e:
+            self.statusBar.showMessage(f"控制接口启动失败: {e}")
+            return
+        self.statusBar.showMessage(f"控制接口: http://127.0.0.1:{self.control_server.server_address[1]}/api/status", 10000)
+
+    def restore_tasks(self):
+        """恢复上次退出（或崩溃）时未完成的下载任务"""
+        for job in self.download_manager.restore_jobs():
+            record = TaskRecord(job['task_id'], job['url'], job['save_path'], job['options'])
+            if job['filename']:
+                record.filename = os.path.basename(job['filename'])
+            if job['total_bytes']:
+                record.percent = int(job['downloaded_bytes'] * 100 / job['total_bytes'])
+            if job['state'] == TaskState.PAUSED:
+                record.status, record.speed = "已暂停", "-"
+            self.task_model.add_task(record)
+
+    def update_progress(self, snapshots):
+        """每批快照已经按任务合并，模型只对内容有变化的单元格发出 dataChanged"""
+        for progress in snapshots:
+            # 速度为 0（暂停、合并等阶段）时显式显示 '-'，否则会一直停留在上一次的速度
+            speed = progress.speed_text or '-'
+            if progress.eta_text:
+                speed = f"{speed} 剩余 {progress.eta_text}"
+            self.task_model.update_task(progress.task_id, filename=progress.filename or None,
+                                        percent=int(progress.percent), speed=speed,
+                                        status=progress.status)
 
     def show_history(self):
         dialog = HistoryDialog(self.history_manager, self)
@@ -304,55 +497,114 @@ class MainWindow(QMainWindow):
             self.path_input.setText(save_path)
         self.start_download()
 
-    def download_completed(self, url):
-        if url in self.active_downloads:
-            download = self.active_downloads[url]
-            row = download['row']
-            self.tasks_table.setItem(row, 2, QTableWidgetItem("-"))
-            self.tasks_table.setItem(row, 3, QTableWidgetItem("已完成"))
-            
-            # 添加到历史记录
-            filename = self.tasks_table.item(row, 0).text()
-            save_path = self.path_input.text()
-            options = {
-                'download_type': self.download_type.currentText(),
-                'quality': self.quality_combo.currentText(),
-                'format': self.format_combo.currentText(),
-                'subtitle_enabled': self.subtitle_check.isChecked()
-            }
-            self.history_manager.add_entry(url, filename, save_path, options)
-
-    def download_error(self, url, error):
-        if url in self.active_downloads:
-            download = self.active_downloads[url]
-            row = download['row']
-            self.tasks_table.setItem(row, 2, QTableWidgetItem("-"))
-            self.tasks_table.setItem(row, 3, QTableWidgetItem(f"错误: {error}"))
+    def download_completed(self, task_id):
+        if self.task_model.record(task_id) is not None:
+            self.task_model.mark_finished(task_id, "已完成")
+        # 添加到历史记录：使用任务自己的保存路径和选项，而不是界面上当前选择的
+        result = self.download_manager.task_result(task_id)
+        if result is not None:
+            self.history_writer.add(result.url, result.filename, result.save_path, result.options,
+                                    video_key=result.video_key, stats=result.stats, files=result.files)
+
+    def download_error(self, task_id, error):
+        self.task_model.mark_finished(task_id, f"错误: {error}")
+
+    def retry_scheduled(self, retry):
+        """失败任务已自动重新排队，显示重试次数和下次尝试的时间"""
+        self.task_model.update_task(retry.task_id, status=retry.text, speed="-")
+
+    def task_state_changed(self, task_id, state):
+        status_text = {
+            TaskState.QUEUED: "等待中",
+            TaskState.RUNNING: "下载中",
+            TaskState.POSTPROCESSING: "后处理中",
+            TaskState.PAUSED: "已暂停",
+            TaskState.CANCELLED: "已取消",
+        }
+        if state == TaskState.CANCELLED:
+            self.task_model.mark_finished(task_id, status_text[state])
+        elif state == TaskState.PAUSED:
+            self.task_model.update_task(task_id, status=status_text[state], speed="-")
+        elif state in status_text:
+            self.task_model.update_task(task_id, status=status_text[state])
+
+    def task_added(self, task):
+        """播放列表展开后的子任务各占一行"""
+        if self.task_model.record(task.task_id) is None:
+            self.task_model.add_task(TaskRecord(task.task_id, task.url, task.save_path, task.options))
+
+    def metadata_ready(self, task_id, metadata):
+        """预解析完成后，排队中的任务即可显示真实文件名和预计大小"""
+        record = self.task_model.record(task_id)
+        if record is None or record.percent:
+            return
+        speed = f"队列中... 约 {metadata.filesize_text}" if metadata.filesize_text else None
+        self.task_model.update_task(task_id, filename=metadata.filename or None, speed=speed)
+
+    def group_updated(self, group):
+        """播放列表任务组的行显示已完成条目数和总体进度"""
+        finished = group.done + group.failed + group.skipped
+        status = f"播放列表 {finished}/{group.total}"
+        if group.failed:
+            status += f"（失败 {group.failed}）"
+        self.task_model.update_task(group.group_id, filename=group.title or None, percent=int(group.percent),
+                                    status=status)
+        if group.finished:
+            self.task_model.mark_finished(group.group_id, status)
+
+    def show_task_menu(self, pos):
+        """任务列表右键菜单：置顶 / 暂停 / 继续 / 取消"""
+        rows = sorted(index.row() for index in self.tasks_table.selectionModel().selectedRows())
+        task_ids = [self.task_model.task_id_at(row) for row in rows]
+        if not task_ids:
+            return
+        menu = QMenu(self)
+        actions = [
+            ("置顶", self.download_manager.move_task_to_top),
+            ("暂停", self.download_manager.pause_task),
+            ("继续", self.download_manager.resume_task),
+            ("取消", self.download_manager.cancel_task),
+        ]
+        for text, handler in actions:
+            action = menu.addAction(text)
+            action.triggered.connect(lambda checked=False, h=handler: [h(task_id) for task_id in task_ids])
+        menu.exec(self.tasks_table.viewport().mapToGlobal(pos))
 
     def update_queue_status(self, queue_size: int, active_count: int):
         self.queue_label.setText(f"队列: {queue_size} | 活动: {active_count}")
 
+    def closeEvent(self, event):
+        if self.control_server is not None:
+            self.control_server.shutdown()
+        self.download_manager.shutdown()
+        self.history_writer.flush()
+        super().closeEvent(event)
+
     def dragEnterEvent(self, event):
         """处理拖入事件"""
         if event.mimeData().hasUrls() or event.mimeData().hasText():
             event.acceptProposedAction()
 
     def dropEvent(self, event):
-        """处理放下事件"""
+        """处理放下事件：拖入的所有链接（以及拖入的文本文件中的链接）一起加入队列"""
         mime_data = event.mimeData()
-        
+        urls = []
         if mime_data.hasUrls():
             for url in mime_data.urls():
-                text = url.toString()
-                if any(service in text.lower() for service in ['youtube.com', 'youtu.be', 'bilibili.com']):
-                    self.url_input.setText(text)
-                    self.start_download()
-                    break
+                if url.isLocalFile():
+                    try:
+                        urls += read_url_file(url.toLocalFile())
+                    except OSError:
+                        continue
+                else:
+                    urls += extract_urls(url.toString())
         elif mime_data.hasText():
-            text = mime_data.text()
-            if any(service in text.lower() for service in ['youtube.com', 'youtu.be', 'bilibili.com']):
-                self.url_input.setText(text)
-                self.start_download()
+            urls = extract_urls(mime_data.text())
+        if len(urls) == 1:
+            self.url_input.setText(urls[0])
+            self.start_download()
+        elif urls:
+            self.add_urls(urls)
 
     def dragMoveEvent(self, event):
         """处理拖动移动事件"""
@@ -365,7 +617,9 @@ class MainWindow(QMainWindow):
         dialog = QDialog(self)
         dialog.setWindowTitle("高级选项")
         layout = QVBoxLayout(dialog)
-        advanced_tab = self.create_advanced_tab()
-        layout.addWidget(advanced_tab)
+        # 对话框中显示的就是主窗口里的那组控件，关闭后放回原处
+        layout.addWidget(self.advanced_tab)
         dialog.setLayout(layout)
-        dialog.exec()
\ No newline at end of file
+        dialog.exec()
+        self.options_layout.addWidget(self.advanced_tab)
+        self.advanced_tab.show()
\ No newline at end of file
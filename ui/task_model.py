@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionProgressBar
+
+COLUMNS = ["文件名", "进度", "速度", "状态"]
+NAME_COLUMN, PROGRESS_COLUMN, SPEED_COLUMN, STATUS_COLUMN = range(4)
+
+class TaskRecord:
+    """任务列表中的一行，使用 __slots__ 控制上千行时的内存占用"""
+    __slots__ = ('task_id', 'url', 'save_path', 'options', 'filename', 'percent', 'speed', 'status',
+                 'finished')
+
+    def __init__(self, task_id: int, url: str, save_path: str, options: dict):
+        self.task_id = task_id
+        self.url = url
+        self.save_path = save_path
+        self.options = options
+        self.filename = url
+        self.percent = 0
+        self.speed = "队列中..."
+        self.status = "等待中"
+        self.finished = False  # 已完成/出错/取消，可被自动清理
+
+
+class TaskTableModel(QAbstractTableModel):
+    """
+    下载任务列表的数据模型。
+
+    更新时只对实际发生变化的单元格发出 dataChanged，
+    结束的任务超过上限后自动从列表中移除（它们已经记录在下载历史里）。
+    """
+
+    def __init__(self, max_finished_rows: int = 200, parent=None):
+        super().__init__(parent)
+        self.max_finished_rows = max_finished_rows
+        self._records: List[TaskRecord] = []
+        self._rows: Dict[int, int] = {}  # task_id -> 行号
+        self._finished_count = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == NAME_COLUMN:
+                return record.filename
+            if column == PROGRESS_COLUMN:
+                return record.percent
+            if column == SPEED_COLUMN:
+                return record.speed
+            if column == STATUS_COLUMN:
+                return record.status
+        elif role == Qt.ToolTipRole and column == NAME_COLUMN:
+            return record.url
+        elif role == Qt.UserRole:
+            return record.task_id
+        return None
+
+    def add_task(self, record: TaskRecord):
+        row = len(self._records)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._records.append(record)
+        self._rows[record.task_id] = row
+        self.endInsertRows()
+
+    def add_tasks(self, records: List[TaskRecord]):
+        """批量加入的任务一次插入，视图只刷新一次"""
+        if not records:
+            return
+        first = len(self._records)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        for row, record in enumerate(records, first):
+            self._records.append(record)
+            self._rows[record.task_id] = row
+        self.endInsertRows()
+
+    def record(self, task_id: int) -> Optional[TaskRecord]:
+        row = self._rows.get(task_id)
+        return self._records[row] if row is not None else None
+
+    def task_id_at(self, row: int) -> int:
+        return self._records[row].task_id
+
+    def update_task(self, task_id: int, **values):
+        """修改任务字段，只为变化的列发出 dataChanged；值为 None 的字段保持不变（空字符串会清空该列）"""
+        row = self._rows.get(task_id)
+        if row is None:
+            return
+        record = self._records[row]
+        changed = []
+        for name, column in (('filename', NAME_COLUMN), ('percent', PROGRESS_COLUMN),
+                             ('speed', SPEED_COLUMN), ('status', STATUS_COLUMN)):
+            value = values.get(name)
+            if value is None or getattr(record, name) == value:
+                continue
+            setattr(record, name, value)
+            changed.append(column)
+        if changed:
+            self.dataChanged.emit(self.index(row, min(changed)), self.index(row, max(changed)),
+                                  [Qt.DisplayRole])
+
+    def mark_finished(self, task_id: int, status: str, speed: str = "-"):
+        record = self.record(task_id)
+        if record is None:
+            return
+        self.update_task(task_id, status=status, speed=speed)
+        if not record.finished:
+            record.finished = True
+            self._finished_count += 1
+            self.prune_finished()
+
+    def prune_finished(self):
+        """结束的任务超过 max_finished_rows 时，从最早的开始移除"""
+        excess = self._finished_count - self.max_finished_rows
+        if excess <= 0:
+            return
+        rows = []
+        for row, record in enumerate(self._records):
+            if record.finished:
+                rows.append(row)
+                if len(rows) == excess:
+                    break
+        # 从后往前按连续区间删除，保证前面的行号不受影响
+        for first, last in reversed(_contiguous_ranges(rows)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for record in self._records[first:last + 1]:
+                del self._rows[record.task_id]
+            del self._records[first:last + 1]
+            self.endRemoveRows()
+        self._finished_count -= len(rows)
+        for row in range(rows[0], len(self._records)):
+            self._rows[self._records[row].task_id] = row
+
+
+def _contiguous_ranges(rows: List[int]) -> List[tuple]:
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+class ProgressBarDelegate(QStyledItemDelegate):
+    """直接绘制进度条，不为每一行创建 QProgressBar 控件"""
+
+    def paint(self, painter, option, index):
+        option_bar = QStyleOptionProgressBar()
+        option_bar.rect = option.rect.adjusted(2, 2, -2, -2)
+        option_bar.state = option.state | QStyle.State_Horizontal
+        option_bar.minimum = 0
+        option_bar.maximum = 100
+        option_bar.progress = int(index.data(Qt.DisplayRole) or 0)
+        option_bar.text = f"{option_bar.progress}%"
+        option_bar.textVisible = True
+        option_bar.textAlignment = Qt.AlignCenter
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ProgressBar, option_bar, painter, option.widget)